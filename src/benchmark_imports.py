@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the start up time of the stage scripts and guard against heavy
+dependencies being imported when a script starts.
+
+Each script is run with --help, as a module if given by its dotted name,
+which imports everything the script imports at the top and then exits, so
+the time taken is what the Makefile pays every time it runs the script
+before any work is done. The modules
+imported are read from python -X importtime and the run fails if any
+script imports matplotlib, scipy, statsmodels or pint before it needs them.
+
+Usage:
+    python src/benchmark_imports.py -r 5
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+src_dir = os.path.abspath(os.path.dirname(__file__))
+project_dir = os.path.dirname(src_dir)
+
+# Stage scripts run by the Makefile, then the calibration script and the
+# analysis module it shares with the plotting stages. Modules given by name
+# are run with -m, as src/calibration.py imports src and fails by path.
+STAGES = [os.path.join('data', 'process.py'),
+          os.path.join('data', 'rebin_data.py'),
+          os.path.join('data', 'estimate_lag.py'),
+          os.path.join('data', 'scan.py'),
+          'src.modules.store',
+          os.path.join('visualisation', 'plot.py'),
+          os.path.join('visualisation', 'hist.py'),
+          os.path.join('visualisation', 'plot_matrix.py'),
+          os.path.join('visualisation', 'hist_matrix.py'),
+          os.path.join('visualisation', 'calibration.py'),
+          'src.calibration',
+          'src.modules.analysis']
+
+# Packages that must only be imported when first used
+HEAVY = ['matplotlib', 'scipy', 'statsmodels', 'pint']
+
+
+def start_up(script):
+    """Run a script with --help and python -X importtime
+
+    Args:
+        script: str
+            Path to script relative to src, or name of a module
+    Returns:
+        seconds: float
+            Wall time of the run
+        imports: float
+            Seconds spent importing modules
+        modules: list of str
+            Names of all modules imported
+    """
+    if script.endswith('.py'):
+        target = [os.path.join(src_dir, script)]
+    else:
+        target = ['-m', script]
+    command = [sys.executable, '-X', 'importtime'] + target + ['--help']
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=project_dir,
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        msg = "%s failed to start:\n%s" % (script, process.stderr)
+        raise RuntimeError(msg)
+
+    # Lines are "import time: self [us] | cumulative | name", where the
+    # name is indented by how deep the import is nested
+    imports = 0
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        modules.append(name.strip())
+        if not name.startswith('  '):
+            imports += int(fields[1]) / 1e6
+    return seconds, imports, modules
+
+
+def heavy_modules(modules):
+    """Packages of HEAVY among the names of modules"""
+    return sorted(set(x.split('.')[0] for x in modules
+                      if x.split('.')[0] in HEAVY))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark start up of "
+                                     "stage scripts")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="Number of times to start each script")
+
+    options = parser.parse_args()
+
+    failed = []
+    print("%-30s %9s %9s  %s" % ("script", "start (s)", "import (s)",
+                                 "heavy modules"))
+    for script in STAGES:
+        runs = [start_up(script) for _ in range(options.repeat)]
+        seconds = min(x[0] for x in runs)
+        imports = min(x[1] for x in runs)
+        heavy = heavy_modules(runs[0][2])
+        if heavy:
+            failed.append(script)
+        print("%-30s %9.3f %9.3f  %s" % (script, seconds, imports,
+                                         ", ".join(heavy)))
+
+    if failed:
+        sys.exit("Heavy modules imported at start up by %s" %
+                 (", ".join(failed)))
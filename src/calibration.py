@@ -2,15 +2,15 @@
 # -*- coding: utf-8 -*-
 
 import os
-import matplotlib
 import json
 import yaml
 import argparse
 from src.modules.data import *
 from src.modules.analysis import *
 from datetime import datetime, timedelta
-from pint import UnitRegistry
-import copy
+from src.modules.units import UnitResolver, scale_factor
+from src.modules.store import condition_rows
+from src.modules.align import align_frames
 import logging
 
 logging.basicConfig(filename='log',
@@ -25,6 +25,10 @@ pd.options.display.float_format = '{:.2f}'.format
 
 
 def loadSensorsData(sensors, sensorsFile, outputUnit):
+    # Scale factors of units, shared with process.py
+    resolver = UnitResolver(os.path.join(project_dir, "data", "interim",
+                                         "units.json"))
+
     # Load sensors definitions
     with open(sensorsFile) as handle:
         sensorDefinition = yaml.load(handle)
@@ -93,59 +97,11 @@ def loadSensorsData(sensors, sensorsFile, outputUnit):
         # Set seconds to zero
         data.index = data.index.values.astype('<M8[m]')
 
-        # Units of data
         # Scaling and unit conversion of particle concentration
-        # What is the unit of recorded measurements?
-        inputUnit = ureg(config['unit'])
-        if "flowrate" in config:
-            inputFlowrate = ureg(config['flowrate'])
-
-        # Create test quantities to compare dimensionality against
-        counts_test = ureg("counts")
-        vol_test = ureg("m ** 3")
-        conc_test = counts_test / vol_test
-        time_test = ureg("s")
-        rate_test = counts_test / time_test
-        flowrate_test = vol_test * rate_test
-
-
-        # Compare dimensionality of input data and output unit
-        # If output unit is concentration
-        if outputUnit.dimensionality == conc_test.dimensionality:
-
-            # If input unit is concentration
-            if inputUnit.dimensionality == conc_test.dimensionality:
-                scale = inputUnit.to(outputUnit).magnitude
-                # scale = 1/float(outputUnit / inputUnit)
-                if 'concentration' not in config:
-                    config['concentration'] = str('{:.03f~}'.format(inputUnit))
-                # Calculate count rate if not exists
-                if 'count rate' not in config:
-                    countrate = (inputFlowrate * inputUnit).to('counts per second')
-                    config['count rate'] = str('{:.03f~}'.format(countrate))
-
-            # If input unit is count rate
-            elif inputUnit.dimensionality == rate_test.dimensionality:
-                conc = inputUnit / inputFlowrate
-                scale = float(outputUnit / conc)
-                if 'count rate' not in config:
-                    config['count rate'] = str('{:.03f}'.format(inputUnit))
-                if 'concentration' not in config:
-                    config['concentration'] = str('{:.03f}'.format(conc))
-
-            else:
-                msg = "The input unit is incorrect or not yet implementated!"
-                raise ValueError(msg)
-        else:
-            msg = "The output unit is incorrect or not yet implementated!"
-            raise ValueError(msg)
-
-        config['scale factor'] = scale
+        scale = scale_factor(config, outputUnit, resolver)
 
         # Multiply the data with scale factor and update binDate dict
         bins['data'] = data*scale
-        debug = "The scaling factor is %s" % (scale)
-        logging.debug(debug)
 
         # Update settings dict with bins
         config['bins'] = bins
@@ -155,6 +111,7 @@ def loadSensorsData(sensors, sensorsFile, outputUnit):
 
         # Update sensor dict with settings
         sensors[sensor] = config
+    resolver.save()
 
     logging.debug("Rebinning calibrater")
 
@@ -187,7 +144,7 @@ def experiments(expDict, sensors):
     caliName = sensors['calibrater']['id'] + "-" + sensors['calibratee']['id']
     calibraterData = sensors['rebinned']['bins']['data']
     calibrateeData = sensors['calibratee']['bins']['data']
-    calibrationData = concat(calibrateeData, calibraterData)
+    calibrationData = align_frames(calibrateeData, calibraterData)
     writeData(calibrationData, base_interim_data_dir, caliName)
 
     logging.debug("Experiment time")
@@ -221,17 +178,23 @@ def experiments(expDict, sensors):
             sensorName = sensorDict['id']
 
             # Load data from sensor dict from time period
-            # Copy the bins data into new dict
-            sample = copy.deepcopy(sensorDict['bins'])
-            fullstart = sensorDict['bins']['data'].index[0]
-            fullend = sensorDict['bins']['data'].index[-1]
+            # The sample shares the bins of the sensor and its data is a view
+            # of the rows of the time period, nothing is copied
+            data = sensorDict['bins']['data']
+            if not data.index.is_monotonic_increasing:
+                data = data.sort_index(kind='mergesort')
+                sensorDict['bins']['data'] = data
+            sample = dict(sensorDict['bins'])
+            fullstart = data.index[0]
+            fullend = data.index[-1]
             debug = ("Exp: %s, Sensor: %s,\n"
                      "Data start: %s and end: %s\n"
                      "Sample start: %s and end: %s\n" % (exp, sensor,
                                                        fullstart,
                                                        fullend, start, end))
             logging.debug(debug)
-            sample['data'] = sample['data'].loc[start:end]
+            rows = condition_rows(data.index, start, end)
+            sample['data'] = data.iloc[rows[0]:rows[1]]
 
             realstart = sample['data'].index[0]
             realend = sample['data'].index[-1]
@@ -332,15 +295,12 @@ if __name__ == '__main__':
     if not os.path.isdir(base_processed_data_dir):
         os.makedirs(base_processed_data_dir)
 
-    # Initialise pint's UnitRegistry
-    ureg = UnitRegistry()
-
     # Load settings yaml file
     with open(settingsFile) as handle:
         settings = yaml.load(handle)
 
     # Final particle concentration
-    outputUnit = ureg(settings['output']['unit'])
+    outputUnit = settings['output']['unit']
 
     # Sensors
     sensorsDict = settings['sensors']
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Estimate the timeshift of each sensor from the lag of its total counts
+behind those of the calibrater, within a number of hours either way.
+
+The lags are written to a report json of their own, along with the
+timeshift each sensor would need, which takes the timeshift it already has
+into account. The settings json written by process.py is only read, so the
+stages that depend on it are not made out of date. With --write the
+timeshifts of lags that correlate well enough are written to the settings
+yaml, so the next run of process.py lines the sensors up.
+
+Usage:
+    python src/data/estimate_lag.py data/interim/dylos-alpha.json \
+        -o data/interim/dylos-alpha-lags.json -m 2
+    python src/data/estimate_lag.py data/interim/dylos-alpha.json \
+        -o data/interim/dylos-alpha-lags.json -w settings/dylos-alpha.yaml
+"""
+
+import argparse
+import json
+import logging
+from datetime import timedelta
+import yaml
+from utils import *
+from src.modules.lag import best_lag, parse_timeshift, format_timeshift
+from src.modules.atomic import atomic_open
+
+
+def estimate_lags(settings_file, output_file, max_hours=2, min_overlap=60):
+    """Find the lag of every sensor behind the calibrater in the full data
+    of a settings json file and write them to a report json file.
+
+    Args:
+        settings_file: str
+            Settings json file written by process.py
+        output_file: str
+            Report json file
+        max_hours: float
+            Largest lag looked for either way, in hours
+        min_overlap: int
+            Fewest minutes of data both sensors need at a lag for it to count
+    Returns:
+        lags: dict
+            'reference', 'lag' in minutes, 'correlation', 'overlap' and
+            'timeshift' of each sensor, lag and timeshift are None if no lag
+            had enough data
+    """
+    with open(settings_file) as handle:
+        settings = json.load(handle)
+
+    calibrater = settings['calibration']['calibrater']
+    sensors = settings['sensors']
+    full = settings['exp']['conditions']['full']['sensor']
+    max_lag = int(round(float(max_hours) * 60))
+
+    reference = read_data(full[calibrater])
+    lags = {}
+    for sensor in settings['sensor_order']:
+        if sensor == calibrater or sensor not in full:
+            continue
+        data = read_data(full[sensor])
+        lag, correlation, overlap = best_lag(reference, data, max_lag,
+                                             min_overlap)
+        timeshift = None
+        if lag is not None:
+            # Events appear lag minutes late in the data of the sensor, on
+            # top of any timeshift it already has
+            current = parse_timeshift(sensors[sensor].get('timeshift',
+                                                          '+00:00:00'))
+            timeshift = format_timeshift(current - timedelta(minutes=lag))
+        lags[sensor] = {'reference': calibrater, 'lag': lag,
+                        'correlation': correlation, 'overlap': overlap,
+                        'timeshift': timeshift}
+        debug = ("Sensor: %s, Reference: %s, Lag: %s min, "
+                 "Correlation: %.3f, Overlap: %s" % (sensor, calibrater, lag,
+                                                    correlation, overlap))
+        logging.debug(debug)
+
+    # Write the report whole, make may be reading an older one
+    with atomic_open(output_file) as handle:
+        json.dump(lags, handle, sort_keys=True, indent=4)
+    return lags
+
+
+def write_timeshift(settings_file, sensor, timeshift):
+    """Set the timeshift of a sensor in a settings yaml file.
+    The line is changed in place, or added under the sensor if it has none,
+    so the rest of the file and its comments are kept as they are.
+
+    Args:
+        settings_file: str
+            Settings yaml file
+        sensor: str
+            Name of the sensor under 'sensors'
+        timeshift: str
+            Timeshift such as '-00:01:00'
+    """
+    with open(settings_file) as handle:
+        lines = handle.read().splitlines(True)
+
+    def key(line):
+        # Key of a mapping line, None for blank lines and comments
+        text = line.strip()
+        if not text or text.startswith('#'):
+            return None
+        return text.split(':', 1)[0].strip().strip('\'"')
+
+    def indent(line):
+        return len(line) - len(line.lstrip())
+
+    # Line of the sensor within the top level sensors mapping
+    section = None
+    found = None
+    for i, line in enumerate(lines):
+        if key(line) is None:
+            continue
+        if indent(line) == 0:
+            section = key(line)
+        elif section == 'sensors' and key(line) == sensor:
+            found = i
+            break
+    if found is None or lines[found].split(':', 1)[-1].strip():
+        msg = "Sensor %s not found as a block in %s" % (sensor,
+                                                        settings_file)
+        raise ValueError(msg)
+
+    # Settings of the sensor are the lines indented below it
+    block = []
+    for i in range(found + 1, len(lines)):
+        if key(lines[i]) is None:
+            continue
+        if indent(lines[i]) <= indent(lines[found]):
+            break
+        block.append(i)
+    width = indent(lines[block[0]]) if block else indent(lines[found]) + 2
+    new_line = " " * width + "timeshift: '%s'\n" % (timeshift)
+
+    # Replace the timeshift of the sensor or add one after its first line
+    current = [i for i in block
+               if key(lines[i]) == 'timeshift' and indent(lines[i]) == width]
+    if current:
+        lines[current[0]] = new_line
+    else:
+        if not lines[found].endswith('\n'):
+            lines[found] += '\n'
+        lines.insert(found + 1, new_line)
+
+    # Check the file still reads back with the new timeshift
+    text = "".join(lines)
+    settings = yaml.safe_load(text)
+    if settings['sensors'][sensor].get('timeshift') != timeshift:
+        msg = "Could not set timeshift of %s in %s" % (sensor, settings_file)
+        raise ValueError(msg)
+    with open(settings_file, 'w') as handle:
+        handle.write(text)
+
+
+if __name__ == '__main__':
+    # Get filenames to work with
+    parser = argparse.ArgumentParser(description="Estimate timeshifts of "
+                                     "sensors from their lag behind the "
+                                     "calibrater")
+    parser.add_argument("settings", help="Settings json file")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Report json file")
+    parser.add_argument("-m", "--max-hours", type=float, default=2,
+                        help="Largest lag to look for either way in hours")
+    parser.add_argument("--min-overlap", type=int, default=60,
+                        help="Fewest minutes of data at a lag")
+    parser.add_argument("-w", "--write",
+                        help="Settings yaml file to write the timeshifts to")
+    parser.add_argument("--min-correlation", type=float, default=0.5,
+                        help="Weakest correlation at a lag for its timeshift "
+                        "to be written")
+
+    options = parser.parse_args()
+
+    lags = estimate_lags(options.settings, options.output, options.max_hours,
+                         options.min_overlap)
+
+    print("%-15s %-15s %9s %11s %8s  %s" % ("sensor", "reference",
+                                             "lag (min)", "correlation",
+                                             "overlap", "timeshift"))
+    for sensor, lag in lags.items():
+        print("%-15s %-15s %9s %11.3f %8d  %s" % (sensor, lag['reference'],
+                                                  lag['lag'],
+                                                  lag['correlation'],
+                                                  lag['overlap'],
+                                                  lag['timeshift']))
+        if options.write is None or not lag['lag']:
+            continue
+        if lag['correlation'] < options.min_correlation:
+            print("Not writing timeshift of %s, correlation is too weak" %
+                  (sensor))
+            continue
+        write_timeshift(options.write, sensor, lag['timeshift'])
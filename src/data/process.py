@@ -3,16 +3,19 @@
 
 import os
 import argparse
-from datetime import datetime, timedelta
 import logging
 import json
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
-from pint import UnitRegistry
 import yaml
 from utils import *
+from src.modules.binning import BinSpec, bin_spec
+from src.modules.buildcache import BuildCache, fingerprint
+from src.modules.units import UnitResolver, scale_factor
+from src.modules.lag import parse_timeshift, format_timeshift
 
-
-def load_data(path, bins, string):
+def load_data(path, bins, string, chunksize=None):
     """Load binned data into a Pandas.DataFrame where first column is datetime,
     each columns represent a bin and name each column according to a list of
     floats in argument.
@@ -20,23 +23,26 @@ def load_data(path, bins, string):
     Args:
         path : string
             path to datafile
-        bins : list
-        List of floats of bin boundaries, where every except the last element
-        represent lower bin boundary and the last is uppper bin boundary of the
-        last bin.
+        bins : BinSpec
+        Geometry of the bins, or a list of floats of bin boundaries, where
+        every except the last element represent lower bin boundary and the
+        last is uppper bin boundary of the last bin.
+        chunksize : int
+        Number of rows to read at a time, if given df is an iterator over
+        DataFrames of that many rows.
     Returns:
         df: Pandas.DataFrame
+        bins: BinSpec
 
     """
-    # Use list of bin boundaries to generate a list of bin labels for the
-    # DataFrame
-    bins = gen_bin_labels(bins, string)
+    # Bin labels for the DataFrame
+    bins = bin_spec(bins, string)
 
     # Set the labels of DataFrame columns
     # Generate indexes of elements in columns to load, if any element is an
     # empty string do not include its index.
-    cols = ['DateTime'] + bins['columns']
-    usecols = [0] + [x + 1 for x in bins['index']]
+    cols = ['DateTime'] + list(bins.columns)
+    usecols = [0] + [x + 1 for x in bins.index]
 
     # Load data
     df = pd.read_csv(path,
@@ -45,40 +51,240 @@ def load_data(path, bins, string):
                      infer_datetime_format=True,
                      header=None,
                      names=cols,
-                     usecols=usecols)
+                     usecols=usecols,
+                     chunksize=chunksize)
 
     # Return the data
-    return df, bins['bounds']
+    return df, bins
 
 
-def realCounts(data):
+def realCounts(data, inplace=True):
     """Subtract the upper bins from the lower bins
+    The sum of all bins above each bin is worked out for every row at once.
+    The bins are added in the same order as DataFrame.sum adds them, so the
+    counts are the same to the last bit as subtracting column by column.
+
+    Args:
+        data: Pandas.DataFrame
+            Cumulative counts where each column is a bin
+        inplace: bool
+            Overwrite the columns of data, otherwise return a new DataFrame
+    Returns:
+        data: Pandas.DataFrame
     """
-    # Get number of columns, loop over, sum upper and subtract from lower.
-    columns = data.columns
-    for i in range(0, len(columns)):
-        sumup = data[columns[(i+1):]].sum(axis=1)
-        data[columns[i]] = data[columns[i]] - sumup
+    values = data.values
+    # Sum of the bins above each bin, missing values count as zero
+    filled = np.where(np.isnan(values), 0, values)
+    upper = np.zeros_like(filled)
+    for i in range(filled.shape[1] - 1):
+        upper[:, i] = filled[:, i + 1:].sum(axis=1)
+    counts = values - upper
+    if not inplace:
+        return pd.DataFrame(counts, index=data.index, columns=data.columns)
+    data[data.columns] = counts
     return data
 
 
-if __name__ == '__main__':
-    # Get filenames to work with
-    parser = argparse.ArgumentParser(description="")
-    parser.add_argument("settings", help="Settings yaml file")
-    parser.add_argument("sensors", help="Sensors defintions yaml file")
-    parser.add_argument("particles", help="Particles")
-    parser.add_argument("rawdatadir", help="Raw Data directory")
-    parser.add_argument("-o", "--output",
-                        help="Directs the output to a name of your choice")
+def load_sensor(data_dir, config, sensor, scale, chunksize=None):
+    """Load the raw data of a sensor, resample it to minutes, shift it in
+    time and scale it to the output unit as set out in its config.
+    The config is updated with the bin boundaries.
 
-    options = parser.parse_args()
-    settings_file = options.settings    # Settings file
-    sensors_file = options.sensors      # Sensor configuration file
-    particles_file = options.particles  # Particles configuration file
-    raw_data_dir = options.rawdatadir   # Root directory of raw data
-    output_file = options.output        # Output directory
+    Args:
+        data_dir: str
+            Path to raw data
+        config: dict
+            Settings of the sensor merged with its definition
+        sensor: str
+            Name of the sensor, used to label the bins
+        scale: float
+            Scale factor to the final particle concentration, from
+            scale_factor()
+        chunksize: int
+            Read the raw data in chunks of this many rows so only one chunk
+            of raw data is in memory at a time, None to read it all at once
+    Returns:
+        data: Pandas.DataFrame
+    """
+    # Geometry of the bins of this sensor
+    bins = BinSpec(sensor, config['bins'])
+
+    # Load data
+    data, bins = load_data(data_dir, bins, sensor, chunksize)
+
+    # Update bins
+    config['bins'] = list(bins.values)
+
+    if chunksize is None:
+        return prepare_data(data, config, scale)
+
+    if config.get('resample') != 'minute':
+        return pd.concat([prepare_data(chunk, config, scale)
+                          for chunk in data])
+
+    # Resampling is done after all chunks are read, as rows of a minute may be
+    # in any chunk if the clock of the sensor jumped back
+    return prepare_data(minute_means(data), config, scale)
+
+
+def minute_means(chunks):
+    """Mean of each column in every minute of chunks of raw data.
+    The sums and counts of the rows of each minute are kept per chunk and
+    added up once all chunks are read, so a minute split between chunks has
+    the same mean as if it was read in one go.
+
+    Args:
+        chunks: iterable of Pandas.DataFrame
+    Returns:
+        data: Pandas.DataFrame
+            Mean of each minute with rows, in time order
+    """
+    sums = []
+    counts = []
+    for chunk in chunks:
+        minutes = chunk.groupby(chunk.index.floor('T'))
+        sums.append(minutes.sum())
+        counts.append(minutes.count())
+    sums = pd.concat(sums).groupby(level=0).sum()
+    counts = pd.concat(counts).groupby(level=0).sum()
+    return sums / counts[counts > 0]
+
+
+def prepare_data(data, config, scale):
+    """Resample, subtract upper bins, shift in time and scale data of a
+    sensor as set out in its config.
+
+    Args:
+        data: Pandas.DataFrame
+        config: dict
+        scale: float
+            Scale factor from scale_factor()
+    Returns:
+        data: Pandas.DataFrame
+    """
+    # If the data is not in minute frequency, resample it
+    if 'resample' in config:
+        if 'minute' == config['resample']:
+            data = data.resample('T', label='left', closed='left').mean()
+
+    if 'realcounts' in config:
+        # Subtract high bins from lower
+        data = realCounts(data)
+
+    # How much time should the data produced by this sensor be shifted?
+    # Shift datetime index of data
+    if 'timeshift' in config:
+        delta = parse_timeshift(config['timeshift'])
+        debug = "Time shifted by %s" % (format_timeshift(delta))
+        logging.debug(debug)
+        debug = ("Before timeshift\n"
+                 "Start: %s, end: %s" % (data.index[0], data.index[-1]))
+        logging.debug(debug)
+        data.index = data.index + delta
+        debug = ("After timeshift\n"
+                 "Start: %s, end: %s" % (data.index[0], data.index[-1]))
+        logging.debug(debug)
+
+    # Set seconds to zero
+    index_label = data.index.name
+    data.index = data.index.values.astype('<M8[m]')
+    data.index.name = index_label
+
+    # Multiply the data with scale factor
+    data = data*scale
+    return data
+
+
+def build_sensor(args):
+    """Load, scale and save the data of a sensor and find the rows of each
+    condition in it. Only the steps that are not up to date are done.
+
+    Args:
+        args: tuple
+            sensor: str
+                Name of the sensor
+            config: dict
+                Settings of the sensor merged with its definition and its
+                scale factor
+            data_dir: str
+                Path to raw data
+            full_data: str
+                Path to saved data of the sensor if up to date, else None
+            windows: list of tuples
+                Name, start and end of conditions to find
+            output_dir: str
+                Directory to write data to
+            data_fmt: str
+                Storage format of interim data
+            chunksize: int
+                Number of rows of raw data to read at a time
+    Returns:
+        config: dict
+            Updated config of the sensor
+        full_data: str
+            Path to saved data of the sensor
+        rows: dict
+            Start and stop of the rows of each condition found
+    """
+    (sensor, config, data_dir, full_data, windows, output_dir, data_fmt,
+     chunksize) = args
+
+    if full_data is None:
+        data = load_sensor(data_dir, config, sensor, config['scale factor'],
+                           chunksize)
 
+        # Conditions are ranges of rows, which needs the data in time order
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index(kind='mergesort')
+
+        # Save processed data
+        full_path = os.path.join(output_dir, 'full')
+        # Other workers may be making it at the same time
+        os.makedirs(full_path, exist_ok=True)
+        full_data = writeData(data, full_path, sensor, data_fmt,
+                              config['bins'])
+        index = data.index
+    else:
+        index = None
+
+    # Find the rows of the data in the period of each condition
+    logging.debug("Experiment time")
+    rows = window_rows(full_data, windows, index)
+    for exp in rows:
+        debug = "Condition %s: rows %s to %s" % (exp, rows[exp][0],
+                                                 rows[exp][1])
+        logging.debug(debug)
+
+    return config, full_data, rows
+
+
+def process(settings_file, sensors_file, particles_file, raw_data_dir,
+            output_file, data_fmt=DEFAULT_FORMAT, chunksize=None, jobs=1):
+    """Load the raw data of every sensor in a settings file, scale it and
+    find the rows of each experimental condition in it.
+
+    Args:
+        settings_file: str
+            Settings yaml file
+        sensors_file: str
+            Sensors definitions yaml file
+        particles_file: str
+            Particles definitions yaml file
+        raw_data_dir: str
+            Root directory of raw data
+        output_file: str
+            Settings json file to write, the data is written to a directory
+            of the same name
+        data_fmt: str
+            Storage format of interim data
+        chunksize: int
+            Number of rows of raw data to read at a time, None to read whole
+            files
+        jobs: int
+            Number of sensors to load at the same time in worker processes
+    Returns:
+        settings: dict
+    """
     # Create output directory
     filename = os.path.basename(output_file)
     name = os.path.splitext(filename)[0]
@@ -87,16 +293,10 @@ if __name__ == '__main__':
     if not os.path.isdir(output_dir):
         os.makedirs(output_dir)
 
-    # Initialise pint's UnitRegistry
-    ureg = UnitRegistry()
-
     # Load settings yaml file
     with open(settings_file) as handle:
         settings = yaml.load(handle)
 
-    # Final particle concentration
-    outputUnit = ureg(settings['output']['unit'])
-
     # Experimental conditions
     exps = settings['exp']
 
@@ -124,7 +324,19 @@ if __name__ == '__main__':
     debug = ("Loading sensor data")
     logging.debug(debug)
 
-    # Load data for a sensor
+    # Work done by earlier runs
+    cache = BuildCache(os.path.join(output_dir, "cache.json"))
+    script = cache.file_hash(__file__)
+
+    # Scale factors of units, shared by all settings files
+    units = UnitResolver(os.path.join(path, "units.json"))
+
+    conditions['full'] = {'sensor': {}}
+    full_path = os.path.join(output_dir, 'full')
+
+    # Work out what is left to do for each sensor
+    tasks = []
+    keys = {}
     for sensor in sensors:
         logging.debug("Sensor: %s" % (sensor))
         # Load config for a sensor
@@ -140,150 +352,120 @@ if __name__ == '__main__':
         sensor_dir = config['path']
         data_dir = os.path.join(raw_data_dir, sensor_dir)
 
-        # Fetch information about bin boundaries for this sensor
-        bins = config['bins']
-
-        # Load data
-        data, bins = load_data(data_dir, bins, sensor)
-
-        # Update bins
-        config['bins'] = bins
-
-        # If the data is not in minute frequency, resample it
-        if 'resample' in config:
-            if 'minute' == config['resample']:
-                data = data.resample('T', label='left', closed='left').mean()
-
-        if 'realcounts' in config:
-            # Subtract high bins from lower
-            data = realCounts(data)
-
-        # How much time should the data produced by this sensor be shifted?
-        # Shift datetime index of data
-        if 'timeshift' in config:
-            timeshift = config['timeshift']
-            sign = timeshift[0]
-            period = timeshift[1:]
-            t = datetime.strptime(period, "%H:%M:%S")
-            delta = timedelta(hours=t.hour, minutes=t.minute, seconds=t.second)
-            debug = "Time shifted by %s %s" % (sign, str(delta))
-            logging.debug(debug)
-            debug = ("Before timeshift\n"
-                     "Start: %s, end: %s" % (data.index[0], data.index[-1]))
-            logging.debug(debug)
-            if sign == '-':
-                data.index = data.index - delta
-            elif sign == '+':
-                data.index = data.index + delta
-            else:
-                raise ValueError("Sign not given for timeshift")
-            debug = ("After timeshift\n"
-                     "Start: %s, end: %s" % (data.index[0], data.index[-1]))
-            logging.debug(debug)
-
-        # Set seconds to zero
-        index_label = data.index.name
-        data.index = data.index.values.astype('<M8[m]')
-        data.index.name = index_label
-
-        # Units of data
-        # Scaling and unit conversion of particle concentration
-        # What is the unit of recorded measurements?
-        inputUnit = ureg(config['unit'])
-        if "flowrate" in config:
-            inputFlowrate = ureg(config['flowrate'])
-
-        # Create test quantities to compare dimensionality against
-        counts_test = ureg("counts")
-        vol_test = ureg("m ** 3")
-        conc_test = counts_test / vol_test
-        time_test = ureg("s")
-        rate_test = counts_test / time_test
-        flowrate_test = vol_test * rate_test
-
-        # Compare dimensionality of input data and output unit
-        # If output unit is concentration
-        if outputUnit.dimensionality == conc_test.dimensionality:
-
-            # If input unit is concentration
-            if inputUnit.dimensionality == conc_test.dimensionality:
-                scale = inputUnit.to(outputUnit).magnitude
-                # scale = 1/float(outputUnit / inputUnit)
-                if 'concentration' not in config:
-                    config['concentration'] = str('{:.03f~}'.format(inputUnit))
-                # Calculate count rate if not exists
-                if 'count rate' not in config:
-                    countrate = (inputFlowrate * inputUnit).to('counts/s')
-                    config['count rate'] = str('{:.03f~}'.format(countrate))
-
-            # If input unit is count rate
-            elif inputUnit.dimensionality == rate_test.dimensionality:
-                conc = inputUnit / inputFlowrate
-                scale = float(outputUnit / conc)
-                if 'count rate' not in config:
-                    config['count rate'] = str('{:.03f}'.format(inputUnit))
-                if 'concentration' not in config:
-                    config['concentration'] = str('{:.03f}'.format(conc))
-
-            else:
-                msg = "The input unit is incorrect or not yet implementated!"
-                raise ValueError(msg)
+        # Everything the processed data of this sensor depends on
+        sensor_key = fingerprint(script, cache.file_hash(data_dir), config,
+                                 settings['output']['unit'], data_fmt)
+        built = cache.get(sensor, sensor_key)
+        if built is not None:
+            logging.debug("Sensor %s is up to date" % (sensor))
+            config = built['config']
+            full_data = built['data']
         else:
-            msg = "The output unit is incorrect or not yet implementated!"
-            raise ValueError(msg)
-
-        config['scale factor'] = scale
-        debug = "The scaling factor is %s" % (scale)
-        logging.debug(debug)
-
-        # Update sensor dict with settings
-        sensors[sensor] = config
-
-        # Multiply the data with scale factor
-        data = data*scale
-
-        # Save processed data
-        full_path = os.path.join(output_dir, 'full')
-        if not os.path.isdir(full_path):
-            os.makedirs(full_path)
-        path = writeData(data, full_path, sensor)
-
-        conditions['full'] = {}
-        conditions['full']['sensor'] = {}
-        conditions['full']['sensor'][sensor] = {}
-        conditions['full']['sensor'][sensor]['data'] = path
-
-        # Loop over different conditions and save part of data relevant to that
-        # period
-
-        logging.debug("Experiment time")
-        # Iterate over different experiment conditions
+            full_data = None
+            # Worked out here so worker processes do not need pint
+            scale_factor(config, settings['output']['unit'], units)
+
+        # Conditions to find in the data, unless this sensor and condition
+        # are unchanged
+        windows = []
+        rows = {}
         for exp in order:
-            # Make condition path if not exist
-            path = os.path.join(output_dir, exp)
-            if not os.path.isdir(path):
-                os.makedirs(path)
-
             condition = conditions[exp]
+            key = "%s/%s" % (exp, sensor)
+            keys[key] = fingerprint(sensor_key, condition['start'],
+                                    condition['end'])
+            built = cache.get(key, keys[key])
+            if built is not None:
+                rows[exp] = built
+            else:
+                windows.append((exp, condition['start'], condition['end']))
+
+        keys[sensor] = sensor_key
+        tasks.append((sensor, config, data_dir, full_data, windows, rows))
+
+    # Sensors are independent of each other, so they may be worked on in
+    # separate processes
+    units.save()
+    args = [(sensor, config, data_dir, full_data, windows, output_dir,
+             data_fmt, chunksize)
+            for sensor, config, data_dir, full_data, windows, rows in tasks]
+    if jobs > 1 and len(args) > 1:
+        pool = Pool(min(jobs, len(args)))
+        try:
+            results = pool.map(build_sensor, args, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [build_sensor(x) for x in args]
+
+    # Merge the results in the order of sensors in settings
+    rebuilt = False
+    for task, result in zip(tasks, results):
+        sensor, _, _, full_data, _, rows = task
+        config, path, built = result
+        rebuilt = rebuilt or full_data is None or bool(built)
+        if full_data is None:
+            cache.set(sensor, keys[sensor], [path],
+                      {'config': config, 'data': path})
+        for exp in built:
+            key = "%s/%s" % (exp, sensor)
+            cache.set(key, keys[key], [path], built[exp])
+        rows.update(built)
+
+        # Update sensor dict with settings, every condition is a range of
+        # rows of the data of the sensor
+        sensors[sensor] = config
+        conditions['full']['sensor'][sensor] = {'data': path}
+        for exp in order:
+            conditions[exp]['sensor'][sensor] = {'data': path,
+                                                 'rows': rows[exp]}
 
-            # Load start and end datetime for time series data
-            start = condition['start']
-            end = condition['end']
-
-            # Select data
-            sample = data.loc[start:end].copy(deep=True)
+    exps['conditions'] = conditions
 
-            # Write selected data to file
-            path = writeData(sample, path, sensor)
+    # Output processed data, unless it is the same as last time which keeps
+    # what later stages added to the file. Data rebuilt from changed raw
+    # values can leave the settings as they were, the file is then only
+    # touched so the stages that depend on it are run again.
+    settings_key = fingerprint(settings)
+    if not cache.fresh('settings', settings_key):
+        with open(output_file, 'w') as handle:
+            json.dump(settings, handle, default=date_handler,
+                      sort_keys=True, indent=4)
+        cache.set('settings', settings_key, [os.path.abspath(output_file)])
+    elif rebuilt:
+        os.utime(output_file)
+    cache.save()
 
-            condition['sensor'][sensor] = {'data': path}
+    return settings
 
-            conditions[exp] = condition
 
-    exps['conditions'] = conditions
+if __name__ == '__main__':
+    # Get filenames to work with
+    parser = argparse.ArgumentParser(description="")
+    parser.add_argument("settings", help="Settings yaml file")
+    parser.add_argument("sensors", help="Sensors defintions yaml file")
+    parser.add_argument("particles", help="Particles")
+    parser.add_argument("rawdatadir", help="Raw Data directory")
+    parser.add_argument("-o", "--output",
+                        help="Directs the output to a name of your choice")
+    parser.add_argument("-F", "--format", choices=FORMATS,
+                        default=DEFAULT_FORMAT,
+                        help="Storage format of interim data")
+    parser.add_argument("-c", "--chunksize", type=int,
+                        help="Read raw data in chunks of this many rows")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of sensors to load in parallel")
 
-    # Output processed data
-    with open(output_file, 'w') as handle:
-        json.dump(settings, handle, default=date_handler,
-                  sort_keys=True, indent=4)
+    options = parser.parse_args()
+    settings_file = options.settings    # Settings file
+    sensors_file = options.sensors      # Sensor configuration file
+    particles_file = options.particles  # Particles configuration file
+    raw_data_dir = options.rawdatadir   # Root directory of raw data
+    output_file = options.output        # Output directory
+    data_fmt = options.format           # Storage format of interim data
+    chunksize = options.chunksize       # Rows of raw data read at a time
+    jobs = options.jobs                 # Sensors loaded in parallel
 
+    process(settings_file, sensors_file, particles_file, raw_data_dir,
+            output_file, data_fmt, chunksize, jobs)
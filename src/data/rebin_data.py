@@ -6,93 +6,90 @@ import argparse
 import json
 import numpy as np
 import pandas as pd
-from rebin import *
 from utils import *
+from src.modules.binning import (BinSpec, bin_spec, TransferCache,
+                                 transfer_cache, rebin_values)
+from src.modules.buildcache import BuildCache, fingerprint
 
 
 def load_data(path):
     """Load a dataset
     """
-    df = pd.read_csv(path,
-                     parse_dates=[0],
-                     index_col=0,
-                     infer_datetime_format=True)
-    return df
+    return read_frame(path)
 
 
-def rebin(df, bins1, bins2):
+def rebin(df, bins1, bins2, cache=transfer_cache):
     """Rebin binned data to new bin boundaries.
-    Uses the rebin_piecewise_constant function from jhykes/rebin github repo.
+    Uses the rebin_piecewise_constant function from jhykes/rebin github repo
+    to build a transfer matrix which is applied to all rows at once.
 
     Args:
         df: Pandas: DataFrame
-        bins1 : list of float
-            List of low bin boundary positions, with the
+        bins1 : BinSpec
+            Bins of df, or a list of low bin boundary positions, with the
             last element being the top boundary of last bin.
-        bins2 : list of float
-            The list is the low bin boundary positions, with the
-            last element being the top boundary of last bin.
-            This list will be used to rebin the 'data' in bins1
+        bins2 : BinSpec
+            Bins to rebin df to, or a list of low bin boundary positions,
+            with the last element being the top boundary of last bin.
+            Columns of the output are labelled as in bins2, so a list is
+            given the name of the sensor of df.
+        cache: TransferCache
+            Where to look up the transfer matrix between bins1 and bins2
     Return:
         df: Pandas.DataFrame
             Output DataFrame with newly changed bins boundaries
     """
 
-    # Get column labels
-    columns1 = df.columns
     # What sensor it is
-    sensorName = columns1[0].split('-')[0]
-    # Old bins
-    bounds1 = bins1
+    sensorName = df.columns[0].split('-')[0]
 
-    # Generate new bins labels
-    bins2 = gen_bin_labels(bins2, sensorName)
-    bounds2 = bins2['bounds']
-    columns2 = bins2['columns']
+    # Old and new bins
+    bins1 = bin_spec(bins1, sensorName)
+    bins2 = bin_spec(bins2, sensorName)
+    x1 = bins1.bounds
+    x2 = bins2.bounds
+    columns2 = list(bins2.columns)
 
     # Ensure the lower boundary of lowest bin and upper boundary of
     # highest bin of new bin list is within the limits of old bin list
-    if bounds2[0] < bounds1[0]:
+    if x2[0] < x1[0]:
         msg = ("The lower boundary of new bottommost bin (%s)"
                "is lower then the lower boundary of old mottommost"
-               "bin (%s)" % (bounds2[0], bounds1[0]))
+               "bin (%s)" % (bins2.values[0], bins1.values[0]))
         raise ValueError(msg)
-    if bounds2[-1] > bounds1[-1]:
+    if x2[-1] > x1[-1]:
         msg = ("The upper boundary of new topmost bin (%s)"
                "is higher then the upper boundary of old topmost"
-               "bin (%s)" % (bounds2[-1], bounds1[-1]))
+               "bin (%s)" % (bins2.values[-1], bins1.values[-1]))
         raise ValueError(msg)
 
-    # Assign bin boundaries
-    x1 = np.array(bounds1)
-    x2 = np.array(bounds2)
+    # Fraction of each old bin that falls in each new bin
+    matrix = cache.get(x1, x2)
+    spread = cache.spread(x1, x2)
 
     # Check if input data is a series or dataframe
     if isinstance(df, pd.Series):
-        y1 = df.values
-        y2 = rebin_piecewise_constant(x1, y1, x2)
+        y2 = rebin_values(df.values, matrix, spread)
         # Initialise new dataframe
         df2 = pd.Series(y2, index=columns2)
     elif isinstance(df, pd.DataFrame):
-        index = df.index
+        y2 = rebin_values(df.values, matrix, spread)
         # Initialise new dataframe
-        df2 = pd.DataFrame(0, index=index, columns=columns2)
-        for ix in index:
-            y1 = df.loc[ix].values
-            y2 = rebin_piecewise_constant(x1, y1, x2)
-            df2.loc[ix] = y2
+        df2 = pd.DataFrame(y2, index=df.index, columns=columns2)
 
     return df2
 
 
-if __name__ == '__main__':
-    # Get filenames to work with
-    parser = argparse.ArgumentParser(description="")
-    parser.add_argument("settings", help="Settings yaml file")
-
-    options = parser.parse_args()
-    settings_file = options.settings    # Settings file
+def rebin_settings(settings_file):
+    """Rebin the calibrater data in a settings json file to the bins of the
+    calibratee and record the rebinned data of every condition in the file.
 
+    Args:
+        settings_file: str
+            Settings json file written by process.py
+    Returns:
+        settings: dict
+    """
     # Load settings json file
     with open(settings_file) as handle:
         settings = json.load(handle)
@@ -106,6 +103,11 @@ if __name__ == '__main__':
     calibrater_bins = sensors[calibrater]['bins']
     calibratee_bins = sensors[calibratee]['bins']
 
+    # Bins of calibrater data and the calibratee bins it is rebinned to,
+    # shared by all conditions
+    calibrater_spec = BinSpec(calibrater, calibrater_bins)
+    rebinned_spec = BinSpec(calibrater, calibratee_bins)
+
     # Name of rebinned dataset
     name = "rebinned-" + calibrater
 
@@ -124,24 +126,45 @@ if __name__ == '__main__':
 
     settings['sensors'] = sensors
 
+    # Transfer matrices are shared between conditions and kept next to the
+    # interim data for later runs
+    interim_dir = os.path.dirname(os.path.abspath(settings_file))
+    transfer = TransferCache(path=os.path.join(interim_dir, "transfer"))
+
+    # Work done by earlier runs, shared with process.py
+    output_dir = os.path.splitext(os.path.abspath(settings_file))[0]
+    cache = BuildCache(os.path.join(output_dir, "cache.json"))
+    script = cache.file_hash(__file__)
+
     # Conditions
     order = settings['exp']['order']
     conditions = settings['exp']['conditions']
 
-    for exp in order:
-        condition = conditions[exp]
-
-        # Load data path
-        calibrater_path = condition['sensor'][calibrater]['data']
+    # The data of the calibrater is rebinned once, and each condition is
+    # the same range of rows of it as of the calibrater data
+    calibrater_path = conditions['full']['sensor'][calibrater]['data']
 
+    # Skip rebinning if neither data nor bins have changed
+    key = "full/%s" % (name)
+    rebin_key = fingerprint(script, cache.file_hash(calibrater_path),
+                            calibrater_bins, calibratee_bins)
+    path = cache.get(key, rebin_key)
+    if path is None:
         # Load data
         calibrater_data = load_data(calibrater_path)
 
         # rebin calibrater dataset to match calibratee dataset
-        rebinned = rebin(calibrater_data, calibrater_bins, calibratee_bins)
+        rebinned = rebin(calibrater_data, calibrater_spec, rebinned_spec,
+                         transfer)
         dir = os.path.dirname(calibrater_path)
-        path = writeData(rebinned, dir, name)
-        condition['sensor'][name] = {'data': path}
+        fmt = data_format(calibrater_path)
+        path = writeData(rebinned, dir, name, fmt, calibratee_bins)
+        cache.set(key, rebin_key, [path], path)
+
+    for exp in order:
+        condition = conditions[exp]
+        rows = condition['sensor'][calibrater].get('rows')
+        condition['sensor'][name] = {'data': path, 'rows': rows}
         conditions[exp] = condition
 
     settings['exp']['conditions'] = conditions
@@ -150,5 +173,17 @@ if __name__ == '__main__':
     with open(settings_file, 'w') as handle:
         json.dump(settings, handle, default=date_handler,
                   sort_keys=True, indent=4)
+    cache.save()
+
+    return settings
+
 
+if __name__ == '__main__':
+    # Get filenames to work with
+    parser = argparse.ArgumentParser(description="")
+    parser.add_argument("settings", help="Settings yaml file")
+
+    options = parser.parse_args()
+    settings_file = options.settings    # Settings file
 
+    rebin_settings(settings_file)
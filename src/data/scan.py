@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Scan every raw log for duplicate timestamps, clock jumps, gaps, non-numeric
+values and sampling periods out of range before they are processed.
+
+Logs are scanned in parallel and the report of each is kept by the hash of
+its content, so only new or changed logs are read again. The report is
+written as json with an entry for each log relative to the raw directory,
+and a summary of the problems found is printed.
+
+Usage:
+    python src/data/scan.py data/raw -o data/interim/scan.json -j 4
+"""
+
+import os
+import sys
+import argparse
+import json
+import logging
+from multiprocessing import Pool
+from utils import *
+from src.modules.atomic import atomic_open
+from src.modules.buildcache import BuildCache, fingerprint
+from src.modules import scan as checks
+from src.modules.scan import scan_log, problems
+
+
+def find_logs(raw_data_dir):
+    """Paths of all .log files under a directory, in sorted order"""
+    paths = []
+    for root, dirs, files in os.walk(raw_data_dir):
+        dirs.sort()
+        paths += [os.path.join(root, x) for x in sorted(files)
+                  if x.endswith('.log')]
+    return paths
+
+
+def scan_task(args):
+    """scan_log() of the path and options in args, for worker processes"""
+    path, options = args
+    logging.debug("Scanning %s" % (path))
+    return scan_log(path, **options)
+
+
+def scan(raw_data_dir, output_file, jobs=1, **options):
+    """Scan every raw log under a directory and write a json report.
+
+    Args:
+        raw_data_dir: str
+            Root directory of raw data
+        output_file: str
+            Report json file, the hashes of logs already scanned are kept in
+            scan-cache.json next to it
+        jobs: int
+            Number of logs to scan at the same time
+        options:
+            Keywords passed to scan_log()
+    Returns:
+        reports: dict
+            Report of each log by its path relative to raw_data_dir
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    cache = BuildCache(os.path.join(output_dir, "scan-cache.json"))
+    script = fingerprint(cache.file_hash(__file__),
+                         cache.file_hash(checks.__file__))
+
+    # Logs that changed since they were last scanned
+    reports = {}
+    keys = {}
+    tasks = []
+    for path in find_logs(raw_data_dir):
+        name = os.path.relpath(path, raw_data_dir).replace(os.sep, '/')
+        keys[name] = fingerprint(script, cache.file_hash(path), options)
+        report = cache.get(name, keys[name])
+        if report is None:
+            tasks.append((name, path))
+        reports[name] = report
+
+    args = [(path, options) for name, path in tasks]
+    if jobs > 1 and len(args) > 1:
+        pool = Pool(min(jobs, len(args)))
+        try:
+            results = pool.map(scan_task, args, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [scan_task(x) for x in args]
+
+    for (name, path), report in zip(tasks, results):
+        report['hash'] = cache.file_hash(path)
+        cache.set(name, keys[name], [], report)
+        reports[name] = report
+
+    with atomic_open(output_file) as handle:
+        json.dump({'logs': reports,
+                   'problems': sorted(x for x in reports
+                                      if problems(reports[x]))},
+                  handle, sort_keys=True, indent=4)
+    cache.save()
+    return reports
+
+
+if __name__ == '__main__':
+    # Get filenames to work with
+    parser = argparse.ArgumentParser(description="Scan raw logs for "
+                                     "problems")
+    parser.add_argument("rawdatadir", help="Raw Data directory")
+    parser.add_argument("-o", "--output", default="data/interim/scan.json",
+                        help="Report json file")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of logs to scan in parallel")
+    parser.add_argument("-c", "--chunksize", type=int, default=100000,
+                        help="Read logs in chunks of this many lines")
+    parser.add_argument("--datetime-format",
+                        help="Format of timestamps, inferred if not given")
+    parser.add_argument("--gap", default="5min",
+                        help="Shortest time between lines that is a gap")
+    parser.add_argument("--min-period", type=float,
+                        help="Shortest expected time between lines in "
+                        "seconds, half the median if not given")
+    parser.add_argument("--max-period", type=float,
+                        help="Longest expected time between lines in "
+                        "seconds, one and a half times the median if not "
+                        "given")
+    parser.add_argument("--strict", action="store_true",
+                        help="Exit with an error if any log has problems")
+
+    options = parser.parse_args()
+
+    reports = scan(options.rawdatadir, options.output, options.jobs,
+                   chunksize=options.chunksize,
+                   datetime_format=options.datetime_format,
+                   gap=options.gap, min_period=options.min_period,
+                   max_period=options.max_period)
+
+    failed = []
+    for name, report in sorted(reports.items()):
+        found = problems(report)
+        if 'error' in report:
+            print("%s: %s" % (name, report['error']))
+        elif found:
+            print("%s: %s" % (name, ", ".join(
+                "%d %s (line %s)" % (report[x]['count'], x,
+                                     report[x]['lines'][0])
+                for x in found)))
+        else:
+            print("%s: %d lines, no problems" % (name, report['rows']))
+        if found:
+            failed.append(name)
+
+    if options.strict and failed:
+        sys.exit("Problems found in %s" % (", ".join(failed)))
@@ -4,12 +4,25 @@
 # Utility functions for data scripts
 
 import os
+import sys
+
+# Scripts here and in src/visualisation are run by path, so their utils put
+# the project root on sys.path for src.modules. Elsewhere run with the project
+# root on PYTHONPATH or with python -m.
+_project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            os.pardir, os.pardir))
+if _project_dir not in sys.path:
+    sys.path.append(_project_dir)
+
+from src.modules.store import (FORMATS, DEFAULT_FORMAT, data_format,
+                              write_frame, read_frame, read_data,
+                              window_rows)
+from src.modules.binning import BinSpec
+
 
 def gen_bin_labels(binsList, string):
     """ Prepend a string to a list of bins boundaries to label each bin.
-    Loop over bin boundaries list and if an element is an integer prepend
-    given string to the integer and if not an integer leave an empty string
-    in its place in list.
+    Elements of the list that are not numbers are left out.
 
     Args:
         binsList: list of ints
@@ -20,47 +33,34 @@ def gen_bin_labels(binsList, string):
 
     Returns:
         bins: dict
-            The dict contain three key-values pair; columns, bounds,
-            stringbins.
-                columns key is for labelling Pandas DataFrame columns
+            The dict contain three key-values pair; columns, bounds, index.
+            columns key is for labelling Pandas DataFrame columns
             bounds is the bin boundaries list minus any empty element.
-            stringbins is the bin boundaries as string for display
+            index is the position of each column in binsList
 
     """
-    columns = []
-    newBinsList = []
-    chosen_index = []
-
-    for ix, val in enumerate(binsList):
-        if isinstance(val, (int, float)):
-            chosen_index = chosen_index + [ix]
-            columns = columns + ["%s-%s" % (string, val)]
-            newBinsList = newBinsList + [val]
-
-    # Drop last element
-    chosen_index = chosen_index[:-1]
-    columns = columns[:-1]
-
-    # Return dict of bin labels and bin value lists
-    bins = {'columns': columns, 'bounds': newBinsList, 'index': chosen_index}
-    return bins
-
-def writeData(df, path, filename):
-    """Write Pandas.DataFrame to csv file
+    return BinSpec(string, binsList).labels()
+
+
+def writeData(df, path, filename, fmt=DEFAULT_FORMAT, bins=None):
+    """Write Pandas.DataFrame to file
     Args:
         df: Pandas.DataFrame
         path: string
             Path to location of file
         filename: str
             Name of the file
-    Returns: None
+        fmt: str
+            Storage format, one of npz, parquet, feather, csv or grid
+        bins: list
+            Bin boundaries of the data, kept by the grid format
+    Returns:
+        path: str
+            Path to the written file
     """
-    filename = filename + ".csv"
+    filename = filename + "." + fmt
     path = os.path.join(path, filename)
-
-    # df.to_csv(path, header=True, index=True, index_label=df.index.name)
-    df.to_csv(path)
-    return path
+    return write_frame(df, path, bins)
 
 
 def date_handler(obj):
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Alignment of the data of two sensors by minute.
+The timestamps of both sensors are turned into whole minutes since the
+epoch as int64 and intersected as sorted arrays, so every row of one sensor
+is paired with the row of the other sensor in the same minute however many
+rows either has. Minutes only one of the sensors has are left out, and
+values that are missing are flagged in a validity mask rather than dropped,
+so each bin can use every minute where both of its values are known.
+
+Usage:
+    index, values, valid = align(calibratee, rebinned)
+    df = align_frames(calibratee, rebinned)
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def minute_ordinals(index):
+    """Whole minutes since the epoch of an index of datetimes as int64"""
+    return pd.DatetimeIndex(index).values.astype('<M8[m]').astype(np.int64)
+
+
+def match_minutes(index1, index2):
+    """Rows of two indices of datetimes in the same minute.
+
+    Indices in time order with one row a minute, as process.py writes them,
+    are matched with a binary search of one in the other. Other indices are
+    sorted first, and the first row of a minute is used if it has several.
+
+    Args:
+        index1: Pandas.DatetimeIndex
+        index2: Pandas.DatetimeIndex
+    Returns:
+        rows1: ndarray
+            Rows of index1 of the minutes in both, in time order
+        rows2: ndarray
+            Rows of index2 of the same minutes
+    """
+    minutes1 = minute_ordinals(index1)
+    minutes2 = minute_ordinals(index2)
+    if not len(minutes1) or not len(minutes2):
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    if (np.diff(minutes1) > 0).all() and (np.diff(minutes2) > 0).all():
+        found = np.searchsorted(minutes2, minutes1)
+        found = np.minimum(found, len(minutes2) - 1)
+        both = minutes2[found] == minutes1
+        return np.flatnonzero(both), found[both]
+    _, rows1, rows2 = np.intersect1d(minutes1, minutes2,
+                                     return_indices=True)
+    return rows1, rows2
+
+
+def align(df1, df2):
+    """Pair the rows of two DataFrames by minute.
+
+    Args:
+        df1: Pandas.DataFrame
+            Data with index of datetimes
+        df2: Pandas.DataFrame
+            Data with index of datetimes
+    Returns:
+        index: Pandas.DatetimeIndex
+            Minutes in both, from the index of df1
+        values: ndarray
+            Array of shape (minutes, columns of df1 + columns of df2) of the
+            values of df1 followed by those of df2 in each minute
+        valid: ndarray
+            Boolean array of the same shape, False where a value is NaN
+    """
+    rows1, rows2 = match_minutes(df1.index, df2.index)
+    values = np.empty((len(rows1), df1.shape[1] + df2.shape[1]))
+    values[:, :df1.shape[1]] = df1.values[rows1]
+    values[:, df1.shape[1]:] = df2.values[rows2]
+    return df1.index[rows1], values, ~np.isnan(values)
+
+
+def align_frames(df1, df2):
+    """Join two DataFrames on the minutes of their indices, keeping minutes
+    in both. Columns are those of df1 followed by those of df2.
+
+    Args:
+        df1: Pandas.DataFrame
+        df2: Pandas.DataFrame
+    Returns:
+        df: Pandas.DataFrame
+    """
+    index, values, valid = align(df1, df2)
+    return pd.DataFrame(values, index=index,
+                        columns=list(df1.columns) + list(df2.columns))
+
+
+def valid_pairs(index, values, valid, column1, column2):
+    """Values of two columns of aligned data in the minutes where both are
+    known
+
+    Args:
+        index, values, valid:
+            Aligned data from align()
+        column1: int
+        column2: int
+    Returns:
+        x: ndarray
+        y: ndarray
+        index: Pandas.DatetimeIndex
+    """
+    both = valid[:, column1] & valid[:, column2]
+    return values[both, column1], values[both, column2], index[both]
@@ -7,12 +7,11 @@
 """
 
 import os
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy import polyval
-import statsmodels.api as sm
+from src.modules.lazy import LazyModule
+from src.modules.regression import regression
+from src.modules.histogram import STATS, histogram_frame
 
 # matplotlib settings
 params = {                      # setup matplotlib to use latex for output
@@ -35,7 +34,17 @@ params = {                      # setup matplotlib to use latex for output
         r"\usepackage{siunitx}"
         ]
     }
-matplotlib.rcParams.update(params)
+
+
+def setup_matplotlib():
+    """Import matplotlib and apply the settings above"""
+    import matplotlib as mpl
+    mpl.rcParams.update(params)
+
+
+# matplotlib is only imported when first used
+matplotlib = LazyModule('matplotlib', setup_matplotlib)
+plt = LazyModule('matplotlib.pyplot', setup_matplotlib)
 
 
 def figsize(scale):
@@ -230,71 +239,18 @@ def histogram(data, plotspath, statspath, name):
     dataDict = {}
     dataDict['histplot'] = {}
 
-    # Initialise new series
-    columns = ["lower", "upper", "width", "midpoint",
-               "loglower", "logupper", "logwidth", "logmidpoint",
-               'Counts', 'Cum Counts', 'Density', "dN/logD"]
-    df1 = pd.DataFrame(columns=columns)
-
-    # Take a mean of the input dataframe which becomes a series with column
-    df1['Counts'] = df.mean(axis=0)
-    totalCounts = df1['Counts'].sum()
-
-    df1["lower"] = bounds[:-1]
-    df1["upper"] = bounds[1:]
-    df1["width"] = df1["upper"] - df1["lower"]
-    df1["midpoint"] = df1["width"]/2 + df1["lower"]
-    df1["loglower"] = np.log10(df1["lower"])
-    df1["logupper"] = np.log10(df1["upper"])
-    df1["logwidth"] = df1["logupper"] - df1["loglower"]
-    df1["logmidpoint"] = np.log10(df1["midpoint"])
-    df1["Density"] = df1["Counts"] / df1["width"]
-    df1["dN/logD"] = df1["Counts"] / df1["logwidth"]
-
-    # Iterate through the bins
-    bins = df1.index
-    cumCounts = 0
-    for ix, key in enumerate(bins):
-        counts = df1['Counts'].iloc[ix]
-        lower = df1['lower'].iloc[ix]
-        width = df1["width"].iloc[ix]
-
-        # Cumulative frequency
-        lowerCumCounts = cumCounts
-        cumCounts += counts
-        upperCumCounts = cumCounts
-        df1['Cum Counts'].iloc[ix] = cumCounts
-
-        # Median
-        if lowerCumCounts < totalCounts/2 < upperCumCounts:
-            median = lower + ((totalCounts/2 - lowerCumCounts)/counts) * width
-
-    # Statistics
-    counts = df1['Counts'].values
-    midpoints = df1["midpoint"].values
-    # logmidpoints = np.log10(midpoints)
-
-    # Normal distribution
-    mean, std, lower, upper = statistics(midpoints, counts)
-
-    # Log normal distribution
-    gm, gstd, glower, gupper = np.exp(statistics(np.log(midpoints), counts))
+    df1, stats = histogram_frame(df, bounds)
+
+    index = ['Median',
+             'Mean Diameter', 'Std', '95% lower', '95% upper',
+             'Geometric mean diameter', 'Geometric standard deviation',
+             'Geometric 95% lower', 'Geometric 95% upper']
+    statsdata = [stats[x] for x in STATS]
 
     # Sometimes a median is not found and so need to be excluded from display
-    if 'median' in locals():
-        index = ['Median',
-                 'Mean Diameter', 'Std', '95% lower', '95% upper',
-                 'Geometric mean diameter', 'Geometric standard deviation',
-                 'Geometric 95% lower', 'Geometric 95% upper']
-        statsdata = [median,
-                     mean, std, lower, upper,
-                     gm, std, glower, gupper]
-    else:
-        index = ['Mean Diameter', 'Std', '95% lower', '95% upper',
-                 'Geometric mean diameter', 'Geometric standard deviation',
-                 'Geometric 95% lower', 'Geometric 95% upper']
-        statsdata = [mean, std, lower, upper,
-                     gm, std, glower, gupper]
+    if np.isnan(stats['median']):
+        index = index[1:]
+        statsdata = statsdata[1:]
 
     statsdf = pd.DataFrame(statsdata, index=index)
     columns = ['Counts', 'Cum Counts', 'Density']
@@ -539,7 +495,7 @@ def calibrate(df, plot_path, data_path, name):
                 intercept = results[2]
 
                 # Create best fit line
-                yf = polyval([slope, intercept], x)
+                yf = np.polyval([slope, intercept], x)
                 ax.plot(x, yf, label=fit_label)
                 ax.legend(loc='lower right')
 
@@ -567,19 +523,6 @@ def calibrate(df, plot_path, data_path, name):
     return paths, reg_dict
 
 
-def regression(x, y):
-    # Add a column of 1s to ensure intercept can be calculated
-    # by regression analysis of statsmodel
-    x = sm.add_constant(x, prepend=False)
-    # Linear regression
-    result = sm.OLS(y, x).fit()
-    slope, intercept = result.params
-    slopeerr, intercepterr = result.bse
-    rs = result.rsquared
-    results = (slope, slopeerr, intercept, intercepterr, rs)
-    return results
-
-
 def regression_table(dict, order, path, name):
     """
     Generate a latex table out of regression analysis of each particle size
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Atomic writes of shared files.
+Caches under data/interim are read and written by several processes at once
+under make -j or with worker processes. A file is written to a temporary
+file in the same directory and moved into place with os.replace, so readers
+either see the old file or the whole new one, never a part written one.
+The file gets the permissions open would have given it under the umask,
+not the owner only ones of a temporary file.
+
+Usage:
+    with atomic_open(path) as handle:
+        json.dump(data, handle)
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_open(path, mode='w'):
+    """Open a temporary file that replaces path when closed without error.
+
+    Args:
+        path: str
+            File to write, its directory is made if it does not exist
+        mode: str
+            'w' for text or 'wb' for binary
+    Returns:
+        handle: file object
+    """
+    dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dir, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=dir, suffix='.tmp',
+                                prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, mode) as handle:
+            yield handle
+        # The umask can only be read by setting it
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp, 0o666 & ~umask)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
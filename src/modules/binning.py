@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Bin geometry and rebinning of binned data.
+Ensure you have install rebin module.
+
+Rebinning is linear in the counts, so the geometry between two sets of bin
+boundaries can be worked out once as a transfer matrix and then applied to a
+whole time series of histograms with a single matrix multiply. Missing
+counts are rebinned as zeros and the new bins they would have made NaN
+row by row are set back to NaN from a spread matrix, built the same way.
+The matrices are kept in a TransferCache keyed by the two lists of bin
+boundaries so repeated rebinning of the same pair of sensors reuses them.
+
+The geometry of the bins of a sensor, their boundaries, widths, midpoints
+and column labels, is worked out once in a BinSpec and shared by the
+loading, rebinning and histogram code.
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from src.modules.atomic import atomic_open
+
+
+class BinSpec(object):
+    """Immutable geometry of the bins of a sensor.
+
+    Args:
+        name: str
+            Name of the sensor, prepended to each bin to label its column
+        bins: list
+            Lower bin boundaries with the last element being the upper
+            boundary of the last bin, as in conditions/sensors.yaml. Any
+            element that is not a number, such as an empty string, marks a
+            column of the raw data that is not loaded.
+
+    Attributes:
+        name: str
+        bins: tuple
+            Bins as given, including the elements that are not numbers
+        values: tuple
+            Bin boundaries as given, without the elements that are not
+            numbers
+        bounds: ndarray
+            Bin boundaries, one more than there are bins
+        lower, upper, widths, midpoints: ndarray
+            Lower and upper boundaries, width and midpoint of each bin
+        loglower, logupper, logwidths, logmidpoints: ndarray
+            Same as above in log10 of the boundaries
+        columns: tuple of str
+            Column label of each bin, {name}-{lower boundary}
+        index: tuple of int
+            Position in bins of the lower boundary of each bin, which is
+            also its column in the raw data after the datetime
+    """
+
+    __slots__ = ('name', 'bins', 'values', 'bounds', 'lower', 'upper', 'widths',
+                 'midpoints', 'loglower', 'logupper', 'logwidths',
+                 'logmidpoints', 'columns', 'index')
+
+    def __init__(self, name, bins):
+        chosen = [(ix, val) for ix, val in enumerate(bins)
+                  if isinstance(val, (int, float))]
+        index = tuple(ix for ix, val in chosen[:-1])
+        values = tuple(val for ix, val in chosen)
+        bounds = np.array(values, dtype=float)
+        lower = bounds[:-1]
+        upper = bounds[1:]
+        widths = upper - lower
+        loglower = np.log10(lower)
+        logupper = np.log10(upper)
+        attributes = {
+            'name': name,
+            'bins': tuple(bins),
+            'values': values,
+            'bounds': bounds,
+            'lower': lower,
+            'upper': upper,
+            'widths': widths,
+            'midpoints': widths / 2 + lower,
+            'loglower': loglower,
+            'logupper': logupper,
+            'logwidths': logupper - loglower,
+            'logmidpoints': np.log10(widths / 2 + lower),
+            'columns': tuple("%s-%s" % (name, val) for ix, val in chosen[:-1]),
+            'index': index}
+        for key, value in attributes.items():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("BinSpec is immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError("BinSpec is immutable")
+
+    def __reduce__(self):
+        # Rebuilt from its arguments when sent to worker processes, with the
+        # placeholders that give the positions of the columns
+        return (BinSpec, (self.name, list(self.bins)))
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __repr__(self):
+        return "BinSpec(%r, %r)" % (self.name, list(self.bins))
+
+    def __eq__(self, other):
+        return (isinstance(other, BinSpec) and self.name == other.name and
+                self.bins == other.bins)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.name, self.bins))
+
+    def labels(self):
+        """Dict of columns, bounds and index of the bins, as lists"""
+        return {'columns': list(self.columns), 'bounds': list(self.values),
+                'index': list(self.index)}
+
+
+def bin_spec(bins, name=''):
+    """BinSpec of bins, which may already be one or a list of boundaries"""
+    if isinstance(bins, BinSpec):
+        return bins
+    return BinSpec(name, bins)
+
+
+def bin_specs(sensors):
+    """BinSpec of every sensor in a dict of sensor definitions or settings,
+    each with a list of bins.
+    """
+    return {name: BinSpec(name, sensor['bins'])
+            for name, sensor in sensors.items() if 'bins' in sensor}
+
+
+def transfer_matrix(bounds1, bounds2):
+    """Work out how much of each old bin ends up in each new bin.
+    The matrix is built by rebinning each unit histogram with the
+    rebin_piecewise_constant function from jhykes/rebin github repo, so it
+    shares the exact geometry of the per-row rebinning.
+
+    Args:
+        bounds1 : list of float
+            List of low bin boundary positions, with the
+            last element being the top boundary of last bin.
+        bounds2 : list of float
+            New list of low bin boundary positions, with the
+            last element being the top boundary of last bin.
+    Returns:
+        matrix: ndarray
+            Array of shape (len(bounds2) - 1, len(bounds1) - 1) where element
+            [i, j] is the fraction of old bin j counted in new bin i.
+    """
+    # Only needed to build matrices, so code that only needs the geometry
+    # of bins does not depend on rebin
+    from rebin import rebin_piecewise_constant
+
+    x1 = np.asarray(bounds1, dtype=float)
+    x2 = np.asarray(bounds2, dtype=float)
+    identity = np.eye(len(x1) - 1)
+    columns = [rebin_piecewise_constant(x1, y1, x2) for y1 in identity]
+    return np.array(columns).T
+
+
+def spread_matrix(bounds1, bounds2):
+    """Work out which new bins are NaN when an old bin is NaN.
+    rebin_piecewise_constant sums the old bins cumulatively, so a NaN spreads
+    to new bins above it as well as those it overlaps. Each old bin is made
+    NaN on its own to find the new bins it spreads to.
+
+    Args:
+        bounds1 : list of float
+            List of low bin boundary positions, with the
+            last element being the top boundary of last bin.
+        bounds2 : list of float
+            New list of low bin boundary positions, with the
+            last element being the top boundary of last bin.
+    Returns:
+        spread: ndarray
+            Boolean array of the same shape as transfer_matrix() where
+            element [i, j] is True if new bin i is NaN when old bin j is.
+    """
+    from rebin import rebin_piecewise_constant
+
+    x1 = np.asarray(bounds1, dtype=float)
+    x2 = np.asarray(bounds2, dtype=float)
+    missing = np.where(np.eye(len(x1) - 1) > 0, np.nan, 0)
+    columns = [np.isnan(rebin_piecewise_constant(x1, y1, x2))
+               for y1 in missing]
+    return np.array(columns).T
+
+
+def rebin_values(values, matrix, spread=None):
+    """Rebin an array of histograms with a transfer matrix.
+
+    Args:
+        values : ndarray
+            Array of shape (bins1,) or (rows, bins1).
+        matrix : ndarray
+            Transfer matrix from transfer_matrix()
+        spread : ndarray
+            Spread matrix from spread_matrix(), if None a NaN only makes the
+            new bins it overlaps NaN
+    Returns:
+        values : ndarray
+            Array of shape (bins2,) or (rows, bins2).
+    """
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    if not missing.any():
+        return np.dot(values, matrix.T)
+    if spread is None:
+        spread = matrix != 0
+    rebinned = np.dot(np.where(missing, 0, values), matrix.T)
+    rebinned[np.dot(missing, spread.T)] = np.nan
+    return rebinned
+
+
+def bounds_signature(bounds1, bounds2):
+    """Hash two lists of bin boundaries into a short hex string."""
+    digest = hashlib.sha1()
+    for bounds in (bounds1, bounds2):
+        bounds = np.asarray(bounds, dtype=float)
+        digest.update(str(len(bounds)).encode())
+        digest.update(bounds.tobytes())
+    return digest.hexdigest()
+
+
+class TransferCache(object):
+    """Least recently used cache of transfer matrices.
+
+    Matrices are held in memory and, if a directory is given, also saved as
+    {signature}.npy files so they survive between runs. Files are replaced
+    whole, so processes sharing the directory never read a part written one.
+
+    Args:
+        maxsize : int
+            Number of matrices to keep in memory.
+        path : str
+            Optional directory to persist matrices to.
+    """
+
+    def __init__(self, maxsize=32, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self._matrices = OrderedDict()
+
+    def __len__(self):
+        return len(self._matrices)
+
+    def get(self, bounds1, bounds2):
+        """Return the transfer matrix from bounds1 to bounds2, building it
+        only if it is neither in memory nor on disk.
+        """
+        return self._lookup(bounds_signature(bounds1, bounds2),
+                            transfer_matrix, bounds1, bounds2)
+
+    def spread(self, bounds1, bounds2):
+        """Return the spread matrix from bounds1 to bounds2, cached in the
+        same way as the transfer matrix.
+        """
+        return self._lookup("spread-" + bounds_signature(bounds1, bounds2),
+                            spread_matrix, bounds1, bounds2)
+
+    def _lookup(self, key, build, bounds1, bounds2):
+        if key in self._matrices:
+            self._matrices.move_to_end(key)
+            return self._matrices[key]
+
+        matrix = None
+        if self.path is not None:
+            path = os.path.join(self.path, key + ".npy")
+            if os.path.isfile(path):
+                matrix = np.load(path)
+        if matrix is None:
+            matrix = build(bounds1, bounds2)
+            if self.path is not None:
+                # Other processes may be reading it
+                with atomic_open(path, 'wb') as handle:
+                    np.save(handle, matrix)
+
+        self._matrices[key] = matrix
+        while len(self._matrices) > self.maxsize:
+            self._matrices.popitem(last=False)
+        return matrix
+
+    def clear(self):
+        self._matrices.clear()
+
+
+# Cache shared by callers that do not bring their own
+transfer_cache = TransferCache()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Incremental builds of interim data.
+Each piece of work, such as loading a sensor or slicing a condition out of
+it, is given a fingerprint of everything it depends on; hashes of raw files,
+sensor definitions, start and end of conditions and the script itself.
+A manifest of fingerprints and the outputs they produced is kept as json
+next to the outputs, and work is only done again when its fingerprint
+changes or its outputs have gone missing.
+"""
+
+import os
+import json
+import hashlib
+from src.modules.atomic import atomic_open
+
+
+def fingerprint(*parts):
+    """Hash any json serialisable parts into a hex string"""
+    dump = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(dump.encode()).hexdigest()
+
+
+class BuildCache(object):
+    """Manifest of fingerprints of work done and the outputs produced.
+
+    Args:
+        path: str
+            Path to manifest json file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.entries = {}
+        if os.path.isfile(path):
+            with open(path) as handle:
+                manifest = json.load(handle)
+            self.files = manifest.get('files', {})
+            self.entries = manifest.get('entries', {})
+
+    def file_hash(self, path):
+        """SHA-1 of a file's content.
+        The hash is remembered with the size and modification time of the
+        file so unchanged files are not read again.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self.files.get(path)
+        if (known is not None and known['size'] == stat.st_size and
+                known['mtime'] == stat.st_mtime_ns):
+            return known['hash']
+        digest = hashlib.sha1()
+        with open(path, 'rb') as handle:
+            for block in iter(lambda: handle.read(1 << 20), b''):
+                digest.update(block)
+        self.files[path] = {'size': stat.st_size,
+                            'mtime': stat.st_mtime_ns,
+                            'hash': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def fresh(self, key, fingerprint):
+        """True if key was built with the same fingerprint and all of its
+        outputs still exist, whatever value was stored with it.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry['fingerprint'] != fingerprint:
+            return False
+        return all(os.path.exists(x) for x in entry['outputs'])
+
+    def get(self, key, fingerprint):
+        """Value stored for key if it is fresh(), otherwise None."""
+        if not self.fresh(key, fingerprint):
+            return None
+        return self.entries[key]['value']
+
+    def set(self, key, fingerprint, outputs, value=None):
+        """Record work done for key and the output files it produced"""
+        self.entries[key] = {'fingerprint': fingerprint,
+                             'outputs': list(outputs),
+                             'value': value}
+
+    def save(self):
+        with atomic_open(self.path) as handle:
+            json.dump({'files': self.files, 'entries': self.entries}, handle,
+                      sort_keys=True, indent=4)
@@ -9,14 +9,14 @@ Sources of advice
 http://stackoverflow.com/questions/2154249/identify-groups-of-continuous-numbers-in-a-list
 """
 
-from operator import itemgetter
-from itertools import groupby
 import os
 import sys
 import numpy as np
 import pandas as pd
 import datetime as dt
 from rebin import *
+from src.modules.binning import BinSpec, transfer_cache, rebin_values
+from src.modules.segments import findGroups, findSegments, writeSegments
 
 
 def date_handler(obj):
@@ -27,7 +27,7 @@ def date_handler(obj):
         # raise TypeError
 
 
-def loadData(path, bins, string):
+def loadData(path, bins, string, chunksize=None):
     """Load binned data into a Pandas.DataFrame where first column is datetime,
     each columns represent a bin and name each column according to a list of
     floats in argument.
@@ -39,6 +39,9 @@ def loadData(path, bins, string):
         List of floats of bin boundaries, where every except the last element
         represent lower bin boundary and the last is uppper bin boundary of the
         last bin.
+        chunksize : int
+        Number of rows to read at a time, if given the data is an iterator
+        over DataFrames of that many rows.
     Returns:
         df: Pandas.DataFrame
 
@@ -60,7 +63,8 @@ def loadData(path, bins, string):
                      infer_datetime_format=True,
                      header=None,
                      names=cols,
-                     usecols=usecols)
+                     usecols=usecols,
+                     chunksize=chunksize)
 
     # Add data to bindata
     binData['data'] = df
@@ -75,9 +79,7 @@ def loadData(path, bins, string):
 
 def generateBinLabels(binsList, string):
     """ Prepend a string to a list of bins boundaries to label each bin.
-    Loop over bin boundaries list and if an element is an integer prepend
-    given string to the integer and if not an integer leave an empty string
-    in its place in list.
+    Elements of the list that are not numbers are left out.
     Also create another list of bin boundaries with slashes for display.
 
     Args:
@@ -96,26 +98,8 @@ def generateBinLabels(binsList, string):
             stringbins is the bin boundaries as string for display
 
     """
-    columns = []
-    stringBins = []
-    newBinsList = []
-    chosen_index = []
-
-    for ix, val in enumerate(binsList):
-        if isinstance(val, (int, float)):
-            chosen_index = chosen_index + [ix]
-            columns = columns + ["%s-%s" % (string, val)]
-            stringBins = stringBins + ["%s/ " % (val)]
-            newBinsList = newBinsList + [val]
-
-    # Drop last element
-    chosen_index = chosen_index[:-1]
-    columns = columns[:-1]
-    stringBins = stringBins[:-1]
-
-    # Return dict of bin labels and bin value lists
-    bins = {'columns': columns, 'stringbins': stringBins,
-            'bounds': newBinsList, 'index': chosen_index}
+    bins = BinSpec(string, binsList).labels()
+    bins['stringbins'] = ["%s/ " % (val) for val in bins['bounds'][:-1]]
     return bins
 
 
@@ -145,18 +129,6 @@ def continuousFill(data):
     return data
 
 
-def findGroups(index):
-    """
-    Find group of consective sequence
-    """
-
-    ranges = []
-    for k, g in groupby(enumerate(index), lambda ix: ix[1]-ix[0]):
-        group = list(map(itemgetter(1), g))
-        ranges.append((group[0], group[-1]))
-    return ranges
-
-
 def findGaps(data):
     """
     Find null values and group them
@@ -194,31 +166,20 @@ def segments(data, path, name):
     Group non-null values into segments and write them to file
     """
     try:
-        if isinstance(data,  pd.DataFrame):
-            ts = data[data.columns[0]]
-        else:
-            ts = data
-
-        # Fill missing data with NaNs
-        ts = ts.reindex(pd.date_range(min(ts.index), max(ts.index), freq='T'))
+        if isinstance(data,  pd.Series):
+            data = data.to_frame()
 
-        index = np.where(ts.notnull())[0]
-        ranges = findGroups(index)
+        # Find segments between gaps and NaN
+        ranges = findSegments(data)
         if len(ranges) != 0:
             start,  end = zip(* ranges)
             startdt = data.index[list(start)]
             enddt = data.index[list(end)]
             dict = {"Startx": start, "Endx": end,
                     "Startdt": startdt, "Enddt": enddt}
-            list = ["Startx", "Endx", "Startdt", "Enddt"]
-            df = pd.DataFrame(dict, columns=list)
-            for i in range(0, len(ranges)):
-                segment = data.iloc[start[i]:(end[i]+1)]
-                startdt = segment.index[0].strftime("%Y-%m-%d_%H-%M-%S")
-                enddt = segment.index[-1].strftime("%Y-%m-%d_%H-%M-%S")
-                filename = "%s_%s_%s" % (startdt, enddt, name)
-                path1 = os.path.join(path, filename)
-                segment.to_csv(path1, header=None)
+            columns = ["Startx", "Endx", "Startdt", "Enddt"]
+            df = pd.DataFrame(dict, columns=columns)
+            writeSegments(data, ranges, path, name)
             return df
         else:
             print("All Nan!")
@@ -240,44 +201,30 @@ def difference(df):
     return diff
 
 
-def concat(df1, df2):
-    """Concatenate two Pandas.DataFrames together.
-    The first dataframe's index will be used to set the index of second if the
-    length of the indexes are equal.
-    Different length dataframes can be concatanced together, where the shorted
-    index is used.
-    """
-    if len(df1) == len(df2):
-        print("Same")
-        df2.index = df1.index
-        df = df1.join(df2)
-    elif len(df1) > len(df2):
-        print("df1 big")
-        start = df2.index[0]
-        end = df2.index[-1]
-        df3 = df1.loc[start:end]
-        df = df3.join(df2)
-    elif len(df1) < len(df2):
-        print("df2 big")
-        start = df1.index[0]
-        end = df1.index[-1]
-        df3 = df2.loc[start:end]
-        df = df1.join(df3)
-    else:
-        error = "Something not right!"
-        print(error)
-        sys.exit(2)
-    return df
-
-
-def realCounts(data):
+def realCounts(data, inplace=True):
     """Subtract the upper bins from the lower bins
+    The sum of all bins above each bin is worked out for every row at once.
+    The bins are added in the same order as DataFrame.sum adds them, so the
+    counts are the same to the last bit as subtracting column by column.
+
+    Args:
+        data: Pandas.DataFrame
+            Cumulative counts where each column is a bin
+        inplace: bool
+            Overwrite the columns of data, otherwise return a new DataFrame
+    Returns:
+        data: Pandas.DataFrame
     """
-    # Get number of columns, loop over, sum upper and subtract from lower.
-    columns = data.columns
-    for i in range(0, len(columns)):
-        sumup = data[columns[(i+1):]].sum(axis=1)
-        data[columns[i]] = data[columns[i]] - sumup
+    values = data.values
+    # Sum of the bins above each bin, missing values count as zero
+    filled = np.where(np.isnan(values), 0, values)
+    upper = np.zeros_like(filled)
+    for i in range(filled.shape[1] - 1):
+        upper[:, i] = filled[:, i + 1:].sum(axis=1)
+    counts = values - upper
+    if not inplace:
+        return pd.DataFrame(counts, index=data.index, columns=data.columns)
+    data[data.columns] = counts
     return data
 
 
@@ -330,7 +277,8 @@ def pruneBins(data):
 
 def rebin(bins1, bins2):
     """Rebin binned data to new bin boundaries.
-    Uses the rebin_piecewise_constant function from jhykes/rebin github repo.
+    Uses the rebin_piecewise_constant function from jhykes/rebin github repo
+    to build a transfer matrix which is applied to all rows at once.
 
     Args:
         bins1 : dict of str: list, str: list, str: Pandas.DataFrame
@@ -380,20 +328,19 @@ def rebin(bins1, bins2):
     x1 = np.array(bins1['bounds'])
     x2 = np.array(bins2['bounds'])
 
+    # Fraction of each old bin that falls in each new bin
+    matrix = transfer_cache.get(x1, x2)
+    spread = transfer_cache.spread(x1, x2)
+
     # Check if input data is a series or dataframe
     if isinstance(bins1['data'], pd.Series):
-        y1 = bins1['data'].values
-        y2 = rebin_piecewise_constant(x1, y1, x2)
+        y2 = rebin_values(bins1['data'].values, matrix, spread)
         # Initialise new dataframe
         bins2['data'] = pd.Series(y2, index=bins2['columns'])
     elif isinstance(bins1['data'], pd.DataFrame):
-        index = bins1['data'].index
-        columns = bins2['columns']
+        y2 = rebin_values(bins1['data'].values, matrix, spread)
         # Initialise new dataframe
-        bins2['data'] = pd.DataFrame(0, index=index, columns=columns)
-        for ix in index:
-            y1 = bins1['data'].loc[ix].values
-            y2 = rebin_piecewise_constant(x1, y1, x2)
-            bins2['data'].loc[ix] = y2
+        bins2['data'] = pd.DataFrame(y2, index=bins1['data'].index,
+                                     columns=bins2['columns'])
 
     return bins2
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Minute grid storage of interim data.
+process.py sets the seconds of every timestamp to zero, so the data of a
+sensor is a regular grid of minutes with gaps. A grid file holds the value
+of every minute from the first to the last, with NaN in minutes without
+data, after a small header giving the first minute and the bins. It is read
+with np.memmap, so the rows of any window of time are found by offset
+arithmetic without reading or searching an index, and processes reading the
+same file share its pages.
+
+Layout of a grid file;
+
+    b'GRID' and the length of the header as little endian uint32
+    json header padded with spaces to a multiple of 64 bytes
+    values, float64 array of shape (minutes, columns) in row major order
+    present, uint8 array of shape (minutes,), 1 where the data had a row
+
+The present flags keep minutes of the data whose values are all NaN apart
+from the gaps, so read_grid gives back the rows that were written.
+
+Usage:
+    write_grid(df, "data/interim/dylos-alpha/full/alpha.grid", bins)
+    rows = grid_rows("data/interim/dylos-alpha/full/alpha.grid",
+                     "2016-09-08 07:55", "2016-09-08 10:30")
+    df = read_grid("data/interim/dylos-alpha/full/alpha.grid", rows)
+"""
+
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+MAGIC = b'GRID'
+ALIGN = 64
+VERSION = 1
+MINUTE = np.timedelta64(1, 'm')
+
+
+def write_grid(df, path, bins=None):
+    """Write Pandas.DataFrame with an index of whole minutes to a grid file
+
+    Args:
+        df: Pandas.DataFrame
+            Data in time order with at most one row a minute
+        path: str
+        bins: list
+            Bin boundaries of the data, kept in the header
+    Returns:
+        path: str
+    """
+    times = pd.DatetimeIndex(df.index).values
+    minutes = times.astype('<M8[m]')
+    if (minutes != times).any():
+        msg = "Index of data for %s is not whole minutes" % (path)
+        raise ValueError(msg)
+    offsets = ((minutes - minutes[0]) // MINUTE if len(minutes) else
+               np.zeros(0, dtype=np.int64))
+    if (np.diff(offsets) <= 0).any():
+        msg = ("Data for %s is not in time order with at most one row a "
+               "minute, resample it to minutes or use another format" %
+               (path))
+        raise ValueError(msg)
+
+    # Every minute from the first to the last, NaN where there is no data
+    length = int(offsets[-1]) + 1 if len(offsets) else 0
+    values = np.full((length, df.shape[1]), np.nan)
+    values[offsets] = df.values
+    present = np.zeros(length, dtype=np.uint8)
+    present[offsets] = 1
+
+    header = {'version': VERSION,
+              'start': str(minutes[0]) if length else None,
+              'minutes': length,
+              'columns': [str(x) for x in df.columns],
+              'index_name': df.index.name,
+              'dtype': values.dtype.str,
+              'bins': bins}
+    text = json.dumps(header).encode('utf-8')
+    size = len(MAGIC) + 4 + len(text)
+    text += b' ' * (-size % ALIGN)
+
+    with open(path, 'wb') as handle:
+        handle.write(MAGIC + struct.pack('<I', len(text)))
+        handle.write(text)
+        handle.write(values.tobytes())
+        handle.write(present.tobytes())
+    return path
+
+
+def read_header(path):
+    """Header of a grid file, with 'offset' of the values in the file"""
+    with open(path, 'rb') as handle:
+        start = handle.read(len(MAGIC) + 4)
+        if start[:len(MAGIC)] != MAGIC:
+            msg = "%s is not a grid file" % (path)
+            raise ValueError(msg)
+        length = struct.unpack('<I', start[len(MAGIC):])[0]
+        header = json.loads(handle.read(length).decode('utf-8'))
+    header['offset'] = len(start) + length
+    return header
+
+
+def grid_rows(path, start, end, header=None):
+    """Start and stop of the rows of a grid file from start to end, both
+    included
+
+    Args:
+        path: str
+        start: str or datetime
+        end: str or datetime
+        header: dict
+            Header of the file from read_header(), read if not given
+    Returns:
+        rows: list of int
+    """
+    if header is None:
+        header = read_header(path)
+    length = header['minutes']
+    if not length:
+        return [0, 0]
+    first = np.datetime64(header['start'], 'm')
+    start = pd.Timestamp(start).to_datetime64()
+    end = pd.Timestamp(end).to_datetime64()
+    # First whole minute at or after start and last at or before end
+    lower = -((first - start) // MINUTE)
+    upper = (end - first) // MINUTE + 1
+    lower = int(min(max(lower, 0), length))
+    upper = int(min(max(upper, lower), length))
+    return [lower, upper]
+
+
+def read_grid(path, rows=None):
+    """Read Pandas.DataFrame from a grid file. The values are a copy on
+    write memory map of the file, unless some minutes of the rows are gaps
+    which are left out.
+
+    Args:
+        path: str
+        rows: list of int
+            Start and stop of the rows to read, all rows if None
+    Returns:
+        df: Pandas.DataFrame
+    """
+    header = read_header(path)
+    length = header['minutes']
+    columns = header['columns']
+    dtype = np.dtype(header['dtype'])
+    start, stop = [0, length] if rows is None else rows
+    start = min(max(start, 0), length)
+    stop = min(max(stop, start), length)
+
+    if length and columns:
+        values = np.memmap(path, dtype=dtype, mode='c',
+                           offset=header['offset'],
+                           shape=(length, len(columns)))[start:stop]
+    else:
+        values = np.empty((stop - start, len(columns)), dtype=dtype)
+    if length:
+        present = np.memmap(path, dtype=np.uint8, mode='c',
+                            offset=(header['offset'] +
+                                    length * len(columns) * dtype.itemsize),
+                            shape=(length,))[start:stop]
+        times = (np.datetime64(header['start'], 'm') +
+                 np.arange(start, stop) * MINUTE)
+    else:
+        present = np.empty(0, dtype=np.uint8)
+        times = np.empty(0, dtype='<M8[m]')
+
+    keep = present.astype(bool)
+    if not keep.all():
+        values = values[keep]
+        times = times[keep]
+    index = pd.Index(times, name=header['index_name'])
+    return pd.DataFrame(values, index=index, columns=columns)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Statistics of binned size distributions.
+Cumulative counts, interpolated median, arithmetic and geometric moments and
+dN/logD of a histogram are all worked out with array operations along the
+last axis, so a whole stack of histograms, such as every condition of a
+sensor, is done in one call.
+"""
+
+import numpy as np
+import pandas as pd
+from src.modules.binning import bin_spec
+
+# Per bin quantities of a histogram
+COLUMNS = ["lower", "upper", "width", "midpoint",
+           "loglower", "logupper", "logwidth", "logmidpoint",
+           'Counts', 'Cum Counts', 'Density', "dN/logD"]
+
+# Statistics of a histogram
+STATS = ['median', 'mean', 'std', 'lower', 'upper',
+         'gmd', 'gstd', 'glower', 'gupper']
+
+
+def weighted_moments(x, counts):
+    """Mean, standard deviation and 95% bounds of x weighted by counts
+    along the last axis.
+    """
+    total = counts.sum(axis=-1)
+    mean = (x * counts).sum(axis=-1) / total
+    std = np.sqrt((((x - mean[..., np.newaxis]) ** 2) * counts).sum(axis=-1) /
+                  total)
+    return mean, std, mean - 2 * std, mean + 2 * std
+
+
+def histogram_stats(counts, bins):
+    """Work out histograms and their statistics.
+
+    Args:
+        counts: array
+            Array of shape (..., bins) of counts in each bin
+        bins: BinSpec
+            Geometry of the bins, or a list of bin boundaries
+    Returns:
+        table: dict
+            Arrays of shape (..., bins) for each of COLUMNS
+        stats: dict
+            Arrays of shape (...) for each of STATS. The median is NaN where
+            the half way count does not fall inside a bin.
+    """
+    bins = bin_spec(bins)
+    counts = np.asarray(counts, dtype=float)
+
+    # Cumulative frequency before and after each bin
+    upperCumCounts = np.cumsum(counts, axis=-1)
+    lowerCumCounts = upperCumCounts - counts
+    half = upperCumCounts[..., -1:] / 2
+
+    # Median, interpolated in the last bin where the cumulative frequency
+    # passes half the total
+    found = (lowerCumCounts < half) & (half < upperCumCounts)
+    last = counts.shape[-1] - 1 - np.argmax(found[..., ::-1], axis=-1)
+    before = np.take_along_axis(lowerCumCounts, last[..., np.newaxis], -1)
+    inside = np.take_along_axis(counts, last[..., np.newaxis], -1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        median = (bins.lower[last] + (half - before)[..., 0] /
+                  inside[..., 0] * bins.widths[last])
+    median = np.where(found.any(axis=-1), median, np.nan)
+
+    # Normal and log normal distribution
+    mean, std, lower95, upper95 = weighted_moments(bins.midpoints, counts)
+    gmd, gstd, glower, gupper = np.exp(weighted_moments(
+        np.log(bins.midpoints), counts))
+
+    geometry = [bins.lower, bins.upper, bins.widths, bins.midpoints,
+                bins.loglower, bins.logupper, bins.logwidths,
+                bins.logmidpoints]
+    table = dict(zip(COLUMNS, [np.broadcast_to(x, counts.shape)
+                               for x in geometry] +
+                     [counts, upperCumCounts, counts / bins.widths,
+                      counts / bins.logwidths]))
+    stats = dict(zip(STATS, [median, mean, std, lower95, upper95,
+                             gmd, gstd, glower, gupper]))
+    return table, stats
+
+
+def histogram_frame(df, bins):
+    """Histogram of the mean of binned data with a row for each bin.
+
+    Args:
+        df: Pandas.DataFrame
+            Data where each column is a bin
+        bins: BinSpec
+            Geometry of the bins, or a list of bin boundaries
+    Returns:
+        df1: Pandas.DataFrame
+            Histogram with COLUMNS
+        stats: dict
+            Floats for each of STATS
+    """
+    counts = df.mean(axis=0)
+    table, stats = histogram_stats(counts.values, bins)
+    df1 = pd.DataFrame(table, index=counts.index, columns=COLUMNS)
+    return df1, {key: float(value) for key, value in stats.items()}
+
+
+def rolling_stats(df, bins, window='10min', step='1min'):
+    """Statistics of the mean histogram in a window sliding along binned
+    data.
+
+    Sums of each bin over every window come from the difference of two
+    cumulative sums, so all windows are worked out in one pass whatever
+    their length. Missing values are left out of the mean of their bin and
+    windows without data have NaN statistics.
+
+    Args:
+        df: Pandas.DataFrame
+            Data with index of datetimes where each column is a bin
+        bins: BinSpec
+            Geometry of the bins, or a list of bin boundaries
+        window: str
+            Length of window, as understood by Pandas.Timedelta
+        step: str
+            Time between the starts of windows
+    Returns:
+        stats: Pandas.DataFrame
+            STATS and number of rows of each window, indexed by the start of
+            the window
+    """
+    window = pd.Timedelta(window)
+    step = pd.Timedelta(step)
+    if not len(df):
+        return pd.DataFrame(columns=STATS + ['rows'],
+                            index=pd.DatetimeIndex([]))
+
+    times = df.index.values.astype('<M8[ns]')
+    starts = pd.date_range(df.index[0].floor(step), df.index[-1], freq=step)
+
+    # Rows in each window [start, start + window)
+    first = np.searchsorted(times, starts.values, side='left')
+    last = np.searchsorted(times, (starts + window).values, side='left')
+
+    # Cumulative sums and number of values of each bin with a leading zero
+    values = df.values.astype(float)
+    valid = ~np.isnan(values)
+    sums = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(np.where(valid, values, 0), axis=0, out=sums[1:])
+    numbers = np.zeros(sums.shape)
+    np.cumsum(valid, axis=0, out=numbers[1:])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        counts = (sums[last] - sums[first]) / (numbers[last] - numbers[first])
+        table, stats = histogram_stats(counts, bins)
+
+    stats = pd.DataFrame(stats, index=starts, columns=STATS)
+    stats['rows'] = last - first
+    return stats
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Time lag between the data of two sensors.
+The total counts of two sensors rise and fall together when they sample the
+same air, so the time one sensor's clock is off from the other's is the lag
+where their total counts correlate best. The correlation at every lag up to
+a limit is worked out with FFTs in O(n log n), with each lag using only the
+minutes both sensors have data for.
+
+Lags are in minutes, a positive lag means events appear later in the second
+sensor than in the first, so its data should be shifted back by the lag.
+
+Usage:
+    lag, correlation, overlap = best_lag(calibrater, calibratee, 120)
+"""
+
+import re
+from datetime import timedelta
+import numpy as np
+from src.modules.align import minute_ordinals
+
+TIMESHIFT = re.compile(r'^([+-]?)(\d+):(\d{1,2}):(\d{1,2})$')
+
+
+def parse_timeshift(timeshift):
+    """Signed timedelta of a timeshift setting such as '-00:01:00' or
+    '-0:1:0'
+    """
+    match = TIMESHIFT.match(str(timeshift).strip())
+    if match is None:
+        msg = "Timeshift %r is not of the form +HH:MM:SS" % (timeshift)
+        raise ValueError(msg)
+    sign, hours, minutes, seconds = match.groups()
+    if not sign:
+        raise ValueError("Sign not given for timeshift")
+    if int(minutes) > 59 or int(seconds) > 59:
+        msg = "Minutes or seconds of timeshift %r out of range" % (timeshift)
+        raise ValueError(msg)
+    delta = timedelta(hours=int(hours), minutes=int(minutes),
+                      seconds=int(seconds))
+    return -delta if sign == '-' else delta
+
+
+def format_timeshift(delta):
+    """Timeshift setting of a signed timedelta, as read by parse_timeshift"""
+    seconds = int(round(delta.total_seconds()))
+    sign = '-' if seconds < 0 else '+'
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return "%s%02d:%02d:%02d" % (sign, hours, minutes, seconds)
+
+
+def minute_totals(df, first, length):
+    """Total counts of binned data in every minute of a grid.
+
+    Args:
+        df: Pandas.DataFrame
+            Data with index of datetimes where each column is a bin
+        first: int
+            Minute ordinal of the first minute of the grid
+        length: int
+            Number of minutes of the grid
+    Returns:
+        totals: ndarray
+            Sum of the bins of each minute, NaN where there is no data
+    """
+    totals = np.full(length, np.nan)
+    offsets = minute_ordinals(df.index) - first
+    inside = (offsets >= 0) & (offsets < length)
+    sums = np.nansum(df.values, axis=1)
+    sums[np.isnan(df.values).all(axis=1)] = np.nan
+    totals[offsets[inside]] = sums[inside]
+    return totals
+
+
+def lagged_sums(a, b, max_lag, size):
+    """Sums of a[t] * b[t + lag] over t for lags from -max_lag to max_lag"""
+    spectrum = np.conj(np.fft.rfft(a, size)) * np.fft.rfft(b, size)
+    sums = np.fft.irfft(spectrum, size)
+    return np.concatenate([sums[size - max_lag:], sums[:max_lag + 1]])
+
+
+def correlation_by_lag(x, y, max_lag):
+    """Pearson correlation of x[t] with y[t + lag] for every lag from
+    -max_lag to max_lag, each over the minutes where both are known.
+
+    Args:
+        x: ndarray
+            Series of one value a minute, NaN where there is no data
+        y: ndarray
+            Series of same length as x
+        max_lag: int
+            Largest lag in minutes either way
+    Returns:
+        lags: ndarray
+            Lags in minutes
+        correlation: ndarray
+            Correlation at each lag, NaN where it is not defined
+        overlap: ndarray
+            Number of minutes used at each lag
+    """
+    max_lag = int(min(max_lag, max(len(x) - 1, 0)))
+    mx = ~np.isnan(x)
+    my = ~np.isnan(y)
+    # Centre the values for precision, missing values do not count
+    x = np.where(mx, x - (np.nanmean(x) if mx.any() else 0), 0)
+    y = np.where(my, y - (np.nanmean(y) if my.any() else 0), 0)
+    mx = mx.astype(float)
+    my = my.astype(float)
+
+    # Circular correlation of a length that does not wrap around
+    size = 1 << (len(x) + max_lag).bit_length()
+    n = np.round(lagged_sums(mx, my, max_lag, size))
+    sx = lagged_sums(x, my, max_lag, size)
+    sy = lagged_sums(mx, y, max_lag, size)
+    sxx = lagged_sums(x * x, my, max_lag, size)
+    syy = lagged_sums(mx, y * y, max_lag, size)
+    sxy = lagged_sums(x, y, max_lag, size)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = n * sxy - sx * sy
+        variance = (n * sxx - sx * sx) * (n * syy - sy * sy)
+        correlation = covariance / np.sqrt(variance)
+    correlation[(n < 2) | ~(variance > 0)] = np.nan
+    return np.arange(-max_lag, max_lag + 1), correlation, n.astype(int)
+
+
+def best_lag(df1, df2, max_lag, min_overlap=60):
+    """Lag of df2 behind df1 where their total counts correlate best.
+
+    Args:
+        df1: Pandas.DataFrame
+            Reference data with index of datetimes where each column is a bin
+        df2: Pandas.DataFrame
+            Data of the other sensor
+        max_lag: int
+            Largest lag in minutes either way
+        min_overlap: int
+            Fewest minutes of data both sensors need at a lag for it to count
+    Returns:
+        lag: int
+            Lag in minutes, None if no lag has enough data
+        correlation: float
+        overlap: int
+            Number of minutes used at the lag
+    """
+    minutes1 = minute_ordinals(df1.index)
+    minutes2 = minute_ordinals(df2.index)
+    if not len(minutes1) or not len(minutes2):
+        return None, np.nan, 0
+    first = min(minutes1.min(), minutes2.min())
+    length = int(max(minutes1.max(), minutes2.max()) - first) + 1
+    x = minute_totals(df1, first, length)
+    y = minute_totals(df2, first, length)
+
+    lags, correlation, overlap = correlation_by_lag(x, y, max_lag)
+    correlation[overlap < min_overlap] = np.nan
+    if np.isnan(correlation).all():
+        return None, np.nan, 0
+    best = np.nanargmax(correlation)
+    return int(lags[best]), float(correlation[best]), int(overlap[best])
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Lazy imports of heavy dependencies.
+matplotlib and friends take longer to import than most stages take to run,
+and the Makefile runs the stages many times per build. A LazyModule stands
+in for a module and only imports it when one of its attributes is first
+used, so a script that never plots never pays for matplotlib.
+
+Usage:
+    plt = LazyModule('matplotlib.pyplot', setup=apply_settings)
+    fig = plt.figure()  # matplotlib.pyplot is imported here
+"""
+
+import importlib
+
+
+class LazyModule(object):
+    """Module imported on first use of one of its attributes.
+
+    Args:
+        name: str
+            Full name of the module
+        setup: callable
+            Optional function called once before the module is imported,
+            such as one applying settings to a parent package
+    """
+
+    def __init__(self, name, setup=None):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_setup', setup)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        module = object.__getattribute__(self, '_module')
+        if module is None:
+            setup = object.__getattribute__(self, '_setup')
+            if setup is not None:
+                setup()
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, '_module', module)
+        return module
+
+    def __getattr__(self, key):
+        return getattr(self._load(), key)
+
+    def __setattr__(self, key, value):
+        setattr(self._load(), key, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return "<LazyModule %r (%s)>" % (self._name, state)
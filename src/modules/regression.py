@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Ordinary least squares fits of one sensor against another.
+A straight line fit of y against x only depends on a few sums of the data,
+so the sums of every bin of every condition are worked out first and all
+the fits are then done at once with array arithmetic.
+
+The sums are kept as the number of points, the means of x and y and the
+sums of squares and products about the means, which keeps the fits as
+precise as a full least squares solution.
+
+Each fit gives, in this order;
+
+    slope, slope error, intercept, intercept error, R squared
+
+which are the same as params, bse and rsquared of statsmodels OLS with a
+constant added to x.
+
+Sums of two sets of data can be merged, so a CalibrationAccumulator can be
+fed data as it arrives, or separate parts of a campaign can be summed in
+parallel and merged afterwards.
+"""
+
+import numpy as np
+
+# Layout of the last axis of arrays returned by moments()
+N, MEAN_X, MEAN_Y, SXX, SXY, SYY = range(6)
+
+
+def moments(x, y):
+    """Sums of pairs of x and y needed for a straight line fit.
+
+    Args:
+        x: array
+            Array of shape (..., n), fits are along the last axis
+        y: array
+            Array of same shape as x
+    Returns:
+        moments: ndarray
+            Array of shape (..., 6) of the number of pairs, means of x and y
+            and sums of squares and products of x and y about their means.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.shape[-1]
+    mean_x = x.mean(axis=-1)
+    mean_y = y.mean(axis=-1)
+    dx = x - mean_x[..., np.newaxis]
+    dy = y - mean_y[..., np.newaxis]
+    return np.stack([np.full(mean_x.shape, float(n)), mean_x, mean_y,
+                     (dx * dx).sum(axis=-1), (dx * dy).sum(axis=-1),
+                     (dy * dy).sum(axis=-1)], axis=-1)
+
+
+def merge_moments(a, b):
+    """Merge sums of two sets of pairs into the sums of all pairs.
+
+    Args:
+        a: array
+            Array of shape (..., 6) from moments()
+        b: array
+            Array of same shape as a
+    Returns:
+        moments: ndarray
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    na = a[..., N]
+    nb = b[..., N]
+    n = na + nb
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Weight of the second set, none if both are empty
+        wb = np.where(n > 0, nb / n, 0)
+        cross = na * wb
+        # Difference of means only counts if neither set is empty
+        both = (na > 0) & (nb > 0)
+        dx = np.where(both, b[..., MEAN_X] - a[..., MEAN_X], 0)
+        dy = np.where(both, b[..., MEAN_Y] - a[..., MEAN_Y], 0)
+        mean_x = np.where(na > 0, a[..., MEAN_X] + dx * wb, b[..., MEAN_X])
+        mean_y = np.where(na > 0, a[..., MEAN_Y] + dy * wb, b[..., MEAN_Y])
+        mean_x = np.where(n > 0, mean_x, 0)
+        mean_y = np.where(n > 0, mean_y, 0)
+    return np.stack([n, mean_x, mean_y,
+                     a[..., SXX] + b[..., SXX] + dx * dx * cross,
+                     a[..., SXY] + b[..., SXY] + dx * dy * cross,
+                     a[..., SYY] + b[..., SYY] + dy * dy * cross], axis=-1)
+
+
+def ols(moments):
+    """Straight line fits from their sums.
+
+    Args:
+        moments: array
+            Array of shape (..., 6) from moments()
+    Returns:
+        fits: ndarray
+            Array of shape (..., 5) of slope, slope error, intercept,
+            intercept error and R squared of each fit. Fits where x does
+            not vary are NaN.
+    """
+    moments = np.asarray(moments, dtype=float)
+    n = moments[..., N]
+    mean_x = moments[..., MEAN_X]
+    mean_y = moments[..., MEAN_Y]
+    sxx = moments[..., SXX]
+    sxy = moments[..., SXY]
+    syy = moments[..., SYY]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = sxy / sxx
+        intercept = mean_y - slope * mean_x
+
+        # Residual sum of squares and variance of residuals
+        ssr = np.maximum(syy - slope * sxy, 0)
+        variance = ssr / (n - 2)
+
+        slope_error = np.sqrt(variance / sxx)
+        intercept_error = np.sqrt(variance * (1 / n + mean_x ** 2 / sxx))
+        rsquared = 1 - ssr / syy
+
+    return np.stack([slope, slope_error, intercept, intercept_error,
+                     rsquared], axis=-1)
+
+
+def regression(x, y):
+    """Fit a straight line to y against x
+
+    Args:
+        x: array
+        y: array
+    Returns:
+        results: tuple
+            slope, slope error, intercept, intercept error and R squared
+    """
+    return tuple(ols(moments(x, y)).tolist())
+
+
+class CalibrationAccumulator(object):
+    """Running sums of calibratee and rebinned calibrater data for a
+    calibration fit of each bin.
+
+    Rows with a missing value in a bin are left out of the fit of that bin.
+
+    Args:
+        bins: int
+            Number of bins shared by both sensors
+
+    Usage:
+        accumulator = CalibrationAccumulator(2)
+        accumulator.update(calibratee.values, rebinned.values)
+        accumulator.merge(other_accumulator)
+        slope, slope_error, intercept, intercept_error, rs = \
+            accumulator.fits()[0]
+    """
+
+    def __init__(self, bins):
+        self.moments = np.zeros((bins, 6))
+
+    def __len__(self):
+        return int(self.moments[:, N].max())
+
+    def update(self, x, y):
+        """Add rows of data
+
+        Args:
+            x: array
+                Calibratee data of shape (rows, bins), or (bins,) for a
+                single row
+            y: array
+                Rebinned calibrater data of same shape as x
+        Returns:
+            self
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float)).T
+        y = np.atleast_2d(np.asarray(y, dtype=float)).T
+        valid = ~(np.isnan(x) | np.isnan(y))
+        n = valid.sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_x = np.where(valid, x, 0).sum(axis=-1) / n
+            mean_y = np.where(valid, y, 0).sum(axis=-1) / n
+        dx = np.where(valid, x - mean_x[:, np.newaxis], 0)
+        dy = np.where(valid, y - mean_y[:, np.newaxis], 0)
+        batch = np.stack([n, mean_x, mean_y, (dx * dx).sum(axis=-1),
+                          (dx * dy).sum(axis=-1), (dy * dy).sum(axis=-1)],
+                         axis=-1)
+        self.moments = merge_moments(self.moments, batch)
+        return self
+
+    def merge(self, other):
+        """Add the data of another accumulator
+
+        Args:
+            other: CalibrationAccumulator
+        Returns:
+            self
+        """
+        self.moments = merge_moments(self.moments, other.moments)
+        return self
+
+    def fits(self):
+        """Fit of each bin
+
+        Returns:
+            fits: ndarray
+                Array of shape (bins, 5) from ols()
+        """
+        return ols(self.moments)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Quality checks of raw logs.
+A raw log has a timestamp followed by numbers on every line, which is what
+process.py expects. A log is read in chunks of lines, the fields on each
+line are counted from its bytes and the chunk is parsed by the C parser of
+pandas with as many columns as its longest line, so any line can be read
+whatever its length. Columns of numbers are read as numbers, and each chunk
+is checked with array operations for;
+
+    blank lines
+    bad timestamps           - timestamps that cannot be parsed
+    non-numeric cells        - values that are not numbers
+    too few fields           - lines with fewer fields than the first line
+    too many fields          - lines with more fields than the first line,
+                               such as two lines run together
+    missing cells            - lines with an empty value
+    backward jumps           - timestamps earlier than the one before
+    duplicate timestamps     - timestamps seen before
+    duplicate minutes        - minutes seen before, which process.py merges
+    gaps                     - time between lines longer than the gap
+    periods out of range     - time between lines outside the expected
+                               sampling period, but shorter than a gap
+
+Only columns the parser could not read as numbers are checked cell by cell.
+Only the timestamps of the log are kept between chunks, so the memory used
+does not depend on the number of values on each line. The expected sampling
+period is the median time between lines unless given.
+"""
+
+import csv
+import io
+import itertools
+import numpy as np
+import pandas as pd
+
+# Checks in the order they are reported
+CHECKS = ['blank lines', 'bad timestamps', 'non-numeric cells',
+          'too few fields', 'too many fields', 'missing cells',
+          'backward jumps', 'duplicate timestamps', 'duplicate minutes',
+          'gaps', 'periods out of range']
+
+# Line numbers kept as examples of each problem
+EXAMPLES = 10
+
+# A minute in int64 nanoseconds
+MINUTE = 60 * 10 ** 9
+
+
+def issue(lines):
+    """Count and first EXAMPLES line numbers of a problem"""
+    lines = np.asarray(lines, dtype=np.int64)
+    return {'count': int(len(lines)),
+            'lines': [int(x) for x in np.sort(lines)[:EXAMPLES]]}
+
+
+def repeated(values, lines):
+    """Lines whose value was already seen on an earlier line"""
+    if not len(values):
+        return lines[:0]
+    order = np.lexsort((lines, values))
+    values = values[order]
+    same = values[1:] == values[:-1]
+    return lines[order][1:][same]
+
+
+def read_chunks(path, chunksize):
+    """Bytes of chunks of lines of a log, every line ending with LF"""
+    with open(path, 'rb') as handle:
+        while True:
+            chunk = b''.join(itertools.islice(handle, chunksize))
+            if not chunk:
+                return
+            if not chunk.endswith(b'\n'):
+                chunk += b'\n'
+            yield chunk.replace(b'\r\n', b'\n') if b'\r' in chunk else chunk
+
+
+def field_counts(chunk):
+    """Number of comma separated fields on each line of a chunk, 0 for
+    blank lines
+    """
+    raw = np.frombuffer(chunk, dtype=np.uint8)
+    ends = np.flatnonzero(raw == ord('\n'))
+    commas = np.searchsorted(np.flatnonzero(raw == ord(',')), ends)
+    fields = np.diff(np.concatenate([[0], commas])) + 1
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    fields[ends == starts] = 0
+    return fields
+
+
+def scan_chunk(chunk, fields, expected, datetime_format=None):
+    """Check the values of a chunk of a log.
+
+    Args:
+        chunk: Pandas.DataFrame
+            Lines of the log, first column is the timestamp as text, index
+            is the line number counting from zero
+        fields: ndarray
+            Number of fields on each line, from field_counts()
+        expected: int
+            Number of fields every line should have
+        datetime_format: str
+            Format of the timestamps, inferred if None
+    Returns:
+        counts: dict
+            Line numbers of blank lines, bad timestamps, non-numeric cells,
+            lines with too few or too many fields and missing cells
+        lines: ndarray
+            Line numbers of lines with a timestamp
+        times: ndarray
+            Timestamps of those lines as int64 nanoseconds
+    """
+    lines = chunk.index.values.astype(np.int64) + 1
+    blank = fields == 0
+
+    # Timestamps
+    times = pd.to_datetime(chunk[chunk.columns[0]], format=datetime_format,
+                           errors='coerce')
+    good = ~times.isna().values
+    bad_time = ~good & ~blank
+
+    # Values, columns of numbers only need checking for empty cells
+    values = chunk[chunk.columns[1:]]
+    non_numeric = np.zeros(len(chunk), dtype=bool)
+    for column in values.columns[(values.dtypes == object).values]:
+        text = values[column]
+        numbers = pd.to_numeric(text, errors='coerce')
+        non_numeric |= (numbers.isna() & text.notna()).values
+
+    # Cells past the end of a line are not missing, the line is short
+    inside = np.arange(chunk.shape[1]) < fields[:, None]
+    missing = (chunk.isna().values & inside)[:, 1:].any(axis=1) & ~blank
+
+    counts = {'blank lines': lines[blank],
+              'bad timestamps': lines[bad_time],
+              'non-numeric cells': lines[non_numeric],
+              'too few fields': lines[~blank & (fields < expected)],
+              'too many fields': lines[fields > expected],
+              'missing cells': lines[missing]}
+    return counts, lines[good], times.values[good].astype('<M8[ns]').view(
+        np.int64)
+
+
+def scan_log(path, chunksize=100000, datetime_format=None, gap='5min',
+             min_period=None, max_period=None):
+    """Check a raw log for problems.
+
+    Args:
+        path: str
+            Raw log with a timestamp and values on each line
+        chunksize: int
+            Number of lines to read at a time
+        datetime_format: str
+            Format of the timestamps, inferred if None
+        gap: str
+            Shortest time between lines that is a gap
+        min_period: float
+            Shortest expected time between lines in seconds, half the median
+            if None
+        max_period: float
+            Longest expected time between lines in seconds, one and a half
+            times the median if None
+    Returns:
+        report: dict
+            Number of lines, fields of the first line, first and last
+            timestamp, median period and longest time between lines in
+            seconds, and count and example lines of each of CHECKS. 'error'
+            is given instead if the log could not be read.
+    """
+    found = dict((x, []) for x in CHECKS)
+    lines = []
+    times = []
+    expected = None
+    rows = 0
+    try:
+        for raw in read_chunks(path, chunksize):
+            fields = field_counts(raw)
+            if expected is None and fields.any():
+                expected = int(fields[np.flatnonzero(fields)[0]])
+            # Lines are only split at LF and quotes are kept as they are,
+            # so each line is a row however many fields it has
+            chunk = pd.read_csv(io.BytesIO(raw), header=None,
+                                names=range(max(fields.max(), 1)),
+                                dtype={0: str}, skip_blank_lines=False,
+                                quoting=csv.QUOTE_NONE, lineterminator='\n',
+                                encoding_errors='replace')
+            chunk.index = chunk.index + rows
+            counts, chunk_lines, chunk_times = scan_chunk(
+                chunk, fields, expected or 0, datetime_format)
+            for key, value in counts.items():
+                found[key].append(value)
+            lines.append(chunk_lines)
+            times.append(chunk_times)
+            rows += len(chunk)
+    except (OSError, pd.errors.ParserError) as error:
+        return {'error': str(error).strip()}
+
+    lines = np.concatenate(lines) if lines else np.zeros(0, np.int64)
+    times = np.concatenate(times) if times else np.zeros(0, np.int64)
+
+    # Time between each line and the line with a timestamp before it
+    steps = np.diff(times)
+    after = lines[1:]
+    forward = steps[steps > 0]
+    period = float(np.median(forward)) / 1e9 if len(forward) else None
+    gap = pd.Timedelta(gap).value
+    lower = (min_period if min_period is not None else
+             (period or 0) * 0.5) * 1e9
+    upper = (max_period if max_period is not None else
+             (period or 0) * 1.5) * 1e9
+
+    found['backward jumps'].append(after[steps < 0])
+    found['duplicate timestamps'].append(repeated(times, lines))
+    found['duplicate minutes'].append(repeated(times // MINUTE, lines))
+    found['gaps'].append(after[steps > gap])
+    found['periods out of range'].append(
+        after[(steps > 0) & (steps <= gap) &
+              ((steps < lower) | (steps > upper))])
+
+    report = {'rows': rows,
+              'columns': expected or 0,
+              'first': (str(pd.Timestamp(times.min())) if len(times)
+                        else None),
+              'last': (str(pd.Timestamp(times.max())) if len(times)
+                       else None),
+              'period': period,
+              'longest interval': (float(steps.max()) / 1e9 if len(steps)
+                                   else None)}
+    for key in CHECKS:
+        report[key] = issue(np.concatenate(found[key]) if found[key]
+                            else [])
+    return report
+
+
+def problems(report):
+    """Names of the checks a report of scan_log() found problems with"""
+    if 'error' in report:
+        return ['error']
+    return [x for x in CHECKS if report[x]['count']]
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Segments of time series without gaps.
+Runs of consecutive minutes are found from where the difference between
+neighbouring minutes is not one, so the boundaries of all segments come out
+of a few array operations however long the series is.
+
+Segments are written as csv, one file per segment plus a file of all
+segments. Every row is serialised once and both outputs are cut from the
+same buffer.
+"""
+
+import os
+import io
+import numpy as np
+
+
+def runBounds(index):
+    """Find where runs of consecutive integers start and end
+
+    Args:
+        index: array of int
+    Returns:
+        first: ndarray
+            Position in index of the first element of each run
+        last: ndarray
+            Position in index of the last element of each run
+    """
+    index = np.asarray(index)
+    if not len(index):
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    # A run breaks wherever the next element does not follow on
+    breaks = np.flatnonzero(np.diff(index) != 1) + 1
+    first = np.concatenate([[0], breaks])
+    last = np.concatenate([breaks - 1, [len(index) - 1]])
+    return first, last
+
+
+def findGroups(index):
+    """
+    Find group of consective sequence
+    """
+    index = np.asarray(index)
+    first, last = runBounds(index)
+    return list(zip(index[first].tolist(), index[last].tolist()))
+
+
+def findSegments(data):
+    """Find segments of minute data without missing minutes or null values in
+    the first column.
+
+    Args:
+        data: Pandas.DataFrame
+    Returns:
+        ranges: list of tuples
+            First and last row of each segment
+    """
+    rows = np.flatnonzero(data[data.columns[0]].notnull().values)
+    minutes = data.index.values[rows].astype('<M8[m]').astype(np.int64)
+    first, last = runBounds(minutes)
+    return list(zip(rows[first].tolist(), rows[last].tolist()))
+
+
+def writeSegments(data, ranges, path, name, combined=None):
+    """Write each segment of data to its own csv file, named after its start
+    and end datetimes, and all segments to a combined file.
+
+    Args:
+        data: Pandas.DataFrame
+        ranges: list of tuples
+            First and last row of each segment
+        path: str
+            Directory to write segments to
+        name: str
+            Name of data, appended to segment filenames
+        combined: str
+            Path of file to append all segments to, if any
+    Returns:
+        paths: list of str
+            Paths of segment files
+    """
+    if not len(ranges):
+        return []
+    starts, ends = np.array(ranges).T
+    # Rows of all segments, serialised in one go
+    rows = np.concatenate([np.arange(a, b + 1) for a, b in ranges])
+    buffer = io.StringIO()
+    data.iloc[rows].to_csv(buffer, header=None)
+    text = buffer.getvalue().encode()
+
+    # Byte offsets of the end of each row, then of each segment
+    newlines = np.flatnonzero(np.frombuffer(text, dtype=np.uint8) ==
+                              ord('\n')) + 1
+    lengths = ends - starts + 1
+    offsets = np.concatenate([[0], newlines[np.cumsum(lengths) - 1]])
+
+    paths = []
+    stamps = data.index[starts].strftime("%Y-%m-%d_%H-%M-%S")
+    stops = data.index[ends].strftime("%Y-%m-%d_%H-%M-%S")
+    for i in range(len(ranges)):
+        filename = "%s_%s_%s" % (stamps[i], stops[i], name)
+        path1 = os.path.join(path, filename)
+        with open(path1, 'wb') as handle:
+            handle.write(text[offsets[i]:offsets[i + 1]])
+        paths.append(path1)
+    if combined is not None:
+        with open(combined, 'ab') as handle:
+            handle.write(text)
+    return paths
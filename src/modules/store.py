@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Storage of interim data.
+DataFrames passed between the stages of the analysis are written in a binary
+format so the later stages do not have to decode text and parse datetimes.
+The format is chosen by the extension of the file;
+
+    npz     - NumPy arrays of the index, values and column labels
+    parquet - Apache Parquet, needs pyarrow or fastparquet
+    feather - Apache Arrow, needs pyarrow
+    csv     - Plain text, kept for exporting data
+    grid    - Memory mapped grid of minutes, see src.modules.grid
+
+Each condition of an experiment is a range of rows of the data of a sensor,
+recorded in the settings json as {'data': path, 'rows': [start, stop]}.
+read_frame reads only those rows; from npz the arrays are read straight from
+the rows' offsets in the file and from csv the other lines are skipped. The
+rows of a grid are minutes from its first minute and map straight onto the
+file.
+
+When all stages run in one process, keep_in_memory() makes read_frame hand
+back the frames written earlier instead of reading them from disk again.
+Grids are not kept, as their pages are already shared through the memory
+map.
+
+Usage:
+    python -m src.modules.store data/interim/dylos-alpha/full/alpha.npz alpha.csv
+"""
+
+import os
+import zipfile
+import argparse
+import numpy as np
+import pandas as pd
+from src.modules.grid import write_grid, read_grid, read_header, grid_rows
+
+FORMATS = ['npz', 'parquet', 'feather', 'csv', 'grid']
+DEFAULT_FORMAT = 'npz'
+
+# Frames written or read so far by absolute path, None if not kept
+_frames = None
+
+
+def keep_in_memory(keep=True):
+    """Keep frames in memory between write_frame and read_frame calls"""
+    global _frames
+    _frames = {} if keep else None
+
+
+def data_format(path):
+    """Storage format of a file from its extension"""
+    fmt = os.path.splitext(path)[-1][1:].lower()
+    if fmt not in FORMATS:
+        msg = "Unknown data format '%s' of %s" % (fmt, path)
+        raise ValueError(msg)
+    return fmt
+
+
+def write_frame(df, path, bins=None):
+    """Write Pandas.DataFrame to file in format given by extension of path
+
+    Args:
+        df: Pandas.DataFrame
+        path: str
+        bins: list
+            Bin boundaries of the data, kept in the header of a grid
+    Returns:
+        path: str
+    """
+    fmt = data_format(path)
+    if fmt == 'grid':
+        return write_grid(df, path, bins)
+    if fmt == 'npz':
+        index_name = df.index.name if df.index.name is not None else ''
+        np.savez(path,
+                 index=df.index.values,
+                 index_name=np.array(index_name),
+                 columns=np.array([str(x) for x in df.columns]),
+                 # Row major so a range of rows is one block of the file
+                 values=np.ascontiguousarray(df.values))
+    elif fmt == 'parquet':
+        df.to_parquet(path)
+    elif fmt == 'feather':
+        # Feather can only store a default index
+        df.reset_index().to_feather(path)
+    else:
+        df.to_csv(path)
+    if _frames is not None:
+        _frames[os.path.abspath(path)] = df.copy(deep=False)
+    return path
+
+
+def read_npy_rows(archive, name, rows):
+    """Read a range of rows of an array saved in an npz file.
+    np.savez stores arrays without compression, so the rows are read from
+    their offset in the file. Arrays that cannot be read this way, such as
+    arrays of objects or of Fortran order, are read whole and sliced. Arrays
+    of objects are pickled by np.savez, so they are only read from interim
+    data written by write_frame.
+
+    Args:
+        archive: zipfile.ZipFile
+            Open npz file
+        name: str
+            Name of the array
+        rows: slice
+            Rows to read
+    Returns:
+        values: ndarray
+    """
+    with archive.open(name + '.npy') as member:
+        version = np.lib.format.read_magic(member)
+        if version == (1, 0):
+            header = np.lib.format.read_array_header_1_0(member)
+        elif version == (2, 0):
+            header = np.lib.format.read_array_header_2_0(member)
+        else:
+            header = None
+        if header is None or header[1] or header[2].hasobject:
+            member.seek(0)
+            return np.lib.format.read_array(member,
+                                            allow_pickle=True)[rows]
+        shape, fortran_order, dtype = header
+        start, stop, _ = rows.indices(shape[0])
+        stop = max(start, stop)
+        row_bytes = dtype.itemsize * int(np.prod(shape[1:]))
+        member.seek(member.tell() + start * row_bytes)
+        buffer = member.read((stop - start) * row_bytes)
+    values = np.frombuffer(buffer, dtype=dtype)
+    return values.reshape((stop - start,) + tuple(shape[1:]))
+
+
+def read_frame(path, rows=None):
+    """Read Pandas.DataFrame written by write_frame
+
+    Args:
+        path: str
+        rows: list of int
+            Start and stop of the rows to read, all rows if None
+    Returns:
+        df: Pandas.DataFrame
+    """
+    if data_format(path) == 'grid':
+        return read_grid(path, rows)
+
+    if _frames is not None and os.path.abspath(path) in _frames:
+        # Shallow copy so callers can relabel the index, a range of rows is a
+        # view of the kept frame
+        df = _frames[os.path.abspath(path)].copy(deep=False)
+        return df if rows is None else df.iloc[rows[0]:rows[1]]
+
+    fmt = data_format(path)
+    if rows is not None and fmt in ['npz', 'csv']:
+        # Only read the rows asked for
+        start, stop = rows
+        stop = max(start, stop)
+        if fmt == 'npz':
+            with zipfile.ZipFile(path) as archive:
+                index = pd.Index(read_npy_rows(archive, 'index',
+                                               slice(start, stop)))
+                values = read_npy_rows(archive, 'values', slice(start, stop))
+                with archive.open('index_name.npy') as member:
+                    name = str(np.lib.format.read_array(member))
+                with archive.open('columns.npy') as member:
+                    columns = np.lib.format.read_array(member).tolist()
+            index.name = name if name else None
+            return pd.DataFrame(values, index=index, columns=columns)
+        if stop == start:
+            # Types of the columns are only known from a row of data
+            return pd.read_csv(path, parse_dates=[0], index_col=0,
+                               nrows=1).iloc[:0]
+        df = pd.read_csv(path, parse_dates=[0], index_col=0,
+                         skiprows=range(1, start + 1), nrows=stop - start)
+        if df.empty:
+            return read_frame(path, [start, start])
+        return df
+
+    if fmt == 'npz':
+        with np.load(path, allow_pickle=True) as handle:
+            index = pd.Index(handle['index'])
+            name = str(handle['index_name'])
+            index.name = name if name else None
+            df = pd.DataFrame(handle['values'], index=index,
+                              columns=handle['columns'].tolist())
+    elif fmt == 'parquet':
+        df = pd.read_parquet(path)
+    elif fmt == 'feather':
+        df = pd.read_feather(path)
+        df = df.set_index(df.columns[0])
+    else:
+        df = pd.read_csv(path, parse_dates=[0], index_col=0)
+    if _frames is not None:
+        _frames[os.path.abspath(path)] = df
+        df = df.copy(deep=False)
+    return df if rows is None else df.iloc[rows[0]:rows[1]]
+
+
+def read_data(entry):
+    """Read the data of a sensor in a condition, as recorded in a settings
+    json
+
+    Args:
+        entry: dict
+            'data', path to the data of the sensor, and optionally 'rows',
+            the start and stop of the rows of the condition
+    Returns:
+        df: Pandas.DataFrame
+    """
+    return read_frame(entry['data'], entry.get('rows'))
+
+
+def condition_rows(index, start, end):
+    """Start and stop of the rows of a sorted index from start to end, both
+    included, like index.loc[start:end]
+
+    Args:
+        index: Pandas.DatetimeIndex
+        start: str or datetime
+        end: str or datetime
+    Returns:
+        rows: list of int
+    """
+    rows = index.slice_indexer(start, end)
+    return [int(rows.start or 0),
+            int(rows.stop if rows.stop is not None else len(index))]
+
+
+def window_rows(path, windows, index=None):
+    """Start and stop of the rows of windows of time in data written to path,
+    as read_frame takes them
+
+    Args:
+        path: str
+        windows: list of tuples
+            Name, start and end of each window
+        index: Pandas.DatetimeIndex
+            Index of the data, read from path if needed and not given
+    Returns:
+        rows: dict
+            Start and stop of the rows of each window by name
+    """
+    if not windows:
+        return {}
+    if data_format(path) == 'grid':
+        # Offsets from the first minute of the grid
+        header = read_header(path)
+        return {name: grid_rows(path, start, end, header)
+                for name, start, end in windows}
+    if index is None:
+        index = read_frame(path).index
+    return {name: condition_rows(index, start, end)
+            for name, start, end in windows}
+
+
+if __name__ == '__main__':
+    # Convert between formats, mostly to export interim data to csv
+    parser = argparse.ArgumentParser(description="Convert interim data")
+    parser.add_argument("input", help="Data file")
+    parser.add_argument("output", help="Converted data file")
+
+    options = parser.parse_args()
+    write_frame(read_frame(options.input), options.output)
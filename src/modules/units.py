@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+# Unit scaling of particle concentrations.
+Data of a sensor is scaled to the output unit by a single number, which
+only depends on the unit the sensor records in, its flowrate and the
+output unit. pint works the number out once for each of these and the
+result is kept in a UnitResolver, optionally saved as json so later runs
+do not import pint or build its UnitRegistry at all.
+
+Usage:
+    resolver = UnitResolver("data/interim/units.json")
+    scale = scale_factor(config, "counts / (cubic cm)", resolver)
+    resolver.save()
+"""
+
+import os
+import json
+import logging
+from src.modules.atomic import atomic_open
+
+# pint's UnitRegistry, made on first use as it is slow to build
+_ureg = None
+
+
+def unit_registry():
+    """pint's UnitRegistry, shared by all conversions in this process"""
+    global _ureg
+    if _ureg is None:
+        from pint import UnitRegistry
+        _ureg = UnitRegistry()
+    return _ureg
+
+
+def convert(unit, flowrate, output):
+    """Work out the scale factor from the unit of a sensor to the output unit
+    with pint, along with the concentration and count rate of the sensor for
+    display.
+
+    Args:
+        unit: str
+            Unit of recorded measurements, a concentration or count rate
+        flowrate: str
+            Flowrate of the sensor, None if not known
+        output: str
+            Unit of final particle concentration
+    Returns:
+        units: dict
+            'scale factor', 'concentration' and 'count rate', the last is
+            None if it needs a flowrate that is not known.
+    """
+    ureg = unit_registry()
+    outputUnit = ureg(output)
+    inputUnit = ureg(unit)
+    if flowrate is not None:
+        inputFlowrate = ureg(flowrate)
+
+    # Create test quantities to compare dimensionality against
+    counts_test = ureg("counts")
+    vol_test = ureg("m ** 3")
+    conc_test = counts_test / vol_test
+    time_test = ureg("s")
+    rate_test = counts_test / time_test
+
+    # Compare dimensionality of input data and output unit
+    # If output unit is concentration
+    if outputUnit.dimensionality != conc_test.dimensionality:
+        msg = "The output unit is incorrect or not yet implementated!"
+        raise ValueError(msg)
+
+    # If input unit is concentration
+    if inputUnit.dimensionality == conc_test.dimensionality:
+        scale = inputUnit.to(outputUnit).magnitude
+        concentration = str('{:.03f~}'.format(inputUnit))
+        countrate = None
+        if flowrate is not None:
+            countrate = (inputFlowrate * inputUnit).to('counts/s')
+            countrate = str('{:.03f~}'.format(countrate))
+
+    # If input unit is count rate
+    elif inputUnit.dimensionality == rate_test.dimensionality:
+        if flowrate is None:
+            msg = "A flowrate is needed to scale a count rate!"
+            raise ValueError(msg)
+        conc = inputUnit / inputFlowrate
+        scale = float(outputUnit / conc)
+        countrate = str('{:.03f}'.format(inputUnit))
+        concentration = str('{:.03f}'.format(conc))
+
+    else:
+        msg = "The input unit is incorrect or not yet implementated!"
+        raise ValueError(msg)
+
+    return {'scale factor': float(scale), 'concentration': concentration,
+            'count rate': countrate}
+
+
+class UnitResolver(object):
+    """Conversions from convert() keyed by unit, flowrate and output unit.
+
+    Args:
+        path: str
+            Optional json file to keep conversions in between runs
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._units = {}
+        self._changed = False
+        if path is not None and os.path.isfile(path):
+            with open(path) as handle:
+                self._units = json.load(handle)
+
+    def __len__(self):
+        return len(self._units)
+
+    def resolve(self, unit, flowrate, output):
+        """Conversion of unit at flowrate to output, only worked out by pint
+        if it has not been seen before.
+        """
+        key = json.dumps([unit, flowrate, output])
+        if key not in self._units:
+            self._units[key] = convert(unit, flowrate, output)
+            self._changed = True
+        return dict(self._units[key])
+
+    def save(self):
+        """Write conversions to path, if any were added.
+        The file is replaced whole, so other processes reading it never see
+        it part written.
+        """
+        if self.path is None or not self._changed:
+            return
+        with atomic_open(self.path) as handle:
+            json.dump(self._units, handle, sort_keys=True, indent=4)
+        self._changed = False
+
+
+# Resolver shared by callers that do not bring their own
+unit_resolver = UnitResolver()
+
+
+def scale_factor(config, output, resolver=unit_resolver):
+    """Scale factor from the unit of a sensor to the output unit.
+    The config is updated with the scale factor and with the concentration
+    and count rate, unless they are already set.
+
+    Args:
+        config: dict
+            Settings of the sensor with its 'unit' and 'flowrate'
+        output: str
+            Unit of final particle concentration
+        resolver: UnitResolver
+    Returns:
+        scale: float
+    """
+    units = resolver.resolve(config['unit'], config.get('flowrate'), output)
+    if 'concentration' not in config:
+        config['concentration'] = units['concentration']
+    if 'count rate' not in config:
+        if units['count rate'] is None:
+            msg = "A flowrate is needed to work out the count rate!"
+            raise ValueError(msg)
+        config['count rate'] = units['count rate']
+
+    scale = units['scale factor']
+    config['scale factor'] = scale
+    debug = "The scaling factor is %s" % (scale)
+    logging.debug(debug)
+    return scale
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Run the whole analysis of a settings file in one Python process.
+
+The stages are the same scripts the Makefile runs one at a time; process,
+rebin, plot, hist, plot matrix, hist matrix, calibration and report
+generation. Running them here pays the import cost of pandas, matplotlib and
+friends once and hands the sensor and rebinned data from one stage to the
+next in memory instead of reading it back from disk.
+
+Usage:
+    python -m src.pipeline settings/dylos-alpha.yaml
+"""
+
+import os
+import sys
+import argparse
+import importlib.util
+import logging
+from src.modules.store import FORMATS, DEFAULT_FORMAT, keep_in_memory
+
+src_dir = os.path.abspath(os.path.dirname(__file__))
+
+
+def load_stage(path):
+    """Import a stage script as a module.
+    The data and visualisation scripts each import a sibling module named
+    utils, so the script directory is put on the path only while it loads.
+    The module is registered under its name so worker processes can find the
+    functions handed to them.
+    """
+    path = os.path.join(src_dir, path)
+    script_dir = os.path.dirname(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    utils = sys.modules.pop('utils', None)
+    sys.path.insert(0, script_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(script_dir)
+        sys.modules.pop('utils', None)
+        if utils is not None:
+            sys.modules['utils'] = utils
+    return module
+
+
+def run(settings_file, sensors_file, particles_file, raw_data_dir,
+        interim_dir, imgs_dir, processed_dir, data_fmt, fig_size,
+        chunksize=None, jobs=1):
+    """Run every stage of the analysis for one settings file.
+    Outputs are written to the same places as the Makefile rules.
+
+    Returns:
+        settings: dict
+    """
+    # Loading the stages also loads their dependencies, once
+    process = load_stage(os.path.join('data', 'process.py'))
+    rebin_data = load_stage(os.path.join('data', 'rebin_data.py'))
+    plot = load_stage(os.path.join('visualisation', 'plot.py'))
+    hist = load_stage(os.path.join('visualisation', 'hist.py'))
+    plot_matrix = load_stage(os.path.join('visualisation', 'plot_matrix.py'))
+    hist_matrix = load_stage(os.path.join('visualisation', 'hist_matrix.py'))
+    calibration = load_stage(os.path.join('visualisation', 'calibration.py'))
+    gen = load_stage(os.path.join('docs', 'gen.py'))
+
+    keep_in_memory()
+
+    name = os.path.splitext(os.path.basename(settings_file))[0]
+    interim_dir = os.path.abspath(interim_dir)
+    interim_settings = os.path.join(interim_dir, name + ".json")
+    project_dir = os.path.dirname(src_dir)
+    templates_dir = os.path.join(project_dir, "templates")
+
+    logging.debug("Pipeline of %s" % (settings_file))
+
+    # Data
+    process.process(settings_file, sensors_file, particles_file,
+                    raw_data_dir, interim_settings, data_fmt, chunksize,
+                    jobs)
+    settings = rebin_data.rebin_settings(interim_settings)
+
+    # Time series plots, histograms and rolling statistics of every sensor
+    # in every condition
+    params = {"figure.figsize": plot.figsize(float(fig_size))}
+    plot.matplotlib.rcParams.update(params)
+    entries = plot.data_entries([interim_settings], interim_dir)
+    plot.plot_batch(entries, imgs_dir)
+    hist.hist_batch(entries, imgs_dir, processed_dir)
+    for stem, data in entries:
+        hist.hist_rolling(data, os.path.join(processed_dir,
+                                             stem + "-rolling." + data_fmt))
+
+    # Matrices of all conditions
+    plot_matrix.plot_matrix(interim_settings,
+                            os.path.join(imgs_dir, name + "-plot-mat.png"),
+                            jobs)
+    hist_matrix.hist_matrix(interim_settings,
+                            os.path.join(imgs_dir, name + "-hist-mat.png"),
+                            jobs)
+    settings = calibration.calibration_matrix(
+        interim_settings,
+        os.path.join(imgs_dir, name + "-cali-mat.png"),
+        os.path.join(processed_dir, name + "-cali.tex"),
+        jobs)
+
+    # Reports
+    for template, suffix in [("plot_mat.tpl", "-plot-mat"),
+                             ("hist_mat.tpl", "-hist-mat"),
+                             ("cali_mat.tpl", "-cali-mat"),
+                             ("calibration.tpl", "")]:
+        gen.render_template(os.path.join(templates_dir, template),
+                            interim_settings,
+                            os.path.join(processed_dir, name + suffix + ".tex"))
+
+    keep_in_memory(False)
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the whole analysis "
+                                     "of a settings file in one process")
+    parser.add_argument("settings", help="Settings yaml file")
+    parser.add_argument("--sensors", default="conditions/sensors.yaml",
+                        help="Sensors defintions yaml file")
+    parser.add_argument("--particles", default="conditions/particles.yaml",
+                        help="Particles defintions yaml file")
+    parser.add_argument("--raw", default="data/raw",
+                        help="Raw Data directory")
+    parser.add_argument("--interim", default="data/interim",
+                        help="Interim data directory")
+    parser.add_argument("--imgs", default="imgs/plots",
+                        help="Plots directory")
+    parser.add_argument("--processed", default="data/processed",
+                        help="Processed data directory")
+    parser.add_argument("-F", "--format", choices=FORMATS,
+                        default=DEFAULT_FORMAT,
+                        help="Storage format of interim data")
+    parser.add_argument("-f", "--figsize", default=0.29,
+                        help="Figure size of individual plots")
+    parser.add_argument("-c", "--chunksize", type=int,
+                        help="Read raw data in chunks of this many rows")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of sensors or conditions to work on "
+                        "in parallel")
+
+    options = parser.parse_args()
+
+    run(options.settings, options.sensors, options.particles, options.raw,
+        options.interim, options.imgs, options.processed, options.format,
+        options.figsize, options.chunksize, options.jobs)
+
+
+if __name__ == '__main__':
+    main()
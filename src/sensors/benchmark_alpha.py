@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark conversion of Alphasense OPC-N2 histograms to concentration.
+A day of made up 1 Hz data is converted by process_alpha.concentration and
+by the pint based conversion it replaced, which needs pint installed. The
+two outputs are checked to be the same. The time the old script took to
+import pint and build its UnitRegistry is shown separately as it was paid
+once per file.
+
+Usage:
+    PYTHONPATH=. python src/sensors/benchmark_alpha.py -s 86400
+"""
+
+import os
+import sys
+import time
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+from process_alpha import BINS, concentration
+
+# pint's UnitRegistry, made when timing the pint based conversion
+ureg = None
+
+
+def make_frame(seconds, seed=0):
+    """OPC-N2 data as loaded by process_alpha.loadData with a row every
+    second
+
+    Args:
+        seconds: int
+            Number of rows
+    Returns:
+        df: Pandas.DataFrame
+    """
+    rng = np.random.RandomState(seed)
+    index = pd.date_range('2016-09-08 07:00', periods=seconds, freq='S')
+    index.name = 'Datetime'
+    df = pd.DataFrame(rng.randint(0, 500, (seconds, len(BINS))),
+                      index=index, columns=BINS)
+    for column in ['Bin1 MToF', 'Bin3 MToF', 'Bin5 MToF', 'Bin7 MToF']:
+        df[column] = rng.randint(0, 50, seconds)
+    df['Sampling Period'] = rng.normal(1.0, 0.01, seconds)
+    df['Temperature'] = rng.normal(2900, 10, seconds)
+    df['Pressure'] = rng.normal(100000, 100, seconds)
+    for column in ['PM1', 'PM2.5', 'PM10']:
+        df[column] = rng.uniform(0, 20, seconds)
+    df['SFR'] = rng.normal(3.67, 0.05, seconds)
+    return df
+
+
+def concentration_pint(df):
+    """pint based conversion that process_alpha.concentration replaced.
+    The quantities wrap the arrays of the columns, as older versions of pint
+    did when multiplied with a Series.
+    """
+    print("Converting histogram to concentration")
+
+    samplingperiod = ureg.Quantity(df['Sampling Period'].values, 's')
+    flowrate = ureg.Quantity(df['SFR'].values, 'ml/s')
+    vol = flowrate * samplingperiod
+    df['Total Volume'] = (vol).to('cm ** 3').magnitude
+    df[BINS] = df[BINS].div(df['Total Volume'], axis=0)
+
+    print("Successfully converted")
+    return df
+
+
+def timed(converter, df, repeat):
+    """Best time of converting copies of df, returning the output and
+    seconds taken"""
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            for _ in range(repeat):
+                frame = df.copy()
+                start = time.perf_counter()
+                output = converter(frame)
+                seconds = time.perf_counter() - start
+                if best is None or seconds < best:
+                    best = seconds
+    return output, best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark OPC-N2 "
+                                     "concentration")
+    parser.add_argument("-s", "--seconds", type=int, default=86400,
+                        help="Seconds of made up 1 Hz data")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Number of times to time each conversion")
+
+    options = parser.parse_args()
+
+    df = make_frame(options.seconds)
+
+    start = time.perf_counter()
+    from pint import UnitRegistry
+    ureg = UnitRegistry()
+    setup_seconds = time.perf_counter() - start
+
+    new, new_seconds = timed(concentration, df, options.repeat)
+    old, old_seconds = timed(concentration_pint, df, options.repeat)
+    if not new.equals(old):
+        sys.exit("Conversions disagree!")
+
+    print("%d rows" % (len(df)))
+    print("pint setup: %.4f s" % (setup_seconds))
+    print("pint:       %.4f s" % (old_seconds))
+    print("vectorised: %.4f s" % (new_seconds))
+    print("speed up:   %.1fx" % (old_seconds / new_seconds))
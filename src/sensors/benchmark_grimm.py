@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark decoding of Grimm 1.108 dumps.
+A dump of the given number of minutes is made up and decoded by
+process_grimm.transform and by the line by line decoder it replaced, which
+printed every record. The two outputs are checked to be the same.
+
+Usage:
+    python src/sensors/benchmark_grimm.py -m 1440
+"""
+
+import os
+import io
+import sys
+import csv
+import time
+import argparse
+import contextlib
+from datetime import datetime as dt
+import numpy as np
+from process_grimm import transform
+
+
+def make_dump(minutes, seed=0):
+    """Grimm dump with a C and c record every six seconds
+
+    Args:
+        minutes: int
+            Number of minutes of records
+    Returns:
+        dump: str
+    """
+    rng = np.random.RandomState(seed)
+    start = np.datetime64('2016-09-08T07:00')
+    lines = ["Grimm 1.108 dump"]
+    for n in range(minutes):
+        t = (start + n).astype(dt)
+        lines.append("P %02d %d %d %d %d 0 0 0 100 0" %
+                     (t.year % 100, t.month, t.day, t.hour, t.minute))
+        for six in range(10):
+            counts = rng.randint(0, 5000, 16)
+            lines.append("C%d%d %s" % (six, six % 6,
+                                      " ".join(map(str, counts[:8]))))
+            lines.append("c%d%d %s" % (six, six % 6,
+                                      " ".join(map(str, counts[8:]))))
+    return "\n".join(lines) + "\n"
+
+
+def transform_lines(input, output):
+    """Line by line decoder that process_grimm.transform replaced"""
+    out = csv.writer(output)
+    firstP = 0
+    for line in input:
+        parts = line.split()
+        print(parts)
+        id = parts[0]
+        if id == "P":  # Read date and time
+            year, month, day, hour, min = parts[1:6]
+            year = "20" + year
+            firstP = 1
+        elif firstP == 1:  # Read bin data
+            c = id[0]  # C or c?
+            if c == "C":
+                bin_data = parts[1:]
+            elif c == "c":
+                six = int(id[1])  # Increment every six seconds
+                second = int(id[2])  # Increment every second
+                bin_data = bin_data + parts[1:]
+                second = second + six*6  # Calculate true seconds
+                print(year)
+                datetime = dt(int(year), int(month), int(day), int(hour),
+                              int(min), second)
+                data = [str(datetime)] + bin_data
+                print(data)
+                out.writerow(data)
+
+
+def timed(decoder, dump):
+    """Decode dump, returning the output and seconds taken"""
+    output = io.StringIO()
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            decoder(io.StringIO(dump), output)
+            seconds = time.perf_counter() - start
+    return output.getvalue(), seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark Grimm decoder")
+    parser.add_argument("-m", "--minutes", type=int, default=1440,
+                        help="Minutes of records in made up dump")
+
+    options = parser.parse_args()
+
+    dump = make_dump(options.minutes)
+    lines = dump.count("\n")
+    new, new_seconds = timed(transform, dump)
+    old, old_seconds = timed(transform_lines, dump)
+    if new != old:
+        sys.exit("Decoders disagree!")
+
+    print("%d lines, %d rows" % (lines, new.count("\n")))
+    print("line by line: %.3f s, %.0f lines/s" %
+          (old_seconds, lines / old_seconds))
+    print("vectorised:   %.3f s, %.0f lines/s" %
+          (new_seconds, lines / new_seconds))
+    print("speed up:     %.1fx" % (old_seconds / new_seconds))
@@ -36,18 +36,22 @@ The function of this script are:
     Checks for any gaps in time and produce separate datafiles of data that do
     not have time gaps.
 
+Usage:
+    PYTHONPATH=. python src/sensors/process_alpha.py <inputfile>
 """
 
 import os
 import sys
-from operator import itemgetter
-from itertools import groupby
 import numpy as np
 import pandas as pd
-from pint import UnitRegistry
+from src.modules.segments import findSegments, writeSegments
 
-# Initialise pint's UnitRegistry
-ureg = UnitRegistry()
+# Columns of the histogram
+BINS = ['Bin %d' % (x) for x in range(16)]
+
+# Sample flow rate is in ml/s and sampling period in s, so their product is
+# a volume in ml which is scaled to cm ** 3 by
+VOLUME_SCALE = 1.0
 
 
 def argparse(argv):
@@ -96,41 +100,17 @@ def concentration(df):
     """
     print("Converting histogram to concentration")
 
-    cols = ['Bin 0', 'Bin 1', 'Bin 2', 'Bin 3',
-            'Bin 4', 'Bin 5', 'Bin 6', 'Bin 7',
-            'Bin 8', 'Bin 9', 'Bin 10', 'Bin 11',
-            'Bin 12', 'Bin 13', 'Bin 14', 'Bin 15']
-
-    # Compute scale
-    flowratw = ureg("220 ml/min")
-    sampleperiod = ureg("s")
-    vol = (flowratw * sampleperiod).to("cm ** 3").magnitude
-    # Now vol is just a scale number between units and that have
-    # not been multipled with magnitude of sampling period yet,
+    # Volume of air sampled in each row
+    volume = (df['SFR'].values * df['Sampling Period'].values) * VOLUME_SCALE
+    df['Total Volume'] = volume
 
     # Divide the histogram
-    samplingperiod = ureg('s') * df['Sampling Period']
-    flowrate = ureg('ml/s') * df['SFR']
-    vol = flowrate * samplingperiod
-    df['Total Volume'] = (vol).to('cm ** 3').magnitude
-    df[cols] = df[cols].div(df['Total Volume'], axis=0)
+    df[BINS] = df[BINS].values / volume[:, np.newaxis]
 
     print("Successfully converted")
     return df
 
 
-def findGroups(index):
-    """
-    Find group of consective sequence
-    """
-
-    ranges = []
-    for k, g in groupby(enumerate(index), lambda ix: ix[1]-ix[0]):
-        group = list(map(itemgetter(1), g))
-        ranges.append((group[0], group[-1]))
-    return ranges
-
-
 def main(inputfile):
     print("Processing data!")
     # load data
@@ -149,11 +129,7 @@ def main(inputfile):
     data = data.resample('T', label='left', closed='left').mean()
 
     # Find segments between Nan
-    date_range = pd.date_range(min(data.index), max(data.index), freq='T')
-    data = data.reindex(date_range)
-    ts = data[data.columns[0]]
-    index = np.where(ts.notnull())[0]
-    ranges = findGroups(index)
+    ranges = findSegments(data)
 
     # Generate path to split data
     name = os.path.basename(inputfile)
@@ -164,9 +140,8 @@ def main(inputfile):
     if not os.path.isdir(path):
         os.mkdir(path)
 
-    # Open a file to write processed data
+    # File to write processed data
     path1 = os.path.join(path, name)
-    fid = open(path1, "a")
 
     # Analyse data for time gaps (NaN)
     if len(ranges) != 0:
@@ -177,19 +152,11 @@ def main(inputfile):
                 "Startdt": startdt, "Enddt": enddt}
         columns = ["Startx", "Endx", "Startdt", "Enddt"]
         df = pd.DataFrame(dict, columns=columns)
-        for i in range(0, len(ranges)):
-            segment = data.iloc[start[i]:(end[i]+1)]
-            startdt = segment.index[0].strftime("%Y-%m-%d_%H-%M-%S")
-            enddt = segment.index[-1].strftime("%Y-%m-%d_%H-%M-%S")
-            filename = "%s_%s_%s" % (startdt, enddt, name)
-            path2 = os.path.join(path, filename)
-            segment.to_csv(path2, header=None)
-            segment.to_csv(fid, header=None)
+        writeSegments(data, ranges, path, name, path1)
         print(df)
     else:
         print("All Nan!")
         return None
-    fid.close()
 
 if __name__ == "__main__":
     inputfile = argparse(sys.argv)
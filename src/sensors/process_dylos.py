@@ -3,13 +3,15 @@
 
 """
 Process dylos dataset
+
+Usage:
+    PYTHONPATH=. python src/sensors/process_dylos.py <inputfile>
 """
 import os
 import sys
-from operator import itemgetter
-from itertools import groupby
 import numpy as np
 import pandas as pd
+from src.modules.segments import findSegments, writeSegments
 
 def argparse(argv):
     try:
@@ -42,18 +44,6 @@ def loadData(path):
     return df
 
 
-def findGroups(index):
-    """
-    Find group of consective sequence
-    """
-
-    ranges = []
-    for k, g in groupby(enumerate(index), lambda ix: ix[1]-ix[0]):
-        group = list(map(itemgetter(1), g))
-        ranges.append((group[0], group[-1]))
-    return ranges
-
-
 def main(inputfile):
     """
     Group data separated by rows with period between 59 and 65 seconds.
@@ -72,39 +62,16 @@ def main(inputfile):
     if not os.path.isdir(path):
         os.mkdir(path)
     path1 = os.path.join(path, name)
-    fid = open(path1,"a")
 
     data.index = data.index.values.astype('<M8[m]')
 
-    ts = data[data.columns[0]]
-    # Fill missing data with NaNs
-    ts = ts.reindex(pd.date_range(min(ts.index), max(ts.index), freq='T'))
-
-    index = np.where(ts.notnull())[0]
-
-    ranges = findGroups(index)
+    # Find segments between gaps and NaN
+    ranges = findSegments(data)
     if len(ranges) != 0:
-        start,  end = zip(* ranges)
-        # startdt = data.index[list(start)]
-        # enddt = data.index[list(end)]
-        # dict = {"Startx": start, "Endx": end,
-                # "Startdt": startdt, "Enddt": enddt}
-        # columns = ["Startx", "Endx", "Startdt", "Enddt"]
-        # df = pd.DataFrame(dict, columns=columns)
-        for i in range(0, len(ranges)):
-            segment = data.iloc[start[i]:(end[i]+1)]
-            startdt = segment.index[0].strftime("%Y-%m-%d_%H-%M-%S")
-            enddt = segment.index[-1].strftime("%Y-%m-%d_%H-%M-%S")
-            filename = "%s_%s_%s" % (startdt, enddt, name)
-            path2 = os.path.join(path, filename)
-            segment.to_csv(path2, header=None)
-            segment.to_csv(fid, header=None)
-        # return df
+        writeSegments(data, ranges, path, name, path1)
     else:
         print("All Nan!")
         return None
-    fid.close()
-
 
 if __name__ == "__main__":
     inputfile = argparse(sys.argv)
@@ -5,8 +5,8 @@
 
 import os
 import sys
-from datetime import datetime as dt
-import csv
+import numpy as np
+import pandas as pd
 
 def argparse(argv):
     inputfile = ''
@@ -37,31 +37,95 @@ def main(inputfile, outputfile):
     print("Written data to " + outputfile + " successfully!")
     sys.exit("Done!")
 
-def transform(input,output):
-    out = csv.writer(output)
-    firstP = 0
-    for line in input:
-        parts = line.split()
-        print(parts)
-        id = parts[0]
-        if id == "P": # Read date and time
-            year,month,day,hour,min = parts[1:6]
-            year = "20" + year
-            firstP = 1
-        elif firstP == 1: # Read bin data
-            c = id[0] # C or c?
-            if c == "C":
-                bin_data = parts[1:]
-            elif c == "c":
-                six = int(id[1]) # Increment every six seconds
-                second = int(id[2]) # Increment every second
-                bin_data = bin_data + parts[1:]
-                second = second + six*6 # Calculate true seconds
-                print(year)
-                datetime = dt(int(year),int(month),int(day),int(hour),int(min),second)
-                data = [str(datetime)] + bin_data
-                print(data)
-                out.writerow(data)
+def transform(input, output):
+    """Decode a Grimm 1.108 dump into csv rows of datetime and bin counts.
+
+    P records hold the date and time to the minute, C records the counts of
+    the lower bins and c records the counts of the upper bins. The id of a c
+    record gives the six second interval and the second within it. A row is
+    written for every c record with the counts of the last C record and of
+    the c record.
+
+    The records are split into a DataFrame of tokens, the timestamps of all
+    rows are worked out with datetime64 arithmetic and the rows are written
+    with to_csv in one go.
+
+    Args:
+        input: file
+            Grimm dump
+        output: file
+            csv file to write to
+    Returns:
+        rows: int
+            Number of rows written
+    """
+    # Every line with a token is a record, its first token is the id
+    lines = pd.Series(input.read().split("\n"))
+    tokens = lines.str.split(expand=True)
+    if tokens.empty:
+        return 0
+    tokens = tokens[tokens[0].notna().values]
+    if tokens.empty:
+        return 0
+    tokens.index = np.arange(len(tokens))
+    ids = tokens[0].values.astype(str)
+    counts = tokens.iloc[:, 1:]
+
+    # Records before the first P record are not dated and are skipped
+    is_p = ids == "P"
+    started = np.cumsum(is_p) > 0
+    kind = ids.astype('U1')
+    is_C = started & ~is_p & (kind == "C")
+    is_c = started & ~is_p & (kind == "c")
+    rows = np.flatnonzero(is_c)
+    if not len(rows):
+        return 0
+
+    # Last P and C record before each line
+    last_p = np.maximum.accumulate(np.where(is_p, tokens.index, -1))
+    last_C = np.maximum.accumulate(np.where(is_C, tokens.index, -1))
+    if (last_C[rows] < 0).any():
+        raise ValueError("c record before any C record")
+
+    # Date and time of every P record, the year is given without century
+    p_rows = np.flatnonzero(is_p)
+    dates = counts.iloc[p_rows, :5]
+    if dates.shape[1] < 5 or dates.isna().values.any():
+        raise ValueError("Date or time of P record missing")
+    year = ("20" + dates.iloc[:, 0]).astype(int).values
+    month, day, hour, minute = dates.iloc[:, 1:].astype(int).values.T
+    if ((month < 1) | (month > 12) | (day < 1) | (hour < 0) | (hour > 23) |
+            (minute < 0) | (minute > 59)).any():
+        raise ValueError("Date or time of P record out of range")
+    months = ((year - 1970) * 12 + month - 1).astype('M8[M]')
+    days = months.astype('M8[D]') + (day - 1)
+    if (days.astype('M8[M]') != months).any():
+        raise ValueError("Day of P record out of range")
+    minutes = days.astype('M8[m]') + (hour * 60 + minute)
+
+    # Seconds of every c record
+    c_ids = ids[rows]
+    if (np.char.str_len(c_ids) < 3).any():
+        raise ValueError("Id of c record is too short")
+    six, second = c_ids.astype('U3').view('U1').reshape(-1, 3)[:, 1:].T
+    seconds = six.astype(int) * 6 + second.astype(int)
+    if (seconds > 59).any():
+        raise ValueError("Second of c record out of range")
+    stamps = minutes[np.searchsorted(p_rows, last_p[rows])] + \
+        seconds.astype('m8[s]')
+
+    # Counts of the last C record then of the c record, without the columns
+    # of longer records
+    lower = counts.iloc[last_C[rows]].dropna(axis=1, how='all')
+    upper = counts.iloc[rows].dropna(axis=1, how='all')
+    data = pd.concat([lower.reset_index(drop=True),
+                      upper.reset_index(drop=True)], axis=1)
+    stamps = np.char.replace(np.datetime_as_string(stamps, unit='s'),
+                             "T", " ")
+    data.insert(0, 'DateTime', stamps)
+
+    data.to_csv(output, header=False, index=False, lineterminator="\r\n")
+    return len(rows)
 
 if __name__ == "__main__":
     inputfile,outputfile = argparse(sys.argv)
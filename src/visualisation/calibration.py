@@ -3,25 +3,13 @@
 
 import argparse
 import json
-import matplotlib.pyplot as plt
-from matplotlib import gridspec
 import pandas as pd
-from scipy import polyval
-import statsmodels.api as sm
 from utils import *
+from src.modules.regression import regression, moments, ols
+from src.modules.align import align, valid_pairs
 
 
-def load_data(path):
-    """Load a dataset
-    """
-    df = pd.read_csv(path,
-                     parse_dates=[0],
-                     index_col=0,
-                     infer_datetime_format=True)
-    return df
-
-
-def calibrate(x, y, x_label, y_label, ax):
+def calibrate(x, y, x_label, y_label, ax, results=None):
     # What bin is it?
     sensor, bin = x.name.split('-')
 
@@ -31,13 +19,14 @@ def calibrate(x, y, x_label, y_label, ax):
 
     ax.scatter(x, y, label=label)
 
-    # Regression analysis
-    results = regression(x, y)
+    # Regression analysis, unless done already
+    if results is None:
+        results = regression(x, y)
     slope = results[0]
     intercept = results[2]
 
     # Create best fit line
-    yf = polyval([slope, intercept], x)
+    yf = np.polyval([slope, intercept], x)
     ax.plot(x, yf, label=fit_label)
     # ax.legend(loc='lower right')
 
@@ -52,17 +41,34 @@ def calibrate(x, y, x_label, y_label, ax):
     return binsize, results_dict
 
 
-def regression(x, y):
-    # Add a column of 1s to ensure intercept can be calculated
-    # by regression analysis of statsmodel
-    x = sm.add_constant(x, prepend=False)
-    # Linear regression
-    result = sm.OLS(y, x).fit()
-    slope, intercept = result.params
-    slopeerr, intercepterr = result.bse
-    rs = result.rsquared
-    results = (slope, slopeerr, intercept, intercepterr, rs)
-    return results
+def condition_regressions(entries):
+    """Load the calibratee and rebinned calibrater data of a condition, pair
+    them by minute and work out the sums needed to regress each of the first
+    two bins against each other. Minutes where either value of a bin is
+    missing are left out of that bin.
+
+    Args:
+        entries: tuple of dict
+            Data of calibratee and rebinned calibrater in the condition, as
+            recorded in the settings json
+    Returns:
+        data: list of tuples
+            x and y of each bin
+        moments: ndarray
+            Array of shape (2, 6) from moments()
+    """
+    calibratee_data, rebinned_data = [load_data(x) for x in entries]
+    index, values, valid = align(calibratee_data, rebinned_data)
+    offset = calibratee_data.shape[1]
+    data = []
+    for column in range(2):
+        x, y, minutes = valid_pairs(index, values, valid, column,
+                                    offset + column)
+        data.append((pd.Series(x, index=minutes,
+                               name=calibratee_data.columns[column]),
+                     pd.Series(y, index=minutes,
+                               name=rebinned_data.columns[column])))
+    return data, np.stack([moments(x, y) for x, y in data])
 
 
 def regression_table(dict, order, path):
@@ -103,20 +109,22 @@ def regression_table(dict, order, path):
     return path.replace("\\", "/")
 
 
-if __name__ == '__main__':
-    # Get filenames to work with
-    parser = argparse.ArgumentParser(description="")
-    parser.add_argument("settings", help="Date file")
-    parser.add_argument("-p", "--plot",
-                        help="Path to plot")
-    parser.add_argument("-s", "--stats",
-                        help="Path to statistics")
-
-    options = parser.parse_args()
-    settings_file = options.settings
-    plot_path = options.plot
-    stats_path = options.stats
-
+def calibration_matrix(settings_file, plot_path, stats_path, jobs=1):
+    """Regress rebinned calibrater data against calibratee data for each bin
+    and condition, plot the scatter matrix and write a table of the results.
+
+    Args:
+        settings_file: str
+            Settings json file
+        plot_path: str
+            Path of plot
+        stats_path: str
+            Path of latex table of regression results
+        jobs: int
+            Number of conditions to regress in parallel
+    Returns:
+        settings: dict
+    """
     msg = "Calibration of %s" % (settings_file)
     logging.debug(msg)
 
@@ -172,6 +180,15 @@ if __name__ == '__main__':
     msg = "Looping over conditions"
     logging.debug(msg)
 
+    # Load data and regress every condition
+    tasks = [(conditions[exp]['sensor'][calibratee],
+              conditions[exp]['sensor'][rebinned])
+             for exp in exp_order]
+    data, sums = zip(*map_conditions(condition_regressions, tasks, jobs))
+
+    # Fit all bins of all conditions at once
+    fits = ols(np.array(sums)).tolist()
+
     for i, exp in enumerate(exp_order):
         msg = ("Index: %s, Condition: %s, "
                "Calibrater: %s, Calibratee: %s") % (i, exp, rebinned,
@@ -189,33 +206,24 @@ if __name__ == '__main__':
                      size=11, ha='center', va='bottom')
         ax1.axis('off')
 
-        # Load data path
-        calibratee_path = condition['sensor'][calibratee]['data']
-        rebinned_path = condition['sensor'][rebinned]['data']
-
-        # Load data
-        calibratee_data = load_data(calibratee_path)
-        rebinned_data = load_data(rebinned_path)
+        (x1, y1), (x2, y2) = data[i]
+        results1, results2 = [tuple(x) for x in fits[i]]
 
         # First column
-        x = calibratee_data[calibratee_data.columns[0]]
-        y = rebinned_data[rebinned_data.columns[0]]
-
         # Pick an axes
         ax2 = plt.subplot(gs[i, 1])
 
-        # Calibrate and plot scatter
-        binsize1, reg_dict1 = calibrate(x, y, x_label, y_label, ax2)
+        # Plot scatter and fit
+        binsize1, reg_dict1 = calibrate(x1, y1, x_label, y_label, ax2,
+                                        results1)
 
         # Second column
-        x = calibratee_data[calibratee_data.columns[1]]
-        y = rebinned_data[rebinned_data.columns[1]]
-
         # Pick an axes
         ax3 = plt.subplot(gs[i, 2])
 
-        # Calibrate and plot scatter
-        binsize2, reg_dict2 = calibrate(x, y, x_label, y_label, ax3)
+        # Plot scatter and fit
+        binsize2, reg_dict2 = calibrate(x2, y2, x_label, y_label, ax3,
+                                        results2)
 
         # First row
         if i == 0:
@@ -248,3 +256,25 @@ if __name__ == '__main__':
     with open(settings_file, 'w') as handle:
         json.dump(settings, handle, default=date_handler,
                   sort_keys=True, indent=4)
+
+    return settings
+
+
+if __name__ == '__main__':
+    # Get filenames to work with
+    parser = argparse.ArgumentParser(description="")
+    parser.add_argument("settings", help="Date file")
+    parser.add_argument("-p", "--plot",
+                        help="Path to plot")
+    parser.add_argument("-s", "--stats",
+                        help="Path to statistics")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of conditions to regress in parallel")
+
+    options = parser.parse_args()
+    settings_file = options.settings
+    plot_path = options.plot
+    stats_path = options.stats
+    jobs = options.jobs
+
+    calibration_matrix(settings_file, plot_path, stats_path, jobs)
@@ -3,11 +3,13 @@
 
 import os
 import numpy as np
-import matplotlib.pyplot as plt
 import pandas as pd
 import argparse
 import json
 from utils import *
+from src.modules.binning import BinSpec
+from src.modules.histogram import STATS, histogram_frame, rolling_stats
+from src.modules.store import write_frame
 import logging
 
 logging.basicConfig(filename='log',
@@ -17,82 +19,34 @@ logging.basicConfig(filename='log',
                     level=logging.DEBUG)
 
 
-def histogram(df, bounds, plot_path, stats_path):
+def histogram(df, bins, plot_path, stats_path, fig=None):
     """Plot a histogram of a binned data with defined bin boundaries.
     Args:
         df : Pandas.DataFrame
             Input dataframe with index of datetime object and each column is a
             bin od data
-        bounds : list of floats
-            List of bins boundaries.
-        path : str
+        bins : BinSpec
+            Geometry of the bins
+        plot_path : str
             Path for saved plots
+        stats_path : str
+            Path for saved statistics
+        fig : matplotlib.figure.Figure
+            Figure to clear and draw on, which is left open, otherwise a new
+            figure is made and closed
     """
-    # Initialise new series
-    columns = ["lower", "upper", "width", "midpoint",
-               "loglower", "logupper", "logwidth", "logmidpoint",
-               'Counts', 'Cum Counts', 'Density', "dN/logD"]
-    df1 = pd.DataFrame(columns=columns)
-
-    # Take a mean of the input dataframe which becomes a series with column
-    df1['Counts'] = df.mean(axis=0)
-    totalCounts = df1['Counts'].sum()
-
-    df1["lower"] = bounds[:-1]
-    df1["upper"] = bounds[1:]
-    df1["width"] = df1["upper"] - df1["lower"]
-    df1["midpoint"] = df1["width"]/2 + df1["lower"]
-    df1["loglower"] = np.log10(df1["lower"])
-    df1["logupper"] = np.log10(df1["upper"])
-    df1["logwidth"] = df1["logupper"] - df1["loglower"]
-    df1["logmidpoint"] = np.log10(df1["midpoint"])
-    df1["Density"] = df1["Counts"] / df1["width"]
-    df1["dN/logD"] = df1["Counts"] / df1["logwidth"]
-
-    # Iterate through the bins
-    bins = df1.index
-    cumCounts = 0
-    for ix, key in enumerate(bins):
-        counts = df1['Counts'].iloc[ix]
-        lower = df1['lower'].iloc[ix]
-        width = df1["width"].iloc[ix]
-
-        # Cumulative frequency
-        lowerCumCounts = cumCounts
-        cumCounts += counts
-        upperCumCounts = cumCounts
-        df1['Cum Counts'].iloc[ix] = cumCounts
-
-        # Median
-        if lowerCumCounts < totalCounts/2 < upperCumCounts:
-            median = lower + ((totalCounts/2 - lowerCumCounts)/counts) * width
-
-    # Statistics
-    counts = df1['Counts'].values
-    midpoints = df1["midpoint"].values
-    # logmidpoints = np.log10(midpoints)
-
-    # Normal distribution
-    mean, std, lower, upper = statistics(midpoints, counts)
-
-    # Log normal distribution
-    gm, gstd, glower, gupper = np.exp(statistics(np.log(midpoints), counts))
+    df1, stats = histogram_frame(df, bins)
+
+    index = ['Median',
+             'Mean Diameter', 'Std', '95% lower', '95% upper',
+             'Geometric mean diameter', 'Geometric standard deviation',
+             'Geometric 95% lower', 'Geometric 95% upper']
+    statsdata = [stats[x] for x in STATS]
 
     # Sometimes a median is not found and so need to be excluded from display
-    if 'median' in locals():
-        index = ['Median',
-                 'Mean Diameter', 'Std', '95% lower', '95% upper',
-                 'Geometric mean diameter', 'Geometric standard deviation',
-                 'Geometric 95% lower', 'Geometric 95% upper']
-        statsdata = [median,
-                     mean, std, lower, upper,
-                     gm, std, glower, gupper]
-    else:
-        index = ['Mean Diameter', 'Std', '95% lower', '95% upper',
-                 'Geometric mean diameter', 'Geometric standard deviation',
-                 'Geometric 95% lower', 'Geometric 95% upper']
-        statsdata = [mean, std, lower, upper,
-                     gm, std, glower, gupper]
+    if np.isnan(stats['median']):
+        index = index[1:]
+        statsdata = statsdata[1:]
 
     statsdf = pd.DataFrame(statsdata, index=index)
     columns = ['Counts', 'Cum Counts', 'Density', 'dN/logD']
@@ -108,65 +62,194 @@ def histogram(df, bounds, plot_path, stats_path):
         w = np.array(x2)-np.array(x1)  # variable width
         y = df1["dN/logD"].tolist()
 
-        fig = plt.figure()
+        close = fig is None
+        if close:
+            fig = plt.figure()
+        else:
+            fig.clf()
         ax = fig.add_subplot(111)
         ax.bar(x1, y, width=w)
         ax.set_xscale('log')
-        plt.ylabel(r'Frequency per $\log \mu$')
-        plt.xlabel(r'$\log \mathbf{Diameter}$ / $\mu$')
+        ax.set_ylabel(r'Frequency per $\log \mu$')
+        ax.set_xlabel(r'$\log \mathbf{Diameter}$ / $\mu$')
         saveplot(plot_path, fig)
-        plt.close()
+        if close:
+            plt.close(fig)
+
+
+def sensor_bins(data_path, cache=None):
+    """BinSpec of the sensor that produced an interim data file, read from
+    the settings json the file belongs to.
+
+    Args:
+        data_path: str
+        cache: dict
+            BinSpecs already read, by settings json and sensor
+    Returns:
+        bins: BinSpec
+    """
+    # Get path to settings json
+    paths = os.path.normpath(data_path).split(os.path.sep)
+    sensor = os.path.splitext(paths[-1])[0]
+    path = os.path.sep.join(paths[:-3])
+    filename = paths[-3] + ".json"
+    path = os.path.join(path, filename)
+    if cache is not None and (path, sensor) in cache:
+        return cache[(path, sensor)]
+    # Load setting file
+    with open(path) as handle:
+        settings = json.load(handle)
+    # Grab bin boundaries of a sensor
+    bins = BinSpec(sensor, settings['sensors'][sensor]['bins'])
+    if cache is not None:
+        cache[(path, sensor)] = bins
+    return bins
+
+
+def hist(data, plot_path, stats_path, fig=None, cache=None):
+    """Plot histogram and save statistics of interim data, given its path or
+    its entry in a settings json
+    """
+    # load data
+    df = load_data(data)
+
+    # Fetch bin boundaries
+    bins = sensor_bins(data_file(data), cache)
+
+    # Plot histogram and get statistics
+    histogram(df, bins, plot_path, stats_path, fig)
+
+
+def data_file(data):
+    """Path to the file of interim data, given its path or its entry in a
+    settings json"""
+    return data['data'] if isinstance(data, dict) else data
+
+
+def hist_batch(entries, imgs_dir, processed_dir):
+    """Plot histograms and save statistics of many interim data on one
+    figure in turn, so matplotlib is set up once for all of them.
+
+    Args:
+        entries: list of tuples
+            Stem and data from data_entries(), the histogram is saved as
+            imgs_dir/{stem}-hist.png and its statistics as
+            processed_dir/{stem}-hist.csv
+        imgs_dir: str
+            Directory to save plots to
+        processed_dir: str
+            Directory to save statistics to
+    Returns:
+        paths: list of str
+            Paths of plots
+    """
+    paths = []
+    cache = {}
+    fig = plt.figure()
+    try:
+        for stem, data in entries:
+            path = os.path.join(imgs_dir, stem + "-hist.png")
+            hist(data, path, os.path.join(processed_dir, stem + "-hist.csv"),
+                 fig, cache)
+            paths.append(path)
+    finally:
+        plt.close(fig)
+    return paths
+
+
+def hist_rolling(data, output_path, window='10min', step='1min'):
+    """Save statistics of histograms in a window sliding along interim data
+
+    Args:
+        data: str or dict
+            Interim data file, or entry of a settings json
+        output_path: str
+            Path of statistics, format given by its extension
+        window: str
+            Length of window
+        step: str
+            Time between the starts of windows
+    Returns:
+        stats: Pandas.DataFrame
+    """
+    df = load_data(data)
+    bins = sensor_bins(data_file(data))
+    stats = rolling_stats(df, bins, window, step)
+    dir = os.path.dirname(os.path.abspath(output_path))
+    if not os.path.isdir(dir):
+        os.makedirs(dir)
+    write_frame(stats, output_path)
+    return stats
 
 
 if __name__ == '__main__':
 
     # Get filenames to work with
     parser = argparse.ArgumentParser(description="")
-    parser.add_argument("data", help="Date file")
+    parser.add_argument("data", nargs='+',
+                        help="Data file, or with --imgs any number of data "
+                        "files, glob patterns or settings json files")
     parser.add_argument("-p", "--plot",
                         help="Path to plot")
     parser.add_argument("-s", "--stats",
                         help="Path to statistics")
+    parser.add_argument("--imgs",
+                        help="Plot histograms of all data files into this "
+                        "directory")
+    parser.add_argument("--processed", default="data/processed",
+                        help="Save statistics into this directory with "
+                        "--imgs")
+    parser.add_argument("--interim", default="data/interim",
+                        help="Interim data directory, for naming outputs "
+                        "with --imgs")
     parser.add_argument("-f", "--figsize",
                         help="Figure size")
+    parser.add_argument("-r", "--rolling",
+                        help="Path to statistics in a sliding window")
+    parser.add_argument("-w", "--window", default="10min",
+                        help="Length of sliding window")
+    parser.add_argument("--step", default="1min",
+                        help="Step of sliding window")
 
     options = parser.parse_args()
-    data_path = options.data
+    data_paths = options.data
     plot_path = options.plot
     stats_path = options.stats
     fig_size = options.figsize
+    rolling_path = options.rolling
+    batch = options.imgs is not None
+
+    if not batch and len(data_paths) != 1:
+        raise ValueError("Give one data file or use --imgs")
+    if batch and rolling_path is not None:
+        raise ValueError("--rolling takes one data file, not --imgs")
 
-    msg = "Individual histogram of %s" % (data_path)
+    msg = "Histograms of %s" % (", ".join(data_paths))
     logging.debug(msg)
 
-    debug = "Data: %s, Plot: %s, Stats: %s" % (data_path, plot_path, stats_path)
+    debug = "Plot: %s, Stats: %s" % (plot_path or options.imgs,
+                                     stats_path or options.processed)
     logging.debug(debug)
 
-    # Set figure size
-    if fig_size is not None:
-        params = {"figure.figsize": figsize(float(fig_size))}
-    else:
-        params = {"figure.figsize": figsize(0.49)}
-    matplotlib.rcParams.update(params)
-
-    # load data
-    df = load_data(data_path)
-
-    # Fetch bin boundaries
-    # Get path to settings json
-    paths = os.path.normpath(data_path).split(os.path.sep)
-    sensor = os.path.splitext(paths[-1])[0]
-    path = os.path.sep.join(paths[:-3])
-    filename = paths[-3] + ".json"
-    path = os.path.join(path, filename)
-    # Load setting file
-    with open(path) as handle:
-        settings = json.load(handle)
-    # Grab bin boundaries of a sensor
-    bounds = settings['sensors'][sensor]['bins']
-
-    if plot_path is not None and stats_path is not None:
+    if rolling_path is not None:
+        # Statistics in a sliding window
+        hist_rolling(data_paths[0], rolling_path, options.window,
+                     options.step)
+
+    if batch or (plot_path is not None and stats_path is not None):
+        # Set figure size
+        if fig_size is not None:
+            params = {"figure.figsize": figsize(float(fig_size))}
+        else:
+            params = {"figure.figsize": figsize(0.49)}
+        matplotlib.rcParams.update(params)
+
+    if batch:
+        # Histograms of all data in this process
+        entries = data_entries(expand_paths(data_paths), options.interim)
+        hist_batch(entries, options.imgs, options.processed)
+    elif plot_path is not None and stats_path is not None:
         # Plot histogram and get statistics
-        histogram(df, bounds, plot_path, stats_path)
-    else:
+        hist(data_paths[0], plot_path, stats_path)
+    elif rolling_path is None:
         raise ValueError("path not given for --plot or --stats")
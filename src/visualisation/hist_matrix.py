@@ -2,12 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib import gridspec
 import argparse
 import json
 from collections import OrderedDict
 from utils import *
+from src.modules.binning import bin_specs
+from src.modules.histogram import histogram_frame
 import logging
 import pprint
 
@@ -18,74 +18,33 @@ logging.basicConfig(filename='log',
                     level=logging.DEBUG)
 
 
-def histogram(df, bounds, ax):
-    """Plot a histogram of a binned data with defined bin boundaries.
+def histogram_stats(df, bins):
+    """Work out a histogram of a binned data with defined bin boundaries and
+    its statistics.
     Args:
         df : Pandas.DataFrame
             Input dataframe with index of datetime object and each column is a
             bin od data
-        bounds : list of floats
-            List of bins boundaries.
-        path : str
-            Path for saved plots
+        bins : BinSpec
+            Geometry of the bins
+    Returns:
+        df1 : Pandas.DataFrame
+            Histogram with a row for each bin
+        stats_dict : dict
+            Geometric statistics
     """
-    columns = ["lower", "upper", "width", "midpoint",
-               "loglower", "logupper", "logwidth", "logmidpoint",
-               'Counts', 'Cum Counts', 'Density', "dN/logD"]
-    df1 = pd.DataFrame(columns=columns)
-
-    # Take a mean of the input dataframe which becomes a series with column
-    df1['Counts'] = df.mean(axis=0)
-    totalCounts = df1['Counts'].sum()
-
-    df1["lower"] = bounds[:-1]
-    df1["upper"] = bounds[1:]
-    df1["width"] = df1["upper"] - df1["lower"]
-    df1["midpoint"] = df1["width"]/2 + df1["lower"]
-    df1["loglower"] = np.log10(df1["lower"])
-    df1["logupper"] = np.log10(df1["upper"])
-    df1["logwidth"] = df1["logupper"] - df1["loglower"]
-    df1["logmidpoint"] = np.log10(df1["midpoint"])
-    df1["Density"] = df1["Counts"] / df1["width"]
-    df1["dN/logD"] = df1["Counts"] / df1["logwidth"]
-
-    # Iterate through the bins
-    bins = df1.index
-    cumCounts = 0
-    for ix, key in enumerate(bins):
-        counts = df1['Counts'].iloc[ix]
-        lower = df1['lower'].iloc[ix]
-        width = df1["width"].iloc[ix]
-
-        # Cumulative frequency
-        lowerCumCounts = cumCounts
-        cumCounts += counts
-        upperCumCounts = cumCounts
-        df1['Cum Counts'].iloc[ix] = cumCounts
-
-        # Median
-        if lowerCumCounts < totalCounts/2 < upperCumCounts:
-            median = lower + ((totalCounts/2 - lowerCumCounts)/counts) * width
-
-    # Statistics
-    counts = df1['Counts'].values
-    midpoints = df1["midpoint"].values
-    # logmidpoints = np.log10(midpoints)
-
-    # Normal distribution
-    mean, std, lower, upper = statistics(midpoints, counts)
-
-    # Log normal distribution
-    gm, gstd, glower, gupper = np.exp(statistics(np.log(midpoints), counts))
-
-    stats_dict = OrderedDict({'gmd': gm, 'gstd': gstd,
-                  'glower': glower, 'gupper': gupper})
-
-    index = ['Geometric mean diameter', 'Geometric standard deviation',
-             'Geometric 95% lower', 'Geometric 95% upper']
-    statsdata = [gm, std, glower, gupper]
-    statsdf = pd.DataFrame(statsdata, index=index)
+    df1, stats = histogram_frame(df, bins)
+
+    stats_dict = OrderedDict({'gmd': stats['gmd'], 'gstd': stats['gstd'],
+                  'glower': stats['glower'], 'gupper': stats['gupper']})
+
+    return df1, stats_dict
+
+    # save_latex(statsdf, stats_path, "histstats", header=False)
+
 
+def plot_histogram(df1, ax):
+    """Plot a histogram from histogram_stats() on log scale"""
     # Plot lognormal
     x1 = df1["lower"].tolist()  # left edge
     x2 = df1["upper"].tolist()  # right edge
@@ -94,9 +53,38 @@ def histogram(df, bounds, ax):
     ax.bar(x1, y, width=w)
     ax.set_xscale('log')
 
+
+def histogram(df, bins, ax):
+    """Plot a histogram of a binned data with defined bin boundaries.
+    Args:
+        df : Pandas.DataFrame
+            Input dataframe with index of datetime object and each column is a
+            bin od data
+        bins : BinSpec
+            Geometry of the bins
+        ax : matplotlib.axes.Axes
+            Axes to plot on
+    Returns:
+        stats_dict : dict
+    """
+    df1, stats_dict = histogram_stats(df, bins)
+    plot_histogram(df1, ax)
     return stats_dict
 
-    # save_latex(statsdf, stats_path, "histstats", header=False)
+
+def condition_histograms(sensors):
+    """Load the data of sensors in a condition and work out their histograms.
+
+    Args:
+        sensors : list of tuples
+            Data of each sensor in the condition, as recorded in the
+            settings json, and its BinSpec
+    Returns:
+        histograms : list of tuples
+            Histogram and statistics of each sensor from histogram_stats()
+    """
+    return [histogram_stats(load_data(data), bins)
+            for data, bins in sensors]
 
 
 def table(dictionary):
@@ -131,18 +119,20 @@ def table(dictionary):
         raise
 
 
-if __name__ == '__main__':
-
-    # Get filenames to work with
-    parser = argparse.ArgumentParser(description="")
-    parser.add_argument("settings", help="Date file")
-    parser.add_argument("-o", "--output",
-                        help="Directs the output to a name of your choice")
-
-    options = parser.parse_args()
-    settings_file = options.settings
-    output_file = options.output
+def hist_matrix(settings_file, output_file, jobs=1):
+    """Plot a matrix of histograms of calibratee, calibrater and rebinned
+    calibrater data for every condition.
 
+    Args:
+        settings_file: str
+            Settings json file
+        output_file: str
+            Path of plot
+        jobs: int
+            Number of conditions to work out in parallel
+    Returns:
+        settings: dict
+    """
     msg = "Histogram matrix of %s" % (settings_file)
     logging.debug(msg)
 
@@ -200,6 +190,14 @@ if __name__ == '__main__':
     exp_stats = pd.DataFrame(index=exp_order)
     exp_stats.index.name = exps['parameter']
 
+    # Load data and work out histograms of every condition, with the bins of
+    # each sensor worked out once
+    specs = bin_specs(sensors)
+    tasks = [[(conditions[exp]['sensor'][x], specs[x])
+              for x in [calibratee, calibrater, rebinned]]
+             for exp in exp_order]
+    histograms = map_conditions(condition_histograms, tasks, jobs)
+
     for i, exp in enumerate(exp_order):
         msg = ("Index: %s, Condition: %s, "
                "Calibrater: %s, Calibratee: %s") % (i, exp, calibrater,
@@ -218,49 +216,24 @@ if __name__ == '__main__':
                      size=11, ha='center', va='bottom')
         ax1.axis('off')
 
-        # Second column
-        # load calibratee data and plot it!
-        data_path = condition['sensor'][calibratee]['data']
-        df = load_data(data_path)
+        (df1, hist1), (df2, hist2), (df3, hist3) = histograms[i]
 
-        # Get bins
-        bounds = sensors[calibratee]['bins']
-
-        # Pick an axes
+        # Second column
+        # Histogram logdensity of calibratee
         ax2 = plt.subplot(gs[i, 1])
-
-        # Histogram logdensity
-        hist1 = histogram(df, bounds, ax2)
+        plot_histogram(df1, ax2)
         ax2.xaxis.set_visible(False)
 
         # Third column
-        # load calibrater data and plot it!
-        data_path = condition['sensor'][calibrater]['data']
-        df = load_data(data_path)
-
-        # Get bins
-        bounds = sensors[calibrater]['bins']
-
-        # Pick an axes
+        # Histogram logdensity of calibrater
         ax3 = plt.subplot(gs[i, 2])
-
-        # Histogram logdensity
-        hist2 = histogram(df, bounds, ax3)
+        plot_histogram(df2, ax3)
         ax3.xaxis.set_visible(False)
 
         # Fourth column
-        # load rebinned calibrater data and plot it!
-        data_path = condition['sensor'][rebinned]['data']
-        df = load_data(data_path)
-
-        # Get bins
-        bounds = sensors[rebinned]['bins']
-
-        # Pick an axes
+        # Histogram logdensity of rebinned calibrater
         ax4 = plt.subplot(gs[i, 3])
-
-        # Histogram logdensity
-        hist3 = histogram(df, bounds, ax4)
+        plot_histogram(df3, ax4)
         ax4.xaxis.set_visible(False)
 
         # First row
@@ -308,3 +281,23 @@ if __name__ == '__main__':
     with open(settings_file, 'w') as handle:
         json.dump(settings, handle, default=date_handler,
                   sort_keys=True, indent=4)
+
+    return settings
+
+
+if __name__ == '__main__':
+
+    # Get filenames to work with
+    parser = argparse.ArgumentParser(description="")
+    parser.add_argument("settings", help="Date file")
+    parser.add_argument("-o", "--output",
+                        help="Directs the output to a name of your choice")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of conditions to work out in parallel")
+
+    options = parser.parse_args()
+    settings_file = options.settings
+    output_file = options.output
+    jobs = options.jobs
+
+    hist_matrix(settings_file, output_file, jobs)
@@ -2,21 +2,33 @@
 # -*- coding: utf-8 -*-
 
 import os
-import matplotlib
-import matplotlib.pyplot as plt
 import pandas as pd
 import argparse
 from utils import *
 
 
-def plot(df, path):
+def plot(df, path, fig=None):
+    """Plot a time series of binned data
+
+    Args:
+        df: Pandas.DataFrame
+        path: str
+            Path for saved plot
+        fig: matplotlib.figure.Figure
+            Figure to clear and draw on, which is left open, otherwise a new
+            figure is made and closed
+    """
     # Change the index of df to minutes
     df = index_mins(df)
-    fig = plt.figure()
+    close = fig is None
+    if close:
+        fig = plt.figure()
+    else:
+        fig.clf()
     ax = fig.add_subplot(111)
     df.plot(ax=ax)
-    plt.ylabel('Particle count')
-    plt.xlabel('Time/min')
+    ax.set_ylabel('Particle count')
+    ax.set_xlabel('Time/min')
 
     lines, labels = ax.get_legend_handles_labels()
     # ax.legend(lines, labels, loc='upper center', mode='expand')
@@ -27,21 +39,54 @@ def plot(df, path):
               "bbox_inches": "tight"}
 
     path = saveplot(path, fig, **kwargs)
-    plt.close()
+    if close:
+        plt.close(fig)
+
+
+def plot_batch(entries, imgs_dir):
+    """Plot the time series of many interim data on one figure in turn, so
+    matplotlib is set up once for all of them.
+
+    Args:
+        entries: list of tuples
+            Stem and data from data_entries(), the plot is saved as
+            imgs_dir/{stem}-plot.png
+        imgs_dir: str
+            Directory to save plots to
+    Returns:
+        paths: list of str
+            Paths of plots
+    """
+    paths = []
+    fig = plt.figure()
+    try:
+        for stem, data in entries:
+            path = os.path.join(imgs_dir, stem + "-plot.png")
+            plot(load_data(data), path, fig)
+            paths.append(path)
+    finally:
+        plt.close(fig)
+    return paths
 
 
 if __name__ == '__main__':
 
     # Get filenames to work with
     parser = argparse.ArgumentParser(description="")
-    parser.add_argument("data", help="Date file")
+    parser.add_argument("data", nargs='+',
+                        help="Data file, or with --imgs any number of data "
+                        "files, glob patterns or settings json files")
     parser.add_argument("-o", "--output",
                         help="Directs the output to a name of your choice")
+    parser.add_argument("--imgs",
+                        help="Plot all data files into this directory")
+    parser.add_argument("--interim", default="data/interim",
+                        help="Interim data directory, for naming plots "
+                        "with --imgs")
     parser.add_argument("-f", "--figsize",
                         help="Figure size")
 
     options = parser.parse_args()
-    data_path = options.data
     output_file = options.output
     fig_size = options.figsize
 
@@ -52,8 +97,15 @@ if __name__ == '__main__':
         params = {"figure.figsize": figsize(0.49)}
     matplotlib.rcParams.update(params)
 
-    # load data
-    df = load_data(data_path)
+    if options.imgs is not None:
+        # Plot all data in this process
+        entries = data_entries(expand_paths(options.data), options.interim)
+        plot_batch(entries, options.imgs)
+    elif len(options.data) == 1 and output_file is not None:
+        # load data
+        df = load_data(options.data[0])
 
-    # Plot data
-    plot(df, output_file)
+        # Plot data
+        plot(df, output_file)
+    else:
+        raise ValueError("Give one data file with --output or use --imgs")
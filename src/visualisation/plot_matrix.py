@@ -1,11 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import matplotlib.pyplot as plt
-from matplotlib import gridspec
 import argparse
 import json
 from utils import *
+from src.modules.align import align_frames
 import logging
 
 logging.basicConfig(filename='log',
@@ -16,26 +15,45 @@ logging.basicConfig(filename='log',
 
 
 def plot(df, ax):
-    # Change the index of df to minutes
-    df = index_mins(df)
-
     # Plot timeseries
     df.plot(ax=ax, legend=False)
     ax.set_color_cycle(None)
 
 
-if __name__ == '__main__':
-
-    # Get filenames to work with
-    parser = argparse.ArgumentParser(description="")
-    parser.add_argument("settings", help="Date file")
-    parser.add_argument("-o", "--output",
-                        help="Directs the output to a name of your choice")
-
-    options = parser.parse_args()
-    settings_file = options.settings
-    output_file = options.output
-
+def condition_series(entries):
+    """Load the time series of a condition with index in minutes.
+
+    Args:
+        entries: tuple of dict
+            Data of calibrater, calibratee and rebinned calibrater in the
+            condition, as recorded in the settings json
+    Returns:
+        calibrater: Pandas.DataFrame
+        calibratee: Pandas.DataFrame
+            Calibratee data joined with rebinned calibrater data in the
+            same minutes
+    """
+    calibrater, calibratee, rebinned = [load_data(x) for x in entries]
+    calibratee = align_frames(calibratee, rebinned)
+
+    # Change the index of data to minutes
+    return index_mins(calibrater), index_mins(calibratee)
+
+
+def plot_matrix(settings_file, output_file, jobs=1):
+    """Plot a matrix of time series of calibrater, calibratee and rebinned
+    calibrater data for every condition.
+
+    Args:
+        settings_file: str
+            Settings json file
+        output_file: str
+            Path of plot
+        jobs: int
+            Number of conditions to load in parallel
+    Returns:
+        settings: dict
+    """
     msg = "Time series plot matrix of %s" % (settings_file)
     logging.debug(msg)
 
@@ -89,6 +107,12 @@ if __name__ == '__main__':
     msg = "Looping over conditions"
     logging.debug(msg)
 
+    # Load data of every condition
+    tasks = [tuple(conditions[exp]['sensor'][x]
+                   for x in [calibrater, calibratee, rebinned])
+             for exp in exp_order]
+    series = map_conditions(condition_series, tasks, jobs)
+
     for i, exp in enumerate(exp_order):
         msg = ("Index: %s, Condition: %s, "
                "Calibrater: %s, Calibratee: %s") % (i, exp, calibrater,
@@ -107,31 +131,17 @@ if __name__ == '__main__':
                      size=11, ha='center', va='bottom')
         ax1.axis('off')
 
-        # Second column
-        # load calibrater data and plot it!
-        data_path = condition['sensor'][calibrater]['data']
-        df = load_data(data_path)
+        df, df1 = series[i]
 
-        # Pick an axes
+        # Second column
+        # Plot calibrater timeseries
         ax2 = plt.subplot(gs[i, 1])
-
-        # Plot timeseries
         plot(df, ax2)
 
         # Third column
-        # load calibratee and rebinned data and plot it!
-        data_path = condition['sensor'][calibratee]['data']
-        df = load_data(data_path)
-
-        data_path = condition['sensor'][rebinned]['data']
-        df1 = load_data(data_path)
-        df = concat(df, df1)
-
-        # Pick an axes
+        # Plot calibratee and rebinned timeseries
         ax3 = plt.subplot(gs[i, 2])
-
-        # Plot timeseries
-        plot(df, ax3)
+        plot(df1, ax3)
 
     # Taking axes from last row
     # x label
@@ -163,3 +173,23 @@ if __name__ == '__main__':
     with open(settings_file, 'w') as handle:
         json.dump(settings, handle, default=date_handler,
                   sort_keys=True, indent=4)
+
+    return settings
+
+
+if __name__ == '__main__':
+
+    # Get filenames to work with
+    parser = argparse.ArgumentParser(description="")
+    parser.add_argument("settings", help="Date file")
+    parser.add_argument("-o", "--output",
+                        help="Directs the output to a name of your choice")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of conditions to load in parallel")
+
+    options = parser.parse_args()
+    settings_file = options.settings
+    output_file = options.output
+    jobs = options.jobs
+
+    plot_matrix(settings_file, output_file, jobs)
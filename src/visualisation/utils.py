@@ -2,11 +2,23 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
+import glob
+import json
+from multiprocessing import Pool
 import numpy as np
 import pandas as pd
-import matplotlib
 import logging
 
+# Scripts are run by path, see src/data/utils.py
+_project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            os.pardir, os.pardir))
+if _project_dir not in sys.path:
+    sys.path.append(_project_dir)
+
+from src.modules.store import read_frame, read_data
+from src.modules.lazy import LazyModule
+
 logging.basicConfig(filename='log',
                     filemode='a',
                     format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
@@ -35,7 +47,20 @@ params = {                      # setup matplotlib to use latex for output
         r"\usepackage{siunitx}"
         ]
     }
-matplotlib.rcParams.update(params)
+
+
+def setup_matplotlib():
+    """Import matplotlib and apply the settings above, called before the
+    first use of any part of matplotlib
+    """
+    import matplotlib as mpl
+    mpl.rcParams.update(params)
+
+
+# matplotlib is only imported when a script first plots
+matplotlib = LazyModule('matplotlib', setup_matplotlib)
+plt = LazyModule('matplotlib.pyplot', setup_matplotlib)
+gridspec = LazyModule('matplotlib.gridspec', setup_matplotlib)
 
 
 def date_handler(obj):
@@ -54,14 +79,97 @@ def figsize(scale):
     return fig_size
 
 
-def load_data(path):
-    """Load a dataset
+def load_data(data):
+    """Load a dataset, given its path or its entry in a settings json, which
+    may be a range of rows of the file
     """
-    df = pd.read_csv(path,
-                     parse_dates=[0],
-                     index_col=0,
-                     infer_datetime_format=True)
-    return df
+    if isinstance(data, dict):
+        return read_data(data)
+    return read_frame(data)
+
+
+def expand_paths(patterns):
+    """Files matching a list of paths or glob patterns, which may use ** to
+    match any number of directories. Each file is given once, in the order
+    of the patterns.
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches and os.path.isfile(pattern):
+            matches = [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def output_stem(data_path, interim_dir):
+    """Path of an interim data file relative to the interim directory and
+    without its extension, which names the outputs made from it.
+    """
+    path = os.path.relpath(os.path.abspath(data_path),
+                           os.path.abspath(interim_dir))
+    return os.path.splitext(path)[0]
+
+
+def data_entries(paths, interim_dir):
+    """Interim data of files and settings json files, each with the stem
+    that names the outputs made from it. A settings json gives the data of
+    every sensor in every condition, named {settings}/{condition}/{sensor},
+    other files are named by output_stem().
+
+    Args:
+        paths: list of str
+            Interim data files and settings json files
+        interim_dir: str
+            Interim data directory
+    Returns:
+        entries: list of tuples
+            Stem and data, a path or an entry of a settings json, given once
+            for each stem
+    """
+    entries = []
+    stems = set()
+    for path in paths:
+        if os.path.splitext(path)[-1] == '.json':
+            with open(path) as handle:
+                settings = json.load(handle)
+            name = output_stem(path, interim_dir)
+            found = []
+            for exp, condition in settings['exp']['conditions'].items():
+                for sensor, data in condition['sensor'].items():
+                    found.append((os.path.join(name, exp, sensor), data))
+        else:
+            found = [(output_stem(path, interim_dir), path)]
+        for stem, data in found:
+            if stem not in stems:
+                stems.add(stem)
+                entries.append((stem, data))
+    return entries
+
+
+def map_conditions(func, tasks, jobs=1):
+    """Apply func to the task of every condition, in worker processes if
+    jobs is more than one. Results are in the order of tasks.
+
+    Args:
+        func: function
+            Module level function taking one task
+        tasks: list
+        jobs: int
+            Number of worker processes
+    Returns:
+        results: list
+    """
+    if jobs > 1 and len(tasks) > 1:
+        pool = Pool(min(jobs, len(tasks)))
+        try:
+            return pool.map(func, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    return [func(x) for x in tasks]
 
 
 def saveplot(path, fig, **kwargs):
@@ -170,40 +278,6 @@ def pruneBins(df):
     df = df.drop(df.columns[zeroColumns], axis=1)
     return df
 
-def concat(df1, df2):
-    """Concatenate two Pandas.DataFrames together.
-    The first dataframe's index will be used to set the index of second if the
-    length of the indexes are equal.
-    Different length dataframes can be concatanced together, where the shorted
-    index is used.
-    """
-    columns1 = df1.columns
-    columns2 = df2.columns
-
-    if len(df1) == len(df2):
-        debug = "df1: %s, df2: %s, Compare: %s" % (columns1, columns2, "Same")
-        df2.index = df1.index
-        df = df1.join(df2)
-    elif len(df1) > len(df2):
-        debug = "df1: %s, df2: %s, Compare: %s" % (columns1, columns2, "df1 bigger")
-        start = df2.index[0]
-        end = df2.index[-1]
-        df3 = df1.loc[start:end]
-        df = df3.join(df2)
-    elif len(df1) < len(df2):
-        debug = "df1: %s, df2: %s, Compare: %s" % (columns1, columns2, "df2 bigger")
-        start = df1.index[0]
-        end = df1.index[-1]
-        df3 = df2.loc[start:end]
-        df = df1.join(df3)
-    else:
-        error = "Something not right!"
-        print(error)
-        sys.exit(2)
-    logging.debug(debug)
-    return df
-
-
 def index_mins(df):
     period = df.index - df.index[0]
     mins = period.total_seconds() / 60
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The stage and sensor scripts import their siblings, as when run by path
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+sys.path.insert(0, os.path.join(src_dir, 'data'))
+sys.path.insert(0, os.path.join(src_dir, 'sensors'))
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.modules.align import match_minutes, align, align_frames, valid_pairs
+
+
+def make_frame(start, minutes, columns, seed):
+    rng = np.random.RandomState(seed)
+    index = pd.DatetimeIndex(pd.Timestamp(start) +
+                             pd.to_timedelta(minutes, unit='m'),
+                             name='Datetime')
+    values = rng.uniform(0, 100, (len(index), len(columns)))
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def join_by_minute(df1, df2):
+    """Inner join of the first row of each minute of two frames"""
+    frames = []
+    for df in [df1, df2]:
+        minutes = df.index.floor('min')
+        first = df[~minutes.duplicated()]
+        frames.append(first.set_axis(first.index.floor('min')))
+    joined = frames[0].join(frames[1], how='inner').sort_index()
+    return joined
+
+
+@pytest.fixture
+def frames():
+    # The calibrater starts later and stops earlier, and both have gaps
+    df1 = make_frame('2016-09-08 07:55', [0, 1, 2, 3, 5, 6, 7, 9, 10],
+                     ['dylos-0.5', 'dylos-2.5'], 0)
+    df2 = make_frame('2016-09-08 07:57', [0, 1, 2, 4, 5, 6],
+                     ['alpha-0.5', 'alpha-2.5'], 1)
+    return df1, df2
+
+
+def check(df1, df2):
+    df = align_frames(df1, df2)
+    expected = join_by_minute(df1, df2)
+    assert list(df.columns) == list(df1.columns) + list(df2.columns)
+    np.testing.assert_array_equal(df.values, expected.values)
+    assert (df.index.floor('min') == expected.index).all()
+    assert df.index.is_monotonic_increasing
+    return df
+
+
+def test_partly_overlapping(frames):
+    df1, df2 = frames
+    df = check(df1, df2)
+    assert len(df) == 4
+    assert (df.index == df1.index[[2, 3, 5, 6]]).all()
+    assert len(check(df1, df2.iloc[:0])) == 0
+    # Frames that do not overlap at all
+    assert len(check(df1.iloc[:2], df2)) == 0
+
+
+def test_unsorted(frames):
+    df1, df2 = frames
+    rng = np.random.RandomState(2)
+    shuffled1 = df1.iloc[rng.permutation(len(df1))]
+    shuffled2 = df2.iloc[rng.permutation(len(df2))]
+    expected = align_frames(df1, df2)
+    for pair in [(shuffled1, df2), (df1, shuffled2),
+                 (shuffled1, shuffled2)]:
+        df = check(*pair)
+        np.testing.assert_array_equal(df.values, expected.values)
+        assert (df.index == expected.index).all()
+
+
+def test_duplicate_minutes(frames):
+    df1, df2 = frames
+    # A second row in a minute of each, and the first row of the minute is
+    # the one used
+    extra1 = make_frame('2016-09-08 07:58:30', [0], df1.columns, 3)
+    extra2 = make_frame('2016-09-08 07:58:00', [0], df2.columns, 4)
+    dup1 = pd.concat([df1, extra1]).sort_index(kind='mergesort')
+    dup2 = pd.concat([df2.iloc[:2], extra2, df2.iloc[1:]])
+    df = check(dup1, dup2)
+    row = df.loc['2016-09-08 07:58']
+    np.testing.assert_array_equal(row.values.ravel(), np.concatenate(
+        [df1.loc['2016-09-08 07:58'].values.ravel(),
+         df2.loc['2016-09-08 07:58'].values.ravel()]))
+
+
+def test_match_minutes_seconds():
+    index1 = pd.to_datetime(['2016-09-08 07:55:59', '2016-09-08 07:56:01'])
+    index2 = pd.to_datetime(['2016-09-08 07:56:00'])
+    rows1, rows2 = match_minutes(index1, index2)
+    assert list(rows1) == [1]
+    assert list(rows2) == [0]
+
+
+def test_valid_pairs(frames):
+    df1, df2 = frames
+    df1.iloc[3, 0] = np.nan
+    df2.iloc[3, 0] = np.nan
+    index, values, valid = align(df1, df2)
+    assert (valid == ~np.isnan(values)).all()
+    x, y, minutes = valid_pairs(index, values, valid, 0, 2)
+    joined = join_by_minute(df1, df2).dropna(subset=['dylos-0.5',
+                                                     'alpha-0.5'])
+    np.testing.assert_array_equal(x, joined['dylos-0.5'].values)
+    np.testing.assert_array_equal(y, joined['alpha-0.5'].values)
+    assert (minutes.floor('min') == joined.index).all()
+    assert len(x) == 2
+    x, y, minutes = valid_pairs(index, values, valid, 1, 3)
+    assert len(x) == 4
@@ -0,0 +1,33 @@
+import os
+import stat
+import pytest
+from src.modules.atomic import atomic_open
+
+
+@pytest.mark.parametrize('umask', [0o022, 0o077])
+def test_atomic_open_follows_umask(tmpdir, umask):
+    old = os.umask(umask)
+    try:
+        path = str(tmpdir.join('sub', 'report.json'))
+        with atomic_open(path) as handle:
+            handle.write('{}')
+        with open(str(tmpdir.join('plain.json')), 'w') as handle:
+            handle.write('{}')
+    finally:
+        os.umask(old)
+    mode = stat.S_IMODE(os.stat(path).st_mode)
+    assert mode == 0o666 & ~umask
+    assert mode == stat.S_IMODE(os.stat(str(tmpdir.join('plain.json'))).st_mode)
+    assert os.listdir(os.path.dirname(path)) == ['report.json']
+
+
+def test_atomic_open_keeps_old_file_on_error(tmpdir):
+    path = str(tmpdir.join('report.json'))
+    with atomic_open(path) as handle:
+        handle.write('old')
+    with pytest.raises(RuntimeError):
+        with atomic_open(path) as handle:
+            handle.write('new')
+            raise RuntimeError
+    assert open(path).read() == 'old'
+    assert os.listdir(str(tmpdir)) == ['report.json']
@@ -0,0 +1,79 @@
+import pickle
+import numpy as np
+import pytest
+from src.modules.binning import (BinSpec, TransferCache, rebin_values,
+                                 transfer_matrix, spread_matrix,
+                                 bounds_signature)
+
+try:
+    import rebin
+except ImportError:
+    rebin = None
+needs_rebin = pytest.mark.skipif(
+    not hasattr(rebin, 'rebin_piecewise_constant'),
+    reason="needs rebin from jhykes/rebin")
+
+# Bins of a dylos and an alphasense sensor
+DYLOS = [0.5, 2.5, 10]
+ALPHA = [0.38, 0.54, 0.78, 1.05, 1.34, 1.59, 2.07, 3, 4, 5, 6.5, 8, 10, 12]
+
+
+def per_row(values, bounds1, bounds2):
+    """Rebin each row on its own as the old rebin did"""
+    return np.array([rebin.rebin_piecewise_constant(np.array(bounds1), y1,
+                                                    np.array(bounds2))
+                     for y1 in values])
+
+
+@needs_rebin
+def test_rebin_values_matches_per_row():
+    bounds1 = ALPHA
+    bounds2 = [0.54, 1, 2.5, 10]
+    values = np.random.RandomState(0).rand(20, len(bounds1) - 1) * 100
+    values[3, 0] = np.nan
+    values[7, 5] = np.nan
+    values[11, -1] = np.nan
+    values[15, [2, 9]] = np.nan
+    values[18] = np.nan
+
+    matrix = transfer_matrix(bounds1, bounds2)
+    spread = spread_matrix(bounds1, bounds2)
+    expected = per_row(values, bounds1, bounds2)
+    rebinned = rebin_values(values, matrix, spread)
+
+    np.testing.assert_array_equal(np.isnan(rebinned), np.isnan(expected))
+    np.testing.assert_allclose(rebinned, expected)
+    # A NaN in the top bin leaves the lower bins of the row
+    assert not np.isnan(rebinned[11]).all()
+
+
+@needs_rebin
+def test_transfer_cache_spread(tmpdir):
+    cache = TransferCache(path=str(tmpdir))
+    values = np.array([[1, np.nan, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]],
+                      dtype=float)
+    rebinned = rebin_values(values, cache.get(ALPHA, DYLOS),
+                            cache.spread(ALPHA, DYLOS))
+    np.testing.assert_array_equal(np.isnan(rebinned),
+                                  np.isnan(per_row(values, ALPHA, DYLOS)))
+    # Read back from disk
+    cache.clear()
+    np.testing.assert_array_equal(cache.spread(ALPHA, DYLOS),
+                                  spread_matrix(ALPHA, DYLOS))
+
+
+@needs_rebin
+def test_transfer_cache_leaves_no_temporary_files(tmpdir):
+    TransferCache(path=str(tmpdir)).get(ALPHA, DYLOS)
+    assert [x.basename for x in tmpdir.listdir()] == [
+        bounds_signature(ALPHA, DYLOS) + ".npy"]
+
+
+def test_bin_spec_pickles_with_gaps():
+    # Grimm bins leave out the first column of the raw data
+    bins = BinSpec('grimm', ['', 0.3, 0.4, 0.5, 0.65, '', 1])
+    copy = pickle.loads(pickle.dumps(bins))
+    assert copy == bins
+    assert copy.index == bins.index == (1, 2, 3, 4)
+    assert copy.columns == bins.columns
+    assert copy != BinSpec('grimm', [0.3, 0.4, 0.5, 0.65, 1])
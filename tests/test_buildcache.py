@@ -0,0 +1,17 @@
+import os
+from src.modules.buildcache import BuildCache
+
+
+def test_build_cache_round_trip(tmpdir):
+    path = str(tmpdir.join('interim', 'cache.json'))
+    output = str(tmpdir.join('out.npz'))
+    open(output, 'w').close()
+    cache = BuildCache(path)
+    cache.set('sensor', 'abc', [output], None)
+    cache.save()
+    assert os.listdir(os.path.dirname(path)) == ['cache.json']
+    cache = BuildCache(path)
+    assert cache.fresh('sensor', 'abc')
+    assert not cache.fresh('sensor', 'def')
+    os.remove(output)
+    assert not cache.fresh('sensor', 'abc')
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.modules.grid import write_grid, read_grid, read_header, grid_rows
+
+
+def make_frame(minutes):
+    """Rows at the given minutes past 07:55, the second row all NaN"""
+    index = pd.Index(pd.Timestamp('2016-09-08 07:55') +
+                     pd.to_timedelta(minutes, unit='m'), name='Datetime')
+    values = np.arange(2.0 * len(minutes)).reshape(-1, 2)
+    values[1:2] = np.nan
+    return pd.DataFrame(values, index=index, columns=['dylos-0.5',
+                                                      'dylos-2.5'])
+
+
+def assert_same(read, expected):
+    pd.testing.assert_frame_equal(read, expected, check_freq=False,
+                                  check_index_type=False)
+    assert (read.index.values == expected.index.values).all()
+
+
+def test_gaps_and_nan_rows(tmpdir):
+    df = make_frame([0, 1, 2, 5, 6, 10])
+    path = write_grid(df, str(tmpdir.join('dylos.grid')), [0.5, 2.5, 10])
+    header = read_header(path)
+    assert header['minutes'] == 11
+    assert header['bins'] == [0.5, 2.5, 10]
+    assert header['offset'] % 64 == 0
+
+    # The row of only NaN is kept, the minutes of the gaps are not
+    assert_same(read_grid(path), df)
+    # Rows are minutes from the first, gaps in them are left out
+    assert_same(read_grid(path, [1, 6]), df.iloc[1:4])
+    assert_same(read_grid(path, [3, 5]), df.iloc[:0])
+    assert_same(read_grid(path, [-3, 40]), df)
+    assert_same(read_grid(path, [8, 2]), df.iloc[:0])
+
+
+@pytest.mark.parametrize('start, end, rows', [
+    ('2016-09-08 07:55', '2016-09-08 08:05', [0, 11]),
+    ('2016-09-08 07:56:30', '2016-09-08 08:00:30', [2, 6]),
+    ('2016-09-08 07:00', '2016-09-08 07:56', [0, 2]),
+    ('2016-09-08 08:04', '2016-09-08 09:00', [9, 11]),
+    ('2016-09-08 07:00', '2016-09-08 07:10', [0, 0]),
+    ('2016-09-08 08:10', '2016-09-08 08:20', [11, 11]),
+    ('2016-09-08 08:00', '2016-09-08 07:58', [5, 5]),
+])
+def test_grid_rows(tmpdir, start, end, rows):
+    df = make_frame([0, 1, 2, 5, 6, 10])
+    path = write_grid(df, str(tmpdir.join('dylos.grid')))
+    assert grid_rows(path, start, end) == rows
+    assert_same(read_grid(path, rows), df.loc[start:end])
+
+
+def test_memory_map_is_copy_on_write(tmpdir):
+    df = make_frame([0, 1, 2, 3])
+    path = write_grid(df, str(tmpdir.join('dylos.grid')))
+    read = read_grid(path, [0, 3])
+    base = read.values
+    while base.base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
+    read.iloc[0, 0] = 100
+    assert_same(read_grid(path), df)
+
+
+def test_empty_grid(tmpdir):
+    df = make_frame([])
+    path = write_grid(df, str(tmpdir.join('dylos.grid')))
+    assert grid_rows(path, '2016-09-08', '2016-09-09') == [0, 0]
+    read = read_grid(path)
+    assert read.empty
+    assert list(read.columns) == list(df.columns)
+
+
+@pytest.mark.parametrize('index', [
+    ['2016-09-08 07:55:30', '2016-09-08 07:56:00'],  # not whole minutes
+    ['2016-09-08 07:56:00', '2016-09-08 07:55:00'],  # not in time order
+    ['2016-09-08 07:55:00', '2016-09-08 07:55:00'],  # two rows a minute
+])
+def test_write_grid_errors(tmpdir, index):
+    df = pd.DataFrame({'a': [1.0, 2.0]}, index=pd.to_datetime(index))
+    with pytest.raises(ValueError):
+        write_grid(df, str(tmpdir.join('dylos.grid')))
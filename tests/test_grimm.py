@@ -0,0 +1,50 @@
+import io
+import pytest
+from benchmark_grimm import make_dump, transform_lines
+from process_grimm import transform
+
+# Undated records, uneven whitespace and a change of month
+DUMP = """\
+Grimm 1.108 dump
+C00 1 2 3 4 5 6 7 8
+c00 9 10 11 12 13 14 15 16
+P 16 9 30 23 59 0 0 0 100 0
+C00\t10 20 30 40 50 60 70 80
+c00  90 100 110 120 130 140 150 160
+C11 11 21 31 41 51 61 71 81
+c11 91 101 111 121 131 141 151 161
+P 16 10 1 0 0 0 0 0 100 0
+C95 12 22 32 42 52 62 72 82
+c95 92 102 112 122 132 142 152 162
+"""
+
+
+def decode(decoder, dump):
+    output = io.StringIO()
+    decoder(io.StringIO(dump), output)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize('dump', [DUMP, make_dump(30), ""])
+def test_transform_matches_line_decoder(dump, capsys):
+    assert decode(transform, dump) == decode(transform_lines, dump)
+
+
+def test_transform_bad_date(capsys):
+    for decoder in [transform, transform_lines]:
+        with pytest.raises(ValueError):
+            decode(decoder, "P 16 9 30\nC00 1\nc00 2\n")
+
+
+def test_transform_skips_blank_lines():
+    dump = DUMP.replace("\n", "\n\n  \n")
+    assert decode(transform, dump) == decode(transform, DUMP)
+
+
+def test_transform_rows():
+    rows = decode(transform, DUMP).split("\r\n")
+    assert rows[0] == "2016-09-30 23:59:00," + \
+        ",".join(str(x) for x in range(10, 170, 10))
+    assert rows[1].startswith("2016-09-30 23:59:07,11,")
+    assert rows[2].startswith("2016-10-01 00:00:59,12,")
+    assert rows[3:] == [""]
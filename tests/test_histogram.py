@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.modules.histogram import (COLUMNS, STATS, histogram_stats,
+                                   histogram_frame, rolling_stats)
+
+BOUNDS = [0.38, 0.54, 0.78, 1.05, 1.34, 1.59, 2.07, 3, 4, 5, 6.5]
+
+
+def nmoment(x, counts, c, n):
+    return np.sum(((x-c)**n)*counts) / np.sum(counts)
+
+
+def statistics(midpoints, counts):
+    mean = nmoment(midpoints, counts, 0, 1)
+    std = nmoment(midpoints, counts, mean, 2)**0.5
+    return mean, std, mean - 2 * std, mean + 2 * std
+
+
+def loop_histogram(counts, bounds):
+    """Statistics of one histogram as analysis.histogram worked them out,
+    with the geometric standard deviation in its place
+    """
+    lower = np.array(bounds[:-1])
+    width = np.diff(bounds)
+    midpoints = lower + width / 2
+    totalCounts = counts.sum()
+    cumCounts = 0
+    median = np.nan
+    cum = []
+    for ix in range(len(counts)):
+        lowerCumCounts = cumCounts
+        cumCounts += counts[ix]
+        cum.append(cumCounts)
+        if lowerCumCounts < totalCounts/2 < cumCounts:
+            median = lower[ix] + ((totalCounts/2 - lowerCumCounts) /
+                                  counts[ix]) * width[ix]
+    mean, std, lower95, upper95 = statistics(midpoints, counts)
+    gm, gstd, glower, gupper = np.exp(statistics(np.log(midpoints), counts))
+    stats = dict(zip(STATS, [median, mean, std, lower95, upper95,
+                             gm, gstd, glower, gupper]))
+    return stats, np.array(cum)
+
+
+def make_counts(seed):
+    rng = np.random.RandomState(seed)
+    counts = rng.uniform(0, 100, (6, len(BOUNDS) - 1))
+    counts[1, 3:] = 0
+    # realCounts can leave negative counts, the median is then taken from
+    # the last bin the half way count falls in
+    counts[2, 4] = -300
+    counts[2, 6] = 400
+    return counts
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_histogram_stats_matches_loop(seed):
+    counts = make_counts(seed)
+    table, stats = histogram_stats(counts, BOUNDS)
+    for row in range(len(counts)):
+        expected, cum = loop_histogram(counts[row], BOUNDS)
+        for key in STATS:
+            np.testing.assert_allclose(stats[key][row], expected[key],
+                                       rtol=1e-12, err_msg=key)
+        np.testing.assert_allclose(table['Cum Counts'][row], cum,
+                                   rtol=1e-12)
+    np.testing.assert_allclose(table['dN/logD'],
+                               counts / np.diff(np.log10(BOUNDS)))
+    np.testing.assert_allclose(table['Density'], counts / np.diff(BOUNDS))
+
+
+@pytest.mark.parametrize('counts', [
+    [10, 10, 0, 0, 0, 0, 0, 0, 0, 0],   # half way is a bin boundary
+    [0] * 10,                            # no counts
+    [0, 0, 5, 0, 0, 0, 0, 0, 0, 0],     # half way is inside bin 2
+])
+def test_median_not_found(counts):
+    counts = np.array(counts, dtype=float)
+    _, stats = histogram_stats(counts, BOUNDS)
+    expected, _ = loop_histogram(counts, BOUNDS)
+    if np.isnan(expected['median']):
+        assert np.isnan(stats['median'])
+    else:
+        assert stats['median'] == pytest.approx(expected['median'])
+
+
+def test_histogram_frame():
+    counts = make_counts(3)
+    columns = ['alpha-%s' % x for x in BOUNDS[:-1]]
+    df = pd.DataFrame(counts, columns=columns)
+    df.iloc[0, 0] = np.nan
+    df1, stats = histogram_frame(df, BOUNDS)
+    assert list(df1.columns) == COLUMNS
+    assert list(df1.index) == columns
+    mean = df.mean(axis=0).values
+    np.testing.assert_allclose(df1['Counts'], mean)
+    expected, cum = loop_histogram(mean, BOUNDS)
+    np.testing.assert_allclose(df1['Cum Counts'], cum)
+    assert set(stats) == set(STATS)
+    for key in STATS:
+        assert isinstance(stats[key], float)
+        assert stats[key] == pytest.approx(expected[key], rel=1e-12)
+
+
+def window_loop(df, bins, window, step):
+    """Statistics of each window from the rows in it, one at a time"""
+    window = pd.Timedelta(window)
+    starts = pd.date_range(df.index[0].floor(step), df.index[-1], freq=step)
+    stats = []
+    rows = []
+    for start in starts:
+        inside = df[(df.index >= start) & (df.index < start + window)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            _, window_stats = histogram_stats(inside.mean(axis=0).values,
+                                              bins)
+        stats.append([float(window_stats[x]) for x in STATS])
+        rows.append(len(inside))
+    return starts, np.array(stats), rows
+
+
+def make_minutes():
+    """Minutes of data with NaN rows and cells, a gap of half an hour and
+    rows off the minute
+    """
+    rng = np.random.RandomState(4)
+    index = pd.DatetimeIndex(
+        list(pd.date_range('2016-09-08 07:55:30', periods=25, freq='1min')) +
+        list(pd.date_range('2016-09-08 08:50', periods=15, freq='1min')),
+        name='Datetime')
+    values = rng.uniform(0, 100, (len(index), len(BOUNDS) - 1))
+    values[3] = np.nan
+    values[10:13, 2] = np.nan
+    return pd.DataFrame(values, index=index)
+
+
+@pytest.mark.parametrize('window, step', [('10min', '1min'),
+                                          ('5min', '5min'),
+                                          ('1min', '5min'),
+                                          ('90s', '30s'),
+                                          ('2h', '10min')])
+def test_rolling_stats_matches_loop(window, step):
+    df = make_minutes()
+    stats = rolling_stats(df, BOUNDS, window, step)
+    starts, expected, rows = window_loop(df, BOUNDS, window, step)
+    assert list(stats.columns) == STATS + ['rows']
+    assert (stats.index == starts).all()
+    assert list(stats['rows']) == rows
+    np.testing.assert_allclose(stats[STATS].values.astype(float), expected,
+                               rtol=1e-9, equal_nan=True)
+
+
+def test_rolling_stats_edges():
+    df = make_minutes()
+    stats = rolling_stats(df, BOUNDS, '10min', '1min')
+    # Windows start on the minute before the first row
+    assert stats.index[0] == pd.Timestamp('2016-09-08 07:55')
+    # A row at the end of a window is in the next window only
+    ends = df.iloc[[0, 1]].set_axis(pd.to_datetime(['2016-09-08 07:55',
+                                                    '2016-09-08 08:05']))
+    assert list(rolling_stats(ends, BOUNDS, '10min', '5min')['rows']) == \
+        [1, 1, 1]
+    # Windows in the gap have no rows and no statistics
+    empty = stats.loc['2016-09-08 08:21':'2016-09-08 08:39']
+    assert (empty['rows'] == 0).all()
+    assert empty[STATS].isna().values.all()
+    # A window with only the row of NaN has no statistics either
+    only_nan = rolling_stats(df.iloc[3:4], BOUNDS, '1min', '1min')
+    assert list(only_nan['rows']) == [1]
+    assert only_nan[STATS].isna().values.all()
+
+
+def test_rolling_stats_of_no_data():
+    stats = rolling_stats(make_minutes().iloc[:0], BOUNDS)
+    assert stats.empty
+    assert list(stats.columns) == STATS + ['rows']
@@ -0,0 +1,23 @@
+from datetime import timedelta
+import pytest
+from src.modules.lag import parse_timeshift, format_timeshift
+
+
+def test_parse_timeshift():
+    assert parse_timeshift('-00:07:00') == -timedelta(minutes=7)
+    assert parse_timeshift('+01:01:30') == timedelta(hours=1, minutes=1,
+                                                     seconds=30)
+    # Single digits were accepted by strptime before
+    assert parse_timeshift('-0:1:0') == -timedelta(minutes=1)
+    assert parse_timeshift(format_timeshift(-timedelta(hours=30))) == \
+        -timedelta(hours=30)
+
+
+@pytest.mark.parametrize('timeshift, message', [
+    ('00:07:00', 'Sign not given'),
+    ('-00:07', 'not of the form'),
+    ('-00:60:00', 'out of range'),
+])
+def test_parse_timeshift_errors(timeshift, message):
+    with pytest.raises(ValueError, match=message):
+        parse_timeshift(timeshift)
@@ -0,0 +1,95 @@
+import os
+import inspect
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from process import load_sensor, process
+
+project_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir)
+
+# process.py loads yaml without a Loader, which PyYAML 6 no longer allows
+needs_yaml_load = pytest.mark.skipif(
+    inspect.signature(yaml.load).parameters['Loader'].default is
+    inspect.Parameter.empty, reason="needs yaml.load without a Loader")
+
+# Raw log of a sensor that takes a row every 20 seconds, the clock jumps
+# back at 00:02:40 so minutes 00:01 and 00:02 come round twice
+RAW = """\
+2016-08-01 00:00:00,10,1
+2016-08-01 00:00:20,12,2
+2016-08-01 00:00:40,14,3
+2016-08-01 00:01:00,16,4
+2016-08-01 00:01:20,18,5
+2016-08-01 00:02:00,20,6
+2016-08-01 00:02:20,22,7
+2016-08-01 00:01:40,24,8
+2016-08-01 00:02:40,26,9
+2016-08-01 00:05:00,28,10
+"""
+
+
+def load(path, chunksize):
+    config = {'bins': [0.5, 2.5, 10], 'resample': 'minute',
+              'realcounts': True}
+    return load_sensor(str(path), config, 'dylos', 2.0, chunksize)
+
+
+def test_chunks_of_out_of_order_log(tmpdir):
+    path = tmpdir.join('dylos.log')
+    path.write(RAW)
+    whole = load(path, None).sort_index()
+    for chunksize in [1, 2, 3, 4, 7]:
+        chunked = load(path, chunksize)
+        pd.testing.assert_frame_equal(chunked, whole)
+
+    # Every minute from first to last, with no rows in minutes 3 and 4
+    assert list(whole.index.minute) == [0, 1, 2, 3, 4, 5]
+    assert whole.iloc[3:5].isna().values.all()
+    # Rows at 00:01:00, 00:01:20 and the late 00:01:40, less the upper bin
+    # and scaled by 2
+    np.testing.assert_allclose(whole.loc['2016-08-01 00:01'],
+                               [(58 - 17) / 3.0 * 2, 17 / 3.0 * 2])
+
+
+SETTINGS = """\
+sensors:
+  dylos:
+    path: "dylos.log"
+    type: dylos
+output:
+  unit: 'count per cubic cm'
+exp:
+  order: ["1"]
+  conditions:
+    "1":
+      start: 2016-08-01 00:01:00
+      end: 2016-08-01 00:04:00
+"""
+
+
+@needs_yaml_load
+def test_settings_touched_when_values_change(tmpdir):
+    raw = tmpdir.mkdir('raw')
+    raw.join('dylos.log').write(RAW)
+    settings = tmpdir.join('settings.yaml')
+    settings.write(SETTINGS)
+    output = str(tmpdir.join('interim', 'settings.json'))
+
+    def run():
+        process(str(settings),
+                os.path.join(project_dir, 'conditions', 'sensors.yaml'),
+                os.path.join(project_dir, 'conditions', 'particles.yaml'),
+                str(raw), output)
+        return os.stat(output).st_mtime_ns
+
+    run()
+    # Older than anything written from here on, whatever the resolution of
+    # modification times
+    os.utime(output, (0, 0))
+    assert run() == 0
+
+    # Same timestamps so the same settings, but new values
+    raw.join('dylos.log').write(RAW.replace(',10,1', ',11,1'))
+    assert run() > 0
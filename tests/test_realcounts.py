@@ -0,0 +1,48 @@
+import importlib
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def loop_real_counts(data):
+    """realCounts as it was, one column at a time"""
+    columns = data.columns
+    for i in range(0, len(columns)):
+        sumup = data[columns[(i+1):]].sum(axis=1)
+        data[columns[i]] = data[columns[i]] - sumup
+    return data
+
+
+@pytest.fixture(params=['process', 'src.modules.data'])
+def real_counts(request):
+    try:
+        module = importlib.import_module(request.param)
+    except ImportError as error:
+        pytest.skip(str(error))
+    return module.realCounts
+
+
+@pytest.mark.parametrize('bins', [1, 2, 3, 8, 16, 24])
+def test_real_counts_matches_loop(real_counts, bins):
+    rng = np.random.RandomState(bins)
+    values = rng.uniform(0, 1000, (500, bins))
+    values[rng.uniform(size=values.shape) < 0.1] = np.nan
+    # A row with no data and one with only its top bin
+    values[0] = np.nan
+    values[1, :-1] = np.nan
+    columns = ['bin-%d' % x for x in range(bins)]
+    data = pd.DataFrame(values, columns=columns)
+    expected = loop_real_counts(data.copy())
+
+    copy = real_counts(data, inplace=False)
+    pd.testing.assert_frame_equal(copy, expected, check_exact=True)
+    assert real_counts(data) is data
+    pd.testing.assert_frame_equal(data, expected, check_exact=True)
+
+
+def test_real_counts_of_whole_counts(real_counts):
+    data = pd.DataFrame([[10, 4, 1], [7, 7, 0]], columns=['a', 'b', 'c'])
+    expected = loop_real_counts(data.copy())
+    # The loop made the top bin floats by subtracting the sum of no columns
+    pd.testing.assert_frame_equal(real_counts(data), expected,
+                                  check_dtype=False, check_exact=True)
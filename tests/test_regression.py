@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from src.modules.regression import (moments, ols, regression,
+                                    CalibrationAccumulator)
+
+sm = pytest.importorskip('statsmodels.api')
+from statsmodels.tools.sm_exceptions import MissingDataError
+
+
+def statsmodels_fit(x, y, missing='none'):
+    """slope, slope error, intercept, intercept error and R squared as the
+    old regression worked them out
+    """
+    result = sm.OLS(y, sm.add_constant(x, prepend=False),
+                    missing=missing).fit()
+    slope, intercept = result.params
+    slope_error, intercept_error = result.bse
+    return [slope, slope_error, intercept, intercept_error, result.rsquared]
+
+
+def make_bins(bins=4, n=50, seed=0):
+    """x and y of shape (bins, n) of lines of different scales"""
+    rng = np.random.RandomState(seed)
+    scale = 10.0 ** np.arange(bins)
+    x = rng.uniform(0, 1, (bins, n)) * scale[:, None] + 1000
+    y = 0.8 * x + 5 + rng.normal(0, 1, (bins, n)) * scale[:, None]
+    return x, y
+
+
+def test_ols_matches_statsmodels():
+    x, y = make_bins()
+    fits = ols(moments(x, y))
+    for column in range(len(x)):
+        expected = statsmodels_fit(x[column], y[column])
+        np.testing.assert_allclose(fits[column], expected, rtol=1e-9)
+        np.testing.assert_allclose(regression(x[column], y[column]),
+                                   expected, rtol=1e-9)
+
+
+def test_nan_bin_matches_statsmodels():
+    x, y = make_bins()
+    x[1, [3, 17]] = np.nan
+    y[1, 40] = np.nan
+    # Without dropping them a missing value spoils only the fit of its bin,
+    # the old regression failed on it
+    fits = ols(moments(x, y))
+    assert np.isnan(fits[1]).all()
+    with pytest.raises(MissingDataError):
+        statsmodels_fit(x[1], y[1])
+    np.testing.assert_allclose(fits[0], statsmodels_fit(x[0], y[0]),
+                               rtol=1e-9)
+
+    # Calibrations leave rows with a missing value out of a bin
+    fits = CalibrationAccumulator(len(x)).update(x.T, y.T).fits()
+    for column in range(len(x)):
+        np.testing.assert_allclose(
+            fits[column], statsmodels_fit(x[column], y[column], 'drop'),
+            rtol=1e-9)
+
+
+def test_constant_x_bin():
+    x, y = make_bins()
+    x[2] = 3.0
+    fits = ols(moments(x, y))
+    # A constant x has no slope, statsmodels does not even add the constant
+    # so the old regression failed to unpack its params
+    assert np.isnan(fits[2, :4]).all()
+    with pytest.raises(ValueError):
+        statsmodels_fit(x[2], y[2])
+    for column in [0, 1, 3]:
+        np.testing.assert_allclose(fits[column],
+                                   statsmodels_fit(x[column], y[column]),
+                                   rtol=1e-9)
+
+
+def test_accumulator_updates_and_merges():
+    x, y = make_bins(bins=3, n=40, seed=1)
+    rows, columns = x.T, y.T
+    expected = ols(moments(x, y))
+
+    one_by_one = CalibrationAccumulator(3)
+    for row_x, row_y in zip(rows, columns):
+        one_by_one.update(row_x, row_y)
+    batch = CalibrationAccumulator(3).update(rows, columns)
+    shards = CalibrationAccumulator(3).update(rows[:15], columns[:15])
+    shards.merge(CalibrationAccumulator(3).update(rows[15:], columns[15:]))
+    # An empty shard changes nothing
+    shards.merge(CalibrationAccumulator(3))
+
+    for accumulator in [one_by_one, batch, shards]:
+        assert len(accumulator) == 40
+        np.testing.assert_allclose(accumulator.fits(), expected, rtol=1e-9)
+
+
+def test_accumulator_leaves_out_missing_rows():
+    x, y = make_bins(bins=2, n=30, seed=2)
+    x[0, 5] = np.nan
+    y[1, 20] = np.nan
+    shards = CalibrationAccumulator(2).update(x.T[:10], y.T[:10])
+    shards.merge(CalibrationAccumulator(2).update(x.T[10:], y.T[10:]))
+    for column in range(2):
+        valid = ~np.isnan(x[column]) & ~np.isnan(y[column])
+        np.testing.assert_allclose(
+            shards.fits()[column],
+            ols(moments(x[column][valid], y[column][valid])), rtol=1e-9)
@@ -0,0 +1,58 @@
+import os
+import json
+import pytest
+from src.modules.scan import scan_log
+
+LOG = ('2020-01-01 00:00:00,1,2\n'
+       '2020-01-01 00:01:00,1,2\n'
+       '\n'
+       '2020-01-01 00:02:00,1,2\n'
+       '2020-01-01 00:03:00,1,2\n')
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'raw.csv'
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize('chunksize', [1, 2, 3])
+def test_blank_line_first_in_chunk(tmp_path, chunksize):
+    path = write(tmp_path, LOG)
+    report = scan_log(path, chunksize=chunksize)
+    assert report == scan_log(path)
+    assert report['rows'] == 5
+    assert report['blank lines']['lines'] == [3]
+    assert report['missing cells']['count'] == 0
+
+
+@pytest.mark.parametrize('chunksize', [2, 100])
+def test_ragged_lines(tmp_path, chunksize):
+    # Two lines run together and a line cut short
+    path = write(tmp_path, '2020-01-01 00:00:00,1,2\n'
+                           '2020-01-01 00:01:00,1,2\n'
+                           '2020-01-01 00:02:00,1,2020-01-01 00:03:00,1,2\n'
+                           '2020-01-01 00:04:00,1\n'
+                           '2020-01-01 00:05:00,1,\n')
+    report = scan_log(path, chunksize=chunksize)
+    assert 'error' not in report
+    assert report['columns'] == 3
+    assert report['too many fields']['lines'] == [3]
+    assert report['too few fields']['lines'] == [4]
+    assert report['missing cells']['lines'] == [5]
+    assert report['non-numeric cells']['lines'] == [3]
+
+
+def test_scan_writes_report_and_cache(tmpdir):
+    from scan import scan
+    raw = tmpdir.mkdir('raw')
+    raw.join('dylos.log').write(LOG)
+    output = str(tmpdir.join('interim', 'scan.json'))
+    reports = scan(str(raw), output)
+    assert sorted(os.listdir(os.path.dirname(output))) == [
+        'scan-cache.json', 'scan.json']
+    with open(output) as handle:
+        written = json.load(handle)
+    assert written['problems'] == ['dylos.log']
+    assert written['logs']['dylos.log']['blank lines'] == \
+        reports['dylos.log']['blank lines']
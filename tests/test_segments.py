@@ -0,0 +1,91 @@
+import os
+from itertools import groupby
+from operator import itemgetter
+import numpy as np
+import pytest
+from src.modules.segments import (runBounds, findGroups, findSegments,
+                                  writeSegments)
+from process_dylos import loadData, main
+
+# Raw dylos log with a missing count and a gap of two minutes
+RAW = """\
+2016-09-08 07:00:10,1,2
+2016-09-08 07:01:12,3,4
+2016-09-08 07:02:05,,4
+2016-09-08 07:03:00,5,6
+2016-09-08 07:04:00,7,8
+2016-09-08 07:07:00,9,10
+2016-09-08 07:08:00,11,12
+2016-09-08 07:09:00,13,14
+"""
+
+SEGMENTS = {
+    '2016-09-08_07-00-00_2016-09-08_07-01-00_dylos':
+        "2016-09-08 07:00:00,1.0,2\n2016-09-08 07:01:00,3.0,4\n",
+    '2016-09-08_07-03-00_2016-09-08_07-04-00_dylos':
+        "2016-09-08 07:03:00,5.0,6\n2016-09-08 07:04:00,7.0,8\n",
+    '2016-09-08_07-07-00_2016-09-08_07-09-00_dylos':
+        "2016-09-08 07:07:00,9.0,10\n2016-09-08 07:08:00,11.0,12\n"
+        "2016-09-08 07:09:00,13.0,14\n",
+}
+
+
+def group_loop(index):
+    """findGroups as it was, with itertools"""
+    ranges = []
+    for k, g in groupby(enumerate(index), lambda ix: ix[1]-ix[0]):
+        group = list(map(itemgetter(1), g))
+        ranges.append((group[0], group[-1]))
+    return ranges
+
+
+@pytest.mark.parametrize('index', [[], [4], [1, 2, 3], [1, 3, 5],
+                                   [0, 1, 2, 5, 6, 9, 11, 12]])
+def test_find_groups_matches_loop(index):
+    assert findGroups(index) == group_loop(index)
+    first, last = runBounds(index)
+    assert len(first) == len(last) == len(group_loop(index))
+
+
+def test_find_groups_of_random_rows():
+    rng = np.random.RandomState(0)
+    index = np.flatnonzero(rng.uniform(size=1000) < 0.8)
+    assert findGroups(index) == group_loop(index.tolist())
+
+
+def test_find_segments(tmpdir):
+    path = tmpdir.join('dylos.log')
+    path.write(RAW)
+    data = loadData(str(path))
+    # Rows of the data, not of the minutes from first to last, which the
+    # old process_dylos mixed up after a gap
+    assert findSegments(data) == [(0, 1), (3, 4), (5, 7)]
+    assert findSegments(data.iloc[2:3]) == []
+
+
+def test_write_segments(tmpdir):
+    path = tmpdir.join('dylos.log')
+    path.write(RAW)
+    data = loadData(str(path))
+    ranges = findSegments(data)
+    combined = str(tmpdir.join('all'))
+    paths = writeSegments(data, ranges, str(tmpdir), 'dylos', combined)
+    assert [os.path.basename(x) for x in paths] == sorted(SEGMENTS)
+    for name, text in SEGMENTS.items():
+        assert tmpdir.join(name).read() == text
+    assert tmpdir.join('all').read() == "".join(
+        SEGMENTS[x] for x in sorted(SEGMENTS))
+    assert writeSegments(data, [], str(tmpdir), 'dylos', combined) == []
+
+
+def test_process_dylos(tmpdir, capsys):
+    path = tmpdir.join('dylos.log')
+    path.write(RAW)
+    main(str(path))
+    split = tmpdir.join('split-dylos')
+    assert sorted(x.basename for x in split.listdir()) == \
+        sorted(SEGMENTS) + ['dylos']
+    for name, text in SEGMENTS.items():
+        assert split.join(name).read() == text
+    assert split.join('dylos').read() == "".join(
+        SEGMENTS[x] for x in sorted(SEGMENTS))
@@ -0,0 +1,110 @@
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+from src.modules.store import (FORMATS, write_frame, read_frame,
+                               read_npy_rows, condition_rows, window_rows,
+                               keep_in_memory)
+
+
+def make_frame():
+    """Minutes of data with gaps, a row of only NaN and NaN cells"""
+    minutes = pd.to_datetime(['2016-09-08 07:55', '2016-09-08 07:56',
+                              '2016-09-08 07:58', '2016-09-08 08:02',
+                              '2016-09-08 08:03', '2016-09-08 08:04'])
+    values = np.arange(18, dtype=float).reshape(6, 3) / 3
+    values[2] = np.nan
+    values[4, 1] = np.nan
+    return pd.DataFrame(values, index=pd.Index(minutes, name='Datetime'),
+                        columns=['alpha-0.38', 'alpha-0.54', 'alpha-0.78'])
+
+
+# Start and end of windows of time over the data of make_frame()
+WINDOWS = [('2016-09-08 07:55', '2016-09-08 08:04'),    # all of it
+           ('2016-09-08 07:56', '2016-09-08 08:02'),    # inside
+           ('2016-09-08 07:56:30', '2016-09-08 08:03:30'),
+           ('2016-09-08 07:59', '2016-09-08 08:01'),    # in a gap
+           ('2016-09-08 07:00', '2016-09-08 07:56'),    # past the start
+           ('2016-09-08 08:03', '2016-09-08 09:00'),    # past the end
+           ('2016-09-08 07:00', '2016-09-08 09:00'),    # past both
+           ('2016-09-08 07:00', '2016-09-08 07:30'),    # before
+           ('2016-09-08 08:10', '2016-09-08 08:20'),    # after
+           ('2016-09-08 08:02', '2016-09-08 07:56')]    # ends swapped
+
+
+@pytest.fixture(params=FORMATS)
+def stored(request, tmpdir):
+    if request.param in ['parquet', 'feather']:
+        pytest.importorskip('pyarrow')
+    df = make_frame()
+    path = str(tmpdir.join('alpha.' + request.param))
+    write_frame(df, path, bins=[0.38, 0.54, 0.78, 1.05])
+    return df, path
+
+
+def assert_same(read, expected):
+    pd.testing.assert_frame_equal(read, expected, check_freq=False,
+                                  check_index_type=False)
+    assert read.index.name == expected.index.name
+    assert (read.index.values == expected.index.values).all()
+
+
+def test_round_trip(stored):
+    df, path = stored
+    assert_same(read_frame(path), df)
+
+
+@pytest.mark.parametrize('rows', [[0, 6], [1, 4], [3, 3], [5, 9], [6, 8],
+                                  [4, 2]])
+def test_rows_of_npz_and_csv(tmpdir, rows):
+    df = make_frame()
+    for fmt in ['npz', 'csv']:
+        path = write_frame(df, str(tmpdir.join('alpha.' + fmt)))
+        assert_same(read_frame(path, rows), df.iloc[rows[0]:rows[1]])
+
+
+@pytest.mark.parametrize('layout', ['fortran', 'object'])
+def test_npz_fallback(tmpdir, layout):
+    df = make_frame()
+    values = df.values
+    if layout == 'fortran':
+        values = np.asfortranarray(values)
+    else:
+        values = values.astype(object)
+    path = str(tmpdir.join('alpha.npz'))
+    np.savez(path, index=df.index.values, index_name=np.array('Datetime'),
+             columns=np.array(list(df.columns)), values=values)
+
+    with zipfile.ZipFile(path) as archive:
+        read = read_npy_rows(archive, 'values', slice(1, 4))
+    assert read.dtype == values.dtype
+    np.testing.assert_array_equal(read.astype(float),
+                                  values[1:4].astype(float))
+    expected = df.astype(object) if layout == 'object' else df
+    assert_same(read_frame(path, [1, 4]), expected.iloc[1:4])
+    assert_same(read_frame(path), expected)
+
+
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_condition_rows(stored, start, end):
+    df, path = stored
+    expected = df.loc[start:end]
+    rows = window_rows(path, [('c', start, end)])['c']
+    assert_same(read_frame(path, rows), expected)
+    if not path.endswith('.grid'):
+        # Rows of a grid are minutes from its first minute
+        assert rows == condition_rows(df.index, start, end)
+        assert_same(read_frame(path, condition_rows(df.index, start, end)),
+                    expected)
+
+
+def test_condition_rows_in_memory(tmpdir):
+    df = make_frame()
+    keep_in_memory()
+    try:
+        path = write_frame(df, str(tmpdir.join('alpha.npz')))
+        for start, end in WINDOWS:
+            rows = condition_rows(df.index, start, end)
+            assert_same(read_frame(path, rows), df.loc[start:end])
+    finally:
+        keep_in_memory(False)